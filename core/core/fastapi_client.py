@@ -0,0 +1,38 @@
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+FASTAPI_BASE_URL = "http://localhost:8001"
+
+# Connect timeout, read timeout. Building a session embeds the whole sheet, so reads can be slow.
+START_SESSION_TIMEOUT = (5, 180)
+
+_retry = Retry(
+    total=2,
+    connect=2,
+    read=0,
+    backoff_factor=0.5,
+    status_forcelist=[502, 503, 504],
+    # Only idempotent reads are retried. A 502/504 on /start_session can arrive after the
+    # service already built and stored the session, so a retried POST would repeat that work
+    allowed_methods=frozenset(["GET", "HEAD"]),
+    raise_on_status=False,
+)
+
+# One keep-alive, connection-pooled session shared by every view talking to the FastAPI service
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=_retry))
+session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=20, max_retries=_retry))
+
+
+def start_chat_session(session_id, sheet_url, description):
+    """Ask the FastAPI service to build a chat session for an event sheet"""
+    return session.post(
+        f"{FASTAPI_BASE_URL}/start_session",
+        json={
+            "session_id": session_id,
+            "sheet_url": sheet_url,
+            "description": description,
+        },
+        timeout=START_SESSION_TIMEOUT,
+    )
@@ -26,7 +26,7 @@ import string
 from django.utils import timezone
 from .serializers import *
 import uuid
-import requests
+from core.fastapi_client import start_chat_session
 class all_events(APIView):
     authentication_classes = [TokenAuthentication]
     permission_classes = [IsAuthenticated, IsAdminUser | IsTeacher]  # Combine permissions properly (DRF 3.9+)
@@ -330,12 +330,7 @@ class Chat(APIView):
         session_id = str(uuid.uuid4())
         print(f"Initializing chat session with ID: {session_id} for event: {event.name}")
         # Send to FastAPI
-        fastapi_url = "http://localhost:8001/start_session"
-        res = requests.post(fastapi_url, json={
-            "session_id": session_id,
-            "sheet_url": response_sheet_url,
-            "description": desc,
-        })
+        res = start_chat_session(session_id, response_sheet_url, desc)
 
         if res.status_code != 200:
             print(f"Failed to initialize chat session: {res.status_code} - {res.text}")
@@ -1,7 +1,7 @@
 from django.shortcuts import get_object_or_404, render
 import uuid
 from home.models import Event
-import requests
+from core.fastapi_client import start_chat_session
 # Create your views here.
 def index(request):
     return render(request,'router/index.html')
@@ -28,12 +28,7 @@ def chat_view(request):
     session_id = str(uuid.uuid4())
     print(f"Initializing chat session with ID: {session_id} for event: {event.name}")
     # Send to FastAPI
-    fastapi_url = "http://localhost:8001/start_session"
-    res = requests.post(fastapi_url, json={
-        "session_id": session_id,
-        "sheet_url": response_sheet_url,
-        "description": desc,
-    })
+    res = start_chat_session(session_id, response_sheet_url, desc)
 
     if res.status_code != 200:
         print(f"Failed to initialize chat session: {res.status_code} - {res.text}")
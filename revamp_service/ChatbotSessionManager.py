@@ -1,54 +1,129 @@
 import asyncio
 import logging
-from typing import Dict, Optional, Any
-import json
-from datetime import datetime, date
+import uuid
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Any
 from .models import *
 import pandas as pd
 from .logger import *
 from .prompts import *
 from .configs import *
+from .SessionCodec import session_codec
 logging = get_logger(__name__)
 from cachetools import TTLCache
 import redis.asyncio as redis
 
-class DateTimeEncoder(json.JSONEncoder):
-    """Custom JSON encoder that handles datetime objects"""
-    def default(self, obj):
-        if isinstance(obj, (datetime, date)):
-            return {
-                '__datetime__': True,
-                'value': obj.isoformat()
-            }
-        elif hasattr(obj, '__dict__'):
-            # Handle custom objects by converting to dict
-            return {
-                '__custom_object__': True,
-                'type': obj.__class__.__name__,
-                'data': obj.__dict__ if hasattr(obj, '__dict__') else str(obj)
-            }
-        return super().default(obj)
-
-def datetime_decoder(dct):
-    """Custom JSON decoder that reconstructs datetime objects"""
-    if '__datetime__' in dct:
-        return datetime.fromisoformat(dct['value'])
-    elif '__custom_object__' in dct:
-        # For custom objects, return a simplified representation
-        return f"<{dct['type']} object>"
-    return dct
+SessionRemovalListener = Callable[[str, str], None]
+
+
+def session_size(data: Dict[str, Any]) -> int:
+    """Bytes only this session holds, measured by the processor when it was stored"""
+    return max(1, int(data.get("footprint_bytes", 1)))
+
+
+def shared_footprint(data: Dict[str, Any]) -> Dict[str, int]:
+    """Objects the session may share with others (index, frame) -> their bytes, keyed by what they belong to"""
+    return data.get("shared_footprint") or {}
+
+
+class SessionCache(TTLCache):
+    """TTLCache with a byte budget that reports sessions it drops on expiry or LRU eviction.
+
+    Each session is charged its private bytes. Shared objects such as a vector index or a
+    sheet frame are charged once, for as long as at least one cached session holds them,
+    so the budget follows what is actually resident as sessions come and go.
+    """
+
+    def __init__(self, maxsize, ttl, on_remove: SessionRemovalListener):
+        # A session bigger than the whole budget is charged the budget, so it can still be cached alone
+        super().__init__(maxsize=maxsize, ttl=ttl, getsizeof=lambda data: min(session_size(data), maxsize))
+        self.on_remove = on_remove
+        self._held: Dict[str, Dict[str, int]] = {}
+        # shared key -> [bytes, number of cached sessions holding it]
+        self._shared: Dict[str, List[int]] = {}
+        self.shared_bytes = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self.currsize + self.shared_bytes
+
+    def _hold(self, key, value):
+        held = dict(shared_footprint(value))
+        for shared_key, size in held.items():
+            entry = self._shared.setdefault(shared_key, [int(size), 0])
+            if entry[1] == 0:
+                self.shared_bytes += entry[0]
+            entry[1] += 1
+        self._held[key] = held
+
+    def _release(self, key):
+        for shared_key in self._held.pop(key, {}):
+            entry = self._shared[shared_key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                self.shared_bytes -= entry[0]
+                del self._shared[shared_key]
+
+    def __setitem__(self, key, value):
+        self._release(key)
+        super().__setitem__(key, value)
+        self._hold(key, value)
+        # Keep the session just stored even if it alone exceeds the budget
+        while self.total_bytes > self.maxsize and len(self) > 1:
+            self.popitem()
+
+    def __delitem__(self, key):
+        try:
+            super().__delitem__(key)
+        finally:
+            self._release(key)
+
+    def popitem(self):
+        key, value = super().popitem()
+        self.on_remove(key, "evicted")
+        return key, value
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, _ in expired:
+            self._release(key)
+            self.on_remove(key, "expired")
+        return expired
+
+    def clear(self):
+        super().clear()
+        self._held.clear()
+        self._shared.clear()
+        self.shared_bytes = 0
+
 
 class EnhancedSessionManager:
     def __init__(self):
         self.Config = CachingConfig()
+        self.removal_listeners: List[SessionRemovalListener] = []
         # Local cache as fallback
         if self.Config.REDIS_AVAILABLE:
-            self.local_cache = TTLCache(maxsize=self.Config.MAX_CACHE_SIZE, ttl=self.Config.CACHE_TTL)
+            self.local_cache = SessionCache(maxsize=self.Config.MAX_CACHE_BYTES, ttl=self.Config.CACHE_TTL,
+                                            on_remove=self._notify_removed)
         else:
             self.local_cache = {}
         
         self.redis_client = None
         self.redis_available = False
+        # Tags our own invalidation messages so a worker doesn't drop what it just wrote
+        self.worker_id = uuid.uuid4().hex
+        self._invalidation_task: Optional[asyncio.Task] = None
+    
+    def add_removal_listener(self, listener: SessionRemovalListener):
+        """Register a callback(session_id, reason) run when a session leaves the local cache"""
+        self.removal_listeners.append(listener)
+    
+    def _notify_removed(self, session_id: str, reason: str):
+        for listener in self.removal_listeners:
+            try:
+                listener(session_id, reason)
+            except Exception as e:
+                logging.error(f"Session removal listener failed for {session_id}: {e}")
         
     async def init_redis(self):
         """Initialize Redis connection"""
@@ -60,71 +135,90 @@ class EnhancedSessionManager:
             self.redis_client = redis.from_url(self.Config.REDIS_URL)
             await self.redis_client.ping()
             self.redis_available = True
-            logging.info("Redis connected successfully - using as primary cache")
+            logging.info("Redis connected successfully - using as shared cache behind the local cache")
+            self._invalidation_task = asyncio.create_task(self._listen_for_invalidations())
         except Exception as e:
             logging.warning(f"Redis connection failed: {e}. Falling back to local cache only")
             self.redis_available = False
     
-    def _make_serializable(self, obj):
-        """Recursively make objects JSON serializable"""
-        if isinstance(obj, (datetime, date)):
-            return {
-                '__datetime__': True,
-                'value': obj.isoformat()
-            }
-        elif isinstance(obj, dict):
-            return {key: self._make_serializable(value) for key, value in obj.items()}
-        elif isinstance(obj, (list, tuple)):
-            return [self._make_serializable(item) for item in obj]
-        elif hasattr(obj, '__dict__') and not isinstance(obj, (str, int, float, bool, type(None))):
-            # Handle complex objects
+    async def _publish_invalidation(self, session_id: str):
+        """Tell other workers their local copy of a session is stale"""
+        try:
+            await self.redis_client.publish(self.Config.INVALIDATION_CHANNEL, f"{self.worker_id}:{session_id}")
+        except Exception as e:
+            logging.error(f"Failed to publish invalidation for session {session_id}: {e}")
+    
+    async def _listen_for_invalidations(self):
+        """Drop local sessions that another worker changed or deleted"""
+        while True:
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
             try:
-                # Try to convert to dict if it has __dict__
-                return {
-                    '__custom_object__': True,
-                    'type': obj.__class__.__name__,
-                    'data': self._make_serializable(obj.__dict__) if hasattr(obj, '__dict__') else str(obj)
-                }
-            except Exception:
-                return str(obj)
-        else:
-            return obj
+                await pubsub.subscribe(self.Config.INVALIDATION_CHANNEL)
+                async for message in pubsub.listen():
+                    data = message.get("data")
+                    if isinstance(data, bytes):
+                        data = data.decode("utf-8")
+                    worker_id, _, session_id = str(data).partition(":")
+                    if worker_id == self.worker_id or session_id not in self.local_cache:
+                        continue
+                    self.local_cache.pop(session_id, None)
+                    self._notify_removed(session_id, "invalidated")
+                    logging.info(f"Session {session_id} invalidated by worker {worker_id[:8]}")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Session invalidation listener failed: {e}. Resubscribing")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.aclose()
+                except Exception:
+                    pass
+    
+    async def close(self):
+        if self._invalidation_task is not None:
+            self._invalidation_task.cancel()
+            try:
+                await self._invalidation_task
+            except asyncio.CancelledError:
+                pass
+            self._invalidation_task = None
+        if self.redis_client is not None:
+            await self.redis_client.aclose()
     
-    async def _serialize_data(self, data: Dict[str, Any]) -> str:
-        """Serialize data for Redis storage with proper datetime handling"""
+    async def _serialize_data(self, data: Dict[str, Any]) -> Optional[bytes]:
+        """Serialize data for Redis storage; qa_components stay behind as a placeholder"""
         try:
-            # Handle complex objects that can't be JSON serialized
-            serializable_data = {}
-            for key, value in data.items():
-                if key == "qa_components":
-                    # Don't store complex LangChain objects in cache
-                    serializable_data[key] = "COMPLEX_OBJECT_PLACEHOLDER"
-                else:
-                    # Make the value serializable
-                    serializable_data[key] = self._make_serializable(value)
-            
-            return json.dumps(serializable_data, cls=DateTimeEncoder, ensure_ascii=False)
+            return session_codec.encode(data)
         except Exception as e:
             logging.error(f"Data serialization failed: {e}")
-            # Log more details about what failed
             logging.error(f"Data keys: {list(data.keys())}")
-            for key, value in data.items():
-                try:
-                    json.dumps({key: value}, cls=DateTimeEncoder)
-                except Exception as inner_e:
-                    logging.error(f"Failed to serialize key '{key}' with value type {type(value)}: {inner_e}")
             return None
     
-    async def _deserialize_data(self, data_str: str) -> Optional[Dict[str, Any]]:
-        """Deserialize data from Redis storage with datetime reconstruction"""
+    async def _deserialize_data(self, payload: bytes) -> Optional[Dict[str, Any]]:
+        """Deserialize data from Redis storage, including sessions written in the old JSON format"""
         try:
-            return json.loads(data_str, object_hook=datetime_decoder)
+            return session_codec.decode(payload)
         except Exception as e:
             logging.error(f"Data deserialization failed: {e}")
             return None
     
+    async def get_session_metadata(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Read only a session's metadata, without decoding the rest of it"""
+        local_data = self.local_cache.get(session_id)
+        if local_data:
+            return local_data.get("metadata")
+        if self.redis_available and self.redis_client:
+            try:
+                payload = await self.redis_client.get(f"session:{session_id}")
+                if payload:
+                    return session_codec.decode_metadata(payload)
+            except Exception as e:
+                logging.error(f"Redis metadata get failed for session {session_id}: {e}")
+        return None
+    
     async def set_session(self, session_id: str, data: Dict[str, Any]):
-        """Set session data with Redis as primary, local as fallback"""
+        """Set session data in the local cache and Redis, invalidating copies held by other workers"""
         # Always store in local cache (original data with complex objects)
         self.local_cache[session_id] = data
         
@@ -138,7 +232,11 @@ class EnhancedSessionManager:
                         self.Config.CACHE_TTL,
                         serialized_data
                     )
-                    logging.info(f"Session {session_id} stored in Redis (primary) and local cache (fallback)")
+                    if data.get("index_key"):
+                        # Keep the shared index alive for as long as a session points at it
+                        await self.redis_client.expire(f"index:{data['index_key']}", self.Config.CACHE_TTL)
+                    await self._publish_invalidation(session_id)
+                    logging.info(f"Session {session_id} stored in local cache and Redis")
                 else:
                     logging.warning(f"Failed to serialize session {session_id}, stored in local cache only")
             except Exception as e:
@@ -146,35 +244,54 @@ class EnhancedSessionManager:
         else:
             logging.info(f"Session {session_id} stored in local cache only (Redis unavailable)")
     
+    def cache_locally(self, session_id: str, data: Dict[str, Any]):
+        """Put a session restored elsewhere into the local cache without writing it back to Redis.
+
+        footprint_bytes and shared_footprint travel with the session through the codec, so a
+        session restored from Redis is charged what the worker that built it measured.
+        """
+        self.local_cache[session_id] = data
+    
+    async def save_index(self, index_key: str, payload: bytes):
+        """Store a serialized vector index shared by every session on the same sheet"""
+        if not (self.redis_available and self.redis_client):
+            return
+        try:
+            await self.redis_client.setex(f"index:{index_key}", self.Config.CACHE_TTL, payload)
+            logging.info(f"Vector index {index_key[:16]} stored in Redis ({len(payload)} bytes)")
+        except Exception as e:
+            logging.error(f"Redis set failed for vector index {index_key[:16]}: {e}")
+    
+    async def load_index(self, index_key: str) -> Optional[bytes]:
+        if not (self.redis_available and self.redis_client):
+            return None
+        try:
+            return await self.redis_client.get(f"index:{index_key}")
+        except Exception as e:
+            logging.error(f"Redis get failed for vector index {index_key[:16]}: {e}")
+            return None
+    
     async def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
-        """Get session data from Redis first, then local cache"""
+        """Get session data from the local cache, falling back to Redis on a local miss"""
+        local_data = self.local_cache.get(session_id)
+        if local_data:
+            logging.debug(f"Session {session_id} retrieved from local cache")
+            return local_data
         
-        # Try Redis first if available
         if self.redis_available and self.redis_client:
             try:
                 redis_data = await self.redis_client.get(f"session:{session_id}")
                 if redis_data:
-                    deserialized_data = await self._deserialize_data(redis_data.decode('utf-8'))
+                    deserialized_data = await self._deserialize_data(redis_data)
                     if deserialized_data:
-                        logging.info(f"Session {session_id} retrieved from Redis (primary cache)")
-                        # Also update local cache for faster subsequent access
-                        if session_id in self.local_cache:
-                            # Merge with local cache to get complex objects back
-                            local_data = self.local_cache[session_id]
-                            for key, value in local_data.items():
-                                if key not in deserialized_data or deserialized_data[key] == "COMPLEX_OBJECT_PLACEHOLDER":
-                                    deserialized_data[key] = value
+                        logging.info(f"Session {session_id} retrieved from Redis")
+                        # Later reads on this worker stay local until another worker invalidates it
+                        self.cache_locally(session_id, deserialized_data)
                         return deserialized_data
             except Exception as e:
-                logging.error(f"Redis get failed for session {session_id}: {e}. Trying local cache")
+                logging.error(f"Redis get failed for session {session_id}: {e}")
         
-        # Fallback to local cache
-        local_data = self.local_cache.get(session_id)
-        if local_data:
-            logging.info(f"Session {session_id} retrieved from local cache (fallback)")
-            return local_data
-        
-        logging.warning(f"Session {session_id} not found in either Redis or local cache")
+        logging.warning(f"Session {session_id} not found in either local cache or Redis")
         return None
     
     async def delete_session(self, session_id: str):
@@ -183,6 +300,7 @@ class EnhancedSessionManager:
         if self.redis_available and self.redis_client:
             try:
                 await self.redis_client.delete(f"session:{session_id}")
+                await self._publish_invalidation(session_id)
                 logging.info(f"Session {session_id} deleted from Redis")
             except Exception as e:
                 logging.error(f"Redis delete failed for session {session_id}: {e}")
@@ -191,32 +309,48 @@ class EnhancedSessionManager:
         if session_id in self.local_cache:
             del self.local_cache[session_id]
             logging.info(f"Session {session_id} deleted from local cache")
+        self._notify_removed(session_id, "deleted")
+    
+    async def session_exists(self, session_id: str) -> bool:
+        """Whether the session is still alive anywhere, without loading it"""
+        if session_id in self.local_cache:
+            return True
+        if self.redis_available and self.redis_client:
+            try:
+                return bool(await self.redis_client.exists(f"session:{session_id}"))
+            except Exception as e:
+                logging.error(f"Redis exists check failed for session {session_id}: {e}")
+                # Unknown is treated as alive so nothing gets cleaned up by mistake
+                return True
+        return False
     
     async def clear_expired_sessions(self):
-        """Clear expired sessions (Redis handles TTL automatically, this is for local cache)"""
-        if self.Config.REDIS_AVAILABLE:
-            # TTLCache handles expiration automatically
-            expired_count = len(self.local_cache) - self.Config.MAX_CACHE_SIZE
-            if expired_count > 0:
-                logging.info(f"Local cache auto-cleaned {expired_count} entries")
+        """Drop expired sessions from the local cache now instead of on the next write"""
+        if isinstance(self.local_cache, SessionCache):
+            # expire() runs the removal listeners for every session it drops
+            expired_keys = [key for key, _ in self.local_cache.expire()]
         else:
-            # Manual cleanup for simple dict
-            current_time = asyncio.get_event_loop().time()
-            expired_keys = []
-            for key, (data, timestamp) in self.local_cache.items():
-                if current_time - timestamp > self.Config.CACHE_TTL:
-                    expired_keys.append(key)
-            
+            # Plain dict fallback has no TTL of its own, age sessions by created_at
+            now = datetime.now()
+            expired_keys = [
+                key for key, data in self.local_cache.items()
+                if isinstance(data.get("created_at"), datetime)
+                and (now - data["created_at"]).total_seconds() > self.Config.CACHE_TTL
+            ]
             for key in expired_keys:
                 del self.local_cache[key]
-            
-            if expired_keys:
-                logging.info(f"Cleaned {len(expired_keys)} expired sessions from local cache")
+                self._notify_removed(key, "expired")
+        
+        if expired_keys:
+            logging.info(f"Cleaned {len(expired_keys)} expired sessions from local cache")
     
     async def get_cache_stats(self) -> Dict[str, Any]:
         """Get cache statistics"""
         stats = {
             "local_cache_size": len(self.local_cache),
+            "local_cache_bytes": getattr(self.local_cache, "total_bytes", None),
+            "local_cache_shared_bytes": getattr(self.local_cache, "shared_bytes", None),
+            "local_cache_budget_bytes": getattr(self.local_cache, "maxsize", None),
             "redis_available": self.redis_available,
             "redis_connected": self.redis_client is not None
         }
@@ -0,0 +1,222 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional
+import pandas as pd
+from .configs import *
+from .logger import *
+logging = get_logger(__name__)
+
+try:
+    import pyarrow  # noqa: F401 - required by DataFrame.to_parquet / pd.read_parquet
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+    logging.warning("pyarrow not available. DataFrames evicted from memory will not be spilled to disk.")
+
+
+@dataclass
+class StoredFrame:
+    """A session's DataFrame, either resident in memory or spilled to a Parquet file"""
+    sheet_url: str
+    size_bytes: int
+    last_access: float
+    frame: Optional[pd.DataFrame] = None
+    spill_path: Optional[str] = None
+
+
+class SessionDataFrameStore:
+    """Session-scoped DataFrame store shared by /start_session and the LangGraph tools.
+
+    Frames are kept in memory up to a byte budget. Once the budget is exceeded the
+    least recently used frames are spilled to Parquet files on local disk and read
+    back on the next lookup. Returned frames are shared, callers must not mutate them.
+
+    Memory is counted once per distinct frame object, since sessions on the same
+    sheet can share one frame. Sessions sharing a frame are spilled together to one
+    file, and spill listeners are told so other caches holding the frame can drop
+    their copy as well.
+    """
+
+    def __init__(self, config: Optional[DataFrameStoreConfig] = None):
+        self.Config = config or DataFrameStoreConfig()
+        self._entries: "OrderedDict[str, StoredFrame]" = OrderedDict()
+        self._lock = threading.RLock()
+        self.memory_bytes = 0
+        # id of a resident frame -> number of entries holding it
+        self._frame_refs: Dict[int, int] = {}
+        self._spill_listeners: List[Callable[[pd.DataFrame], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.spills = 0
+
+    def put(self, session_id: str, df: pd.DataFrame, sheet_url: str = ""):
+        """Store the DataFrame loaded for a session"""
+        size_bytes = int(df.memory_usage(deep=True).sum())
+        with self._lock:
+            self._remove(session_id)
+            self._entries[session_id] = StoredFrame(
+                sheet_url=sheet_url,
+                size_bytes=size_bytes,
+                last_access=time.monotonic(),
+                frame=df,
+            )
+            self._charge(self._entries[session_id])
+            self._expire()
+            self._enforce_budget(keep=session_id)
+        logging.info(f"Stored DataFrame for session {session_id}: {df.shape}, {size_bytes} bytes")
+
+    def get(self, session_id: str) -> Optional[pd.DataFrame]:
+        """Return the session's DataFrame, reloading it from disk if it was spilled"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            now = time.monotonic()
+            if now - entry.last_access > self.Config.TTL:
+                logging.info(f"DataFrame for session {session_id} expired")
+                self._remove(session_id)
+                self.misses += 1
+                return None
+
+            if entry.frame is None:
+                try:
+                    frame = pd.read_parquet(entry.spill_path)
+                except Exception as e:
+                    logging.error(f"Failed to reload spilled DataFrame for session {session_id}: {e}")
+                    self._remove(session_id)
+                    self.misses += 1
+                    return None
+                # Sessions spilled together share the reloaded frame again
+                for other in self._entries.values():
+                    if other.frame is None and other.spill_path == entry.spill_path:
+                        other.frame = frame
+                        self._charge(other)
+                logging.debug(f"Reloaded spilled DataFrame for session {session_id}")
+
+            entry.last_access = now
+            self._entries.move_to_end(session_id)
+            self.hits += 1
+            self._enforce_budget(keep=session_id)
+            return entry.frame
+
+    def resident_bytes(self, session_id: str) -> int:
+        """Memory held by a session's frame, 0 if it is missing or spilled to disk"""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return entry.size_bytes if entry is not None and entry.frame is not None else 0
+
+    def add_spill_listener(self, listener: Callable[[pd.DataFrame], None]):
+        """Register a callback(frame) run after a frame is spilled, to release other references to it"""
+        self._spill_listeners.append(listener)
+
+    def drop(self, session_id: str):
+        """Remove a session's DataFrame from memory and disk"""
+        with self._lock:
+            self._remove(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "sessions": len(self._entries),
+                "in_memory": sum(1 for entry in self._entries.values() if entry.frame is not None),
+                "memory_bytes": self.memory_bytes,
+                "max_memory_bytes": self.Config.MAX_MEMORY_BYTES,
+                "spills": self.spills,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def _remove(self, session_id: str):
+        entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return
+        if entry.frame is not None:
+            self._discharge(entry)
+        shared_file = any(other.spill_path == entry.spill_path for other in self._entries.values())
+        if entry.spill_path and not shared_file and os.path.exists(entry.spill_path):
+            try:
+                os.remove(entry.spill_path)
+            except OSError as e:
+                logging.warning(f"Could not remove spill file {entry.spill_path}: {e}")
+
+    def _charge(self, entry: StoredFrame):
+        key = id(entry.frame)
+        holders = self._frame_refs.get(key, 0)
+        if holders == 0:
+            self.memory_bytes += entry.size_bytes
+        self._frame_refs[key] = holders + 1
+
+    def _discharge(self, entry: StoredFrame):
+        key = id(entry.frame)
+        holders = self._frame_refs.get(key, 0) - 1
+        if holders > 0:
+            self._frame_refs[key] = holders
+        else:
+            self._frame_refs.pop(key, None)
+            self.memory_bytes -= entry.size_bytes
+
+    def _expire(self):
+        now = time.monotonic()
+        expired = [sid for sid, entry in self._entries.items() if now - entry.last_access > self.Config.TTL]
+        for session_id in expired:
+            self._remove(session_id)
+        if expired:
+            logging.info(f"Expired {len(expired)} session DataFrames")
+
+    def _enforce_budget(self, keep: str):
+        """Spill least recently used frames until memory use fits the budget"""
+        kept = self._entries.get(keep)
+        kept_frame = kept.frame if kept is not None else None
+        for session_id in list(self._entries.keys()):
+            if self.memory_bytes <= self.Config.MAX_MEMORY_BYTES:
+                break
+            entry = self._entries.get(session_id)
+            if entry is None or entry.frame is None or entry.frame is kept_frame:
+                continue
+            self._spill(session_id, entry)
+
+    def _spill(self, session_id: str, entry: StoredFrame):
+        """Spill a frame for every session holding it, so its memory is actually released"""
+        frame = entry.frame
+        holders = [sid for sid, other in self._entries.items() if other.frame is frame]
+        if not PARQUET_AVAILABLE:
+            logging.info(f"Dropping DataFrame for sessions {holders} (memory budget exceeded, no spill support)")
+            for holder in holders:
+                self._remove(holder)
+            self._notify_spilled(frame)
+            return
+        try:
+            os.makedirs(self.Config.SPILL_DIR, exist_ok=True)
+            safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", session_id)
+            path = os.path.join(self.Config.SPILL_DIR, f"{safe_id}.parquet")
+            frame.to_parquet(path)
+        except Exception as e:
+            logging.warning(f"Failed to spill DataFrame for sessions {holders}: {e}. Dropping it")
+            for holder in holders:
+                self._remove(holder)
+            self._notify_spilled(frame)
+            return
+        for holder in holders:
+            other = self._entries[holder]
+            other.spill_path = path
+            self._discharge(other)
+            other.frame = None
+        self.spills += 1
+        self._notify_spilled(frame)
+        logging.info(f"Spilled DataFrame for sessions {holders} to {path}")
+
+    def _notify_spilled(self, frame: pd.DataFrame):
+        for listener in self._spill_listeners:
+            try:
+                listener(frame)
+            except Exception as e:
+                logging.error(f"DataFrame spill listener failed: {e}")
+
+
+dataframe_store = SessionDataFrameStore()
@@ -0,0 +1,154 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from .configs import *
+from .logger import *
+logging = get_logger(__name__)
+
+try:
+    import fcntl
+    FILE_LOCKS_AVAILABLE = True
+except ImportError:
+    FILE_LOCKS_AVAILABLE = False
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class EmbeddingDiskCache:
+    """Content-addressed embedding store for one model.
+
+    Vectors live in an append-only float32 file that is read through a memory map,
+    and keys.txt holds one text hash per line, so line N is the key of row N.
+    Appends take an exclusive file lock, which keeps several workers on one box
+    from interleaving writes.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str):
+        self.model_name = model_name
+        self.directory = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]", "_", model_name))
+        os.makedirs(self.directory, exist_ok=True)
+        self.vectors_path = os.path.join(self.directory, "vectors.f32")
+        self.keys_path = os.path.join(self.directory, "keys.txt")
+        self.meta_path = os.path.join(self.directory, "meta.json")
+        self.lock_path = os.path.join(self.directory, ".lock")
+        self._lock = threading.Lock()
+        self._index: Dict[str, int] = {}
+        self._keys_offset = 0
+        self._vectors: Optional[np.memmap] = None
+        self.dim: Optional[int] = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path) as f:
+                self.dim = json.load(f)["dim"]
+        with self._lock:
+            self._refresh()
+
+    @contextmanager
+    def _file_lock(self):
+        if not FILE_LOCKS_AVAILABLE:
+            yield
+            return
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Pick up keys appended since the last read, possibly by another worker"""
+        if not os.path.exists(self.keys_path):
+            return
+        with open(self.keys_path, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        complete = data[:data.rfind(b"\n") + 1]
+        for line in complete.decode("ascii").splitlines():
+            self._index.setdefault(line, len(self._index))
+        self._keys_offset += len(complete)
+        self._remap()
+
+    def _remap(self):
+        rows = len(self._index)
+        if self.dim is None or rows == 0:
+            self._vectors = None
+            return
+        if self._vectors is None or self._vectors.shape[0] != rows:
+            self._vectors = np.memmap(self.vectors_path, dtype=np.float32, mode="r", shape=(rows, self.dim))
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def get_many(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            if any(h not in self._index for h in hashes):
+                self._refresh()
+            if self._vectors is None:
+                return {}
+            return {h: np.array(self._vectors[self._index[h]]) for h in hashes if h in self._index}
+
+    def put_many(self, hashes: List[str], vectors: np.ndarray):
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, "w") as f:
+                    json.dump({"model_name": self.model_name, "dim": self.dim}, f)
+            self._refresh()
+
+            new_rows = [i for i, h in enumerate(hashes) if h not in self._index]
+            if not new_rows:
+                return
+            with open(self.vectors_path, "ab") as f:
+                # Drop vectors left behind by a write that died before its keys were recorded
+                f.truncate(len(self._index) * self.dim * 4)
+                f.write(vectors[new_rows].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            with open(self.keys_path, "ab") as f:
+                f.write("".join(f"{hashes[i]}\n" for i in new_rows).encode("ascii"))
+            self._refresh()
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper that only embeds chunk texts not seen before by this model"""
+
+    def __init__(self, embeddings: Embeddings, model_name: str, config: Optional[EmbeddingCacheConfig] = None):
+        self.embeddings = embeddings
+        self.model_name = model_name
+        self.Config = config or EmbeddingCacheConfig()
+        self.cache = EmbeddingDiskCache(model_name, self.Config.CACHE_DIR)
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        found = self.cache.get_many(list(dict.fromkeys(hashes)))
+
+        missing: Dict[str, str] = {}
+        for h, text in zip(hashes, texts):
+            if h not in found:
+                missing.setdefault(h, text)
+        self.hits += len(texts) - sum(1 for h in hashes if h in missing)
+        self.misses += len(missing)
+
+        if missing:
+            new_vectors = np.asarray(self.embeddings.embed_documents(list(missing.values())), dtype=np.float32)
+            self.cache.put_many(list(missing.keys()), new_vectors)
+            found.update(zip(missing.keys(), new_vectors))
+            logging.info(f"Embedded {len(missing)} new chunks, {len(texts) - len(missing)} served from cache")
+
+        return [found[h].tolist() for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "cached_vectors": len(self.cache)}
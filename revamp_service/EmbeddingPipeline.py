@@ -0,0 +1,88 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, List, Optional
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from .configs import *
+from .logger import *
+logging = get_logger(__name__)
+
+
+class EmbeddingPipeline:
+    """Embeds chunks in fixed-size batches on a dedicated worker pool.
+
+    At most one batch per worker is in flight, and batches are added to the FAISS
+    index in chunk order, so docstore ids follow the chunks and finished vectors
+    don't pile up waiting. The event loop is never blocked on the embedding model,
+    and throughput of every run is kept for tuning.
+    """
+
+    def __init__(self, embeddings: Embeddings, config: Optional[EmbeddingPipelineConfig] = None):
+        self.embeddings = embeddings
+        self.Config = config or EmbeddingPipelineConfig()
+        self.executor = ThreadPoolExecutor(max_workers=self.Config.WORKERS, thread_name_prefix="embedding")
+        self.last_run: Dict[str, Any] = {}
+        self.total_chunks = 0
+        self.total_seconds = 0.0
+
+    async def build_index(self, texts: List[str], metadatas: Optional[List[Dict[str, Any]]] = None,
+                          batch_size: Optional[int] = None) -> FAISS:
+        if not texts:
+            raise ValueError("No chunks to index")
+        batch_size = batch_size or self.Config.BATCH_SIZE
+        metadatas = metadatas or [{} for _ in texts]
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+
+        def embed_batch(start: int) -> "asyncio.Future[List[List[float]]]":
+            batch = texts[start:start + batch_size]
+            return loop.run_in_executor(self.executor, self.embeddings.embed_documents, batch)
+
+        vectorstore: Optional[FAISS] = None
+        starts = range(0, len(texts), batch_size)
+        in_flight: Deque = deque()
+        try:
+            for start in starts:
+                in_flight.append((start, embed_batch(start)))
+                if len(in_flight) < self.Config.WORKERS:
+                    continue
+                vectorstore = await self._add_batch(vectorstore, texts, metadatas, *in_flight.popleft())
+            while in_flight:
+                vectorstore = await self._add_batch(vectorstore, texts, metadatas, *in_flight.popleft())
+        finally:
+            for _, pending in in_flight:
+                pending.cancel()
+
+        elapsed = time.perf_counter() - started
+        self.total_chunks += len(texts)
+        self.total_seconds += elapsed
+        self.last_run = {
+            "chunks": len(texts),
+            "batches": len(starts),
+            "batch_size": batch_size,
+            "workers": self.Config.WORKERS,
+            "seconds": round(elapsed, 3),
+            "chunks_per_second": round(len(texts) / elapsed, 2) if elapsed > 0 else None,
+        }
+        logging.info(f"Embedded {len(texts)} chunks in {elapsed:.2f}s "
+                     f"({self.last_run['chunks_per_second']} chunks/s, batch_size={batch_size}, workers={self.Config.WORKERS})")
+        return vectorstore
+
+    async def _add_batch(self, vectorstore: Optional[FAISS], texts: List[str], metadatas: List[Dict[str, Any]],
+                         start: int, pending: "asyncio.Future[List[List[float]]]") -> FAISS:
+        vectors = await pending
+        end = start + len(vectors)
+        text_embeddings = list(zip(texts[start:end], vectors))
+        if vectorstore is None:
+            return FAISS.from_embeddings(text_embeddings, self.embeddings, metadatas=metadatas[start:end])
+        vectorstore.add_embeddings(text_embeddings, metadatas=metadatas[start:end])
+        return vectorstore
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "last_run": self.last_run,
+            "total_chunks": self.total_chunks,
+            "average_chunks_per_second": round(self.total_chunks / self.total_seconds, 2) if self.total_seconds > 0 else None,
+        }
@@ -0,0 +1,116 @@
+import threading
+import weakref
+from typing import Any, Dict, List, Optional
+import numpy as np
+import pandas as pd
+from .logger import *
+logging = get_logger(__name__)
+
+class FilterIndex:
+    """Inverted index over one DataFrame for equality filters.
+
+    Each column is indexed the first time it is filtered on: normalized value -> sorted
+    int32 array of row positions. Text values are stripped and lower-cased like the
+    old scan did, numeric columns are keyed by float value. Column name resolution is
+    cached too, so repeated filters never rescan the frame. The frame is held weakly,
+    so an index never keeps a spilled or dropped frame in memory.
+    """
+
+    def __init__(self, df: pd.DataFrame):
+        self._df = weakref.ref(df)
+        self._columns: Dict[str, Optional[str]] = {}
+        self._postings: Dict[str, Dict[Any, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def df(self) -> pd.DataFrame:
+        df = self._df()
+        if df is None:
+            raise ReferenceError("The indexed DataFrame has been freed")
+        return df
+
+    def resolve_column(self, name: str) -> Optional[str]:
+        """Exact column name first, then the first case-insensitive partial match"""
+        if name not in self._columns:
+            if name in self.df.columns:
+                target = name
+            else:
+                matches = [c for c in self.df.columns if name.lower() in str(c).lower()]
+                target = matches[0] if matches else None
+            self._columns[name] = target
+        return self._columns[name]
+
+    def is_numeric(self, column: str) -> bool:
+        return pd.api.types.is_numeric_dtype(self.df[column])
+
+    def _build(self, column: str) -> Dict[Any, np.ndarray]:
+        series = self.df[column]
+        # Factorize once, then normalize only the distinct values instead of every cell
+        codes, uniques = pd.factorize(series, use_na_sentinel=True)
+        if self.is_numeric(column):
+            keys = [float(value) for value in uniques]
+        else:
+            keys = pd.Index(uniques).astype(str).str.strip().str.lower().tolist()
+
+        order = np.argsort(codes, kind="stable").astype(np.int32)
+        boundaries = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        postings: Dict[Any, np.ndarray] = {}
+        for code, key in enumerate(keys):
+            positions = order[boundaries[code]:boundaries[code + 1]]
+            if key in postings:
+                # Distinct raw values like " Yes" and "yes" normalize to the same key
+                positions = np.sort(np.concatenate([postings[key], positions]))
+            postings[key] = positions
+        return postings
+
+    def postings(self, column: str) -> Dict[Any, np.ndarray]:
+        with self._lock:
+            postings = self._postings.get(column)
+        if postings is None:
+            postings = self._build(column)
+            with self._lock:
+                self._postings[column] = postings
+            logging.debug(f"Indexed column '{column}': {len(postings)} distinct values")
+        return postings
+
+    def lookup(self, column: str, value: Any) -> np.ndarray:
+        """Row positions where column equals value; raises ValueError for non-numeric values on numeric columns"""
+        if self.is_numeric(column):
+            key = float(value)
+        else:
+            key = str(value).strip().lower()
+        return self.postings(column).get(key, np.empty(0, dtype=np.int32))
+
+
+def intersect_positions(position_lists: List[np.ndarray]) -> np.ndarray:
+    """AND of several sorted position arrays, smallest first so the work shrinks fast"""
+    ordered = sorted(position_lists, key=len)
+    result = ordered[0]
+    for positions in ordered[1:]:
+        if len(result) == 0:
+            break
+        result = np.intersect1d(result, positions, assume_unique=True)
+    return result
+
+
+# id(frame) -> index; entries go away with their frame, before its id can be reused
+_indexes: Dict[int, FilterIndex] = {}
+# Reentrant: a frame freed while the lock is held runs _forget_frame on the same thread
+_indexes_lock = threading.RLock()
+
+
+def _forget_frame(frame_id: int):
+    with _indexes_lock:
+        _indexes.pop(frame_id, None)
+
+
+def filter_index_for(df: pd.DataFrame) -> FilterIndex:
+    """Index for this exact frame object; frames from the DataFrame store are shared per session"""
+    with _indexes_lock:
+        index = _indexes.get(id(df))
+        if index is not None:
+            return index
+        index = FilterIndex(df)
+        _indexes[id(df)] = index
+        weakref.finalize(df, _forget_frame, id(df))
+        return index
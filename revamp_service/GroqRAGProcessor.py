@@ -1,6 +1,7 @@
 import asyncio
+import hashlib
 import logging
-from typing import Dict, List, Any
+from typing import AsyncIterator, Dict, Iterable, Iterator, List, Any, Optional, Set, Tuple
 from .models import *
 import pandas as pd
 from langchain_text_splitters import RecursiveCharacterTextSplitter
@@ -15,6 +16,16 @@ from .Simpleneo4jKB import *
 from langchain_groq import ChatGroq
 from langchain_core.output_parsers import StrOutputParser
 from .graph import build_tools_graph
+from .DataFrameStore import dataframe_store
+from .WorksheetFetcher import worksheet_fetcher
+from .row_text import render_text_rows, iter_text_rows
+from .row_chunker import chunk_rows
+from .EmbeddingCache import CachedEmbeddings
+from .EmbeddingPipeline import EmbeddingPipeline
+from .VectorIndexRegistry import index_registry
+from .QueryCache import query_cache
+from .QueryRouter import query_router
+from .IndexCodec import index_codec
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -26,26 +37,61 @@ class GroqRAGProcessor:
         self.session_manager = EnhancedSessionManager()  
         self.graph_kb = Simpleneo4jKB()
         self.embedding_model = None
+        self.embedding_pipeline = None
         self.Config = GroqChatRag()
         self.tools_graph = build_tools_graph()
+        self.dataframe_store = dataframe_store
+        self.index_registry = index_registry
+        self.query_cache = query_cache
+        self._graph_cleanups: Set[asyncio.Task] = set()
+        self.session_manager.add_removal_listener(self._on_session_removed)
+        # The fetcher keeps parsed frames too, a spill only frees memory once it lets go of its copy
+        self.dataframe_store.add_spill_listener(worksheet_fetcher.release_frame)
+    
+    def _on_session_removed(self, session_id: str, reason: str):
+        # Sessions leaving the cache give their reference on the shared index back
+        self.index_registry.release(session_id)
+        # The tools reload the sheet on demand, so a frame is never needed past its session
+        self.dataframe_store.drop(session_id)
+        # Evicted and invalidated sessions still live in Redis, only deleted or expired ones lose their graph
+        if reason in ("deleted", "expired") and self.graph_kb.enabled:
+            try:
+                task = asyncio.get_running_loop().create_task(self._cleanup_session_graph(session_id, reason))
+            except RuntimeError:
+                # No loop to run on; the periodic graph GC picks the session up once expires_at passes
+                return
+            self._graph_cleanups.add(task)
+            task.add_done_callback(self._graph_cleanups.discard)
+    
+    async def _cleanup_session_graph(self, session_id: str, reason: str):
+        # A local expiry can race another worker that just refreshed the session
+        if reason == "expired" and await self.session_manager.session_exists(session_id):
+            return
+        await self.graph_kb.delete_session_graph(session_id)
+    
     async def initialize(self):
         """Initialize components"""
         await self.session_manager.init_redis()
         await self.graph_kb.init_neo4j()
         self.graph_kb.init_nlp()
+        self.graph_kb.start_gc(self.session_manager.session_exists)
         
         self.embedding_model = HuggingFaceEmbeddings(
             model_name=self.Config.EMBEDDING_MODEL
         )
+        if EmbeddingCacheConfig.ENABLED:
+            # Sessions for the same sheet share most chunks, only embed the ones not seen before
+            self.embedding_model = CachedEmbeddings(self.embedding_model, self.Config.EMBEDDING_MODEL)
+        self.embedding_pipeline = EmbeddingPipeline(self.embedding_model)
         logging.info("RAG Processor initialized")
     
     def dataframe_to_text_rows(self, df: pd.DataFrame) -> List[str]:
         """Convert dataframe to text rows"""
-        rows = []
-        for _, row in df.iterrows():
-            row_text = " | ".join([f"{col}: {val}" for col, val in row.items() if pd.notna(val)])
-            rows.append(row_text)
-        return rows
+        return render_text_rows(df, skip_na=True)
+    
+    def iter_dataframe_text_rows(self, df: pd.DataFrame) -> Iterator[str]:
+        """Generator version of dataframe_to_text_rows so chunking can start early"""
+        return iter_text_rows(df, skip_na=True)
     
     def create_chunks(self, text: str) -> List[str]:
         """Create text chunks with logging"""
@@ -62,11 +108,31 @@ class GroqRAGProcessor:
         
         return chunks
     
-    def create_simple_qa_system(self, chunks: List[str], description: str):
+    def create_row_chunks(self, rows: Iterable[str]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Pack whole rows into chunks, recording the source row ids of each chunk"""
+        chunks = []
+        metadatas = []
+        for index, chunk in enumerate(chunk_rows(rows, self.Config.CHUNK_SIZE, self.Config.CHUNK_OVERLAP_ROWS)):
+            chunks.append(chunk.text)
+            metadatas.append({
+                "chunk_index": index,
+                "row_ids": chunk.row_ids,
+                "row_start": chunk.row_ids[0],
+                "row_end": chunk.row_ids[-1],
+            })
+        logging.info(f"Created {len(chunks)} row chunks")
+        return chunks, metadatas
+    
+    async def create_simple_qa_system(self, chunks: List[str], description: str,
+                                      metadatas: Optional[List[Dict[str, Any]]] = None):
         """Create simple QA system"""
-        documents = [Document(page_content=chunk) for chunk in chunks]
-        
-        vectorstore = FAISS.from_documents(documents, self.embedding_model)
+        # Embedding runs batched on the pipeline's worker pool instead of blocking the event loop
+        vectorstore = await self.embedding_pipeline.build_index(chunks, metadatas)
+        logging.info(f"QA system created with {len(chunks)} chunks")
+        return self._assemble_qa_components(vectorstore, chunks)
+    
+    def _assemble_qa_components(self, vectorstore: FAISS, chunks: List[str]) -> Dict[str, Any]:
+        """Wrap a vector index into the retriever and chain used to answer questions"""
         retriever = vectorstore.as_retriever(search_kwargs={"k": min(len(chunks), 10)})
         
         llm = ChatGroq(
@@ -78,7 +144,6 @@ class GroqRAGProcessor:
         output_parser = StrOutputParser()
         evaluation_chain = chatbot_prompt | llm | output_parser
         
-        logging.info(f"QA system created with {len(chunks)} chunks")
         return {
             "retriever": retriever,
             "qa_chain": evaluation_chain,
@@ -86,10 +151,96 @@ class GroqRAGProcessor:
             "chunks": chunks
         }
     
+    def index_key(self, content_hash: str) -> str:
+        """Identity of a vector index: sheet content plus everything that changes the chunks or vectors"""
+        return f"{content_hash}:{self.Config.CHUNK_SIZE}:{self.Config.CHUNK_OVERLAP_ROWS}:{self.Config.EMBEDDING_MODEL}"
+    
+    async def acquire_qa_system(self, session_id: str, df: pd.DataFrame, description: str,
+                                content_hash: Optional[str] = None) -> Dict[str, Any]:
+        """Get the QA system for a sheet, sharing one index between sessions on the same content"""
+        if content_hash is None:
+            content_hash = self.frame_content_hash(df)
+        index_key = self.index_key(content_hash)
+        
+        async def build():
+            chunks, chunk_metadata = self.create_row_chunks(self.iter_dataframe_text_rows(df))
+            qa_components = await self.create_simple_qa_system(chunks, description, chunk_metadata)
+            # Persist the index so other workers, or this one after a restart, can restore it
+            payload = await asyncio.to_thread(index_codec.encode, qa_components["vectorstore"])
+            await self.session_manager.save_index(index_key, payload)
+            return qa_components
+        
+        return await self.index_registry.acquire(index_key, session_id, build)
+    
+    @staticmethod
+    def frame_content_hash(df: pd.DataFrame) -> str:
+        """Content hash for frames that didn't come through the worksheet fetcher"""
+        digest = hashlib.sha256("\x1f".join(map(str, df.columns)).encode("utf-8"))
+        digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+        return digest.hexdigest()
+    
+    async def ensure_qa_components(self, session_id: str, session_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Restore qa_components for a session cached without them, e.g. one created by another worker"""
+        if isinstance(session_data.get("qa_components"), dict):
+            return session_data
+        index_key = session_data.get("index_key")
+        if not index_key:
+            return None
+        
+        async def restore():
+            payload = await self.session_manager.load_index(index_key)
+            if payload is None:
+                raise LookupError(f"Vector index {index_key} not found")
+            # Rebuilt from the raw index and a JSON docstore, so a tampered payload can't run code here
+            try:
+                vectorstore = await asyncio.to_thread(index_codec.decode, payload, self.embedding_model)
+            except (ValueError, RuntimeError) as e:
+                raise LookupError(f"Vector index {index_key} is unreadable: {e}")
+            documents = [vectorstore.docstore.search(doc_id) for doc_id in vectorstore.index_to_docstore_id.values()]
+            documents.sort(key=lambda doc: doc.metadata.get("chunk_index", 0))
+            logging.info(f"Restored vector index {index_key[:16]} with {len(documents)} chunks for session {session_id}")
+            return self._assemble_qa_components(vectorstore, [doc.page_content for doc in documents])
+        
+        try:
+            qa_components = await self.index_registry.acquire(index_key, session_id, restore)
+        except LookupError as e:
+            logging.warning(f"Cannot restore session {session_id}: {e}")
+            return None
+        session_data["qa_components"] = qa_components
+        self.attach_footprint(session_id, session_data)
+        self.session_manager.cache_locally(session_id, session_data)
+        return session_data
+    
+    def attach_footprint(self, session_id: str, session_data: Dict[str, Any]) -> int:
+        """Measure what a session keeps in memory so the session cache can evict by bytes.
+
+        The vector index and the sheet frame are shared by every session on the same content,
+        so they are recorded under shared keys that the session cache charges only once.
+        """
+        shared: Dict[str, int] = {}
+        qa_components = session_data.get("qa_components")
+        if isinstance(qa_components, dict):
+            index_bytes = 0
+            vectorstore = qa_components.get("vectorstore")
+            if vectorstore is not None:
+                index_bytes = vectorstore.index.ntotal * vectorstore.index.d * 4
+            # The docstore holds the same chunk strings, so the text is only counted once
+            chunk_bytes = sum(len(chunk) for chunk in qa_components.get("chunks", []))
+            index_key = session_data.get("index_key") or self.index_registry.key_for_session(session_id) or session_id
+            shared[f"index:{index_key}"] = index_bytes + chunk_bytes
+        frame_bytes = self.dataframe_store.resident_bytes(session_id)
+        if frame_bytes:
+            # The worksheet fetcher hands every session on the same content the same frame
+            content_hash = (session_data.get("metadata") or {}).get("content_hash")
+            shared[f"frame:{content_hash or session_id}"] = frame_bytes
+        session_data["shared_footprint"] = shared
+        session_data["footprint_bytes"] = len(str(session_data.get("description", "")))
+        return session_data["footprint_bytes"] + sum(shared.values())
+    
     async def process_and_store_data(self, chunks: List[str], session_id: str, description: str):
         """Process data and create both vector and graph stores"""
         # Create QA system
-        qa_components = self.create_simple_qa_system(chunks, description)
+        qa_components = await self.create_simple_qa_system(chunks, description)
         
         # Create graph knowledge base
         if self.graph_kb.enabled:
@@ -128,7 +279,8 @@ class GroqRAGProcessor:
         
         # Try graph search if enabled
         graph_results = []
-        if use_hybrid and self.graph_kb.enabled:
+        # The graph is built in the background, vector search alone answers until it is ready
+        if use_hybrid and self.graph_kb.enabled and await self.graph_kb.is_ready(session_data["session_id"]):
             logging.info("Attempting graph search...")
             graph_results = await self.graph_kb.graph_search(question, session_data["session_id"])
             logging.info(f"Graph search returned {len(graph_results)} results")
@@ -136,7 +288,7 @@ class GroqRAGProcessor:
             for i, result in enumerate(graph_results[:2]):  # Log first 2 results
                 logging.debug(f"Graph result {i}: {result[:100]}...")
         else:
-            logging.info("Graph search skipped (disabled or not requested)")
+            logging.info("Graph search skipped (disabled, not requested or not built yet)")
         
         # Combine contexts
         vector_context = "\n\n".join([doc.page_content for doc in docs])
@@ -186,6 +338,69 @@ class GroqRAGProcessor:
             debug_info["graph_contents"] = graph_debug
         
         return debug_info
+    async def _lookup_cached_answer(self, question: str, session_data: Dict[str, Any]):
+        """Check the answer cache; returns the lookup to store the answer under on a miss"""
+        # Answers are shared by every session on the same sheet content
+        sheet_key = session_data.get("index_key") if self.query_cache.Config.ENABLED else None
+        if not sheet_key:
+            return None
+        embed_query = self.embedding_model.embed_query if self.embedding_model else None
+        # The description goes into the answer prompt, so it is part of the key too
+        return await self.query_cache.lookup(sheet_key, question, embed_query, session_data.get("description", ""))
+    
+    async def _prepare_graph_state(self, question: str, session_data: Dict[str, Any]):
+        """Retrieve context for the question and build the LangGraph input state"""
+        retriever = session_data["qa_components"]["retriever"]
+        
+        # Get relevant documents
+        logger.info("🔍 Retrieving relevant documents...")
+        docs = await asyncio.get_event_loop().run_in_executor(
+            None, 
+            retriever.invoke,
+            question
+        )
+        logger.info(f"✅ Retrieved {len(docs)} documents")
+        
+        context = "\n\n".join([doc.page_content for doc in docs])
+        logger.info(f"📄 Total context length: {len(context)} characters")
+
+        # Prepare LangGraph state
+        state = {
+            "question": question,
+            "context": context,
+            "session_id": session_data["session_id"],
+            "dataset_description": session_data["metadata"]["columns"],
+            "sheet_url": session_data["metadata"]["sheet_url"],
+            "analysis": {},
+            "answer": "",
+            "decision": ""
+        }
+        
+        logger.info(f"🌐 Sheet URL: {state['sheet_url'][:50]}...")
+        logger.info(f"📊 Available columns: {[c.get('name', c) for c in state['dataset_description']]}")
+        return state, docs, context
+    
+    async def _finish_answer(self, result_state: Dict[str, Any], docs, context: str, cache_lookup) -> Dict[str, Any]:
+        """Turn the final graph state into the query result and cache it"""
+        tool_used = "MCP Analysis (Complete Dataset)" if result_state.get("analysis") and not result_state["analysis"].get("error") else "Context Only (Sample Data)"
+        
+        result = {
+            "answer": result_state.get("answer", "Unable to generate answer"),
+            "used_tool": tool_used,
+            "context_length": len(context),
+            "sources": [doc.metadata for doc in docs] if docs else []
+        }
+        
+        if cache_lookup is not None and not (result_state.get("analysis") or {}).get("error"):
+            embed_query = self.embedding_model.embed_query if self.embedding_model else None
+            await self.query_cache.store(cache_lookup, result, embed_query)
+        
+        logger.info("=" * 80)
+        logger.info("✅ QUERY PROCESSING COMPLETED")
+        logger.info(f"🔧 Tool used: {result['used_tool']}")
+        logger.info("=" * 80)
+        return result
+    
     async def answer_question_with_tools(self, question: str, session_data: Dict[str, Any], use_hybrid: bool = True) -> Dict[str, Any]:
         """Answer a question using LangGraph tools workflow"""
         
@@ -195,33 +410,12 @@ class GroqRAGProcessor:
         logger.info(f"📝 Question: {question}")
         
         try:
-            retriever = session_data["qa_components"]["retriever"]
-            
-            # Get relevant documents
-            logger.info("🔍 Retrieving relevant documents...")
-            docs = await asyncio.get_event_loop().run_in_executor(
-                None, 
-                retriever.invoke,
-                question
-            )
-            logger.info(f"✅ Retrieved {len(docs)} documents")
+            cache_lookup = await self._lookup_cached_answer(question, session_data)
+            if cache_lookup is not None and cache_lookup.result is not None:
+                logger.info(f"⚡ Answer served from query cache ({cache_lookup.tier} match)")
+                return dict(cache_lookup.result)
             
-            context = "\n\n".join([doc.page_content for doc in docs])
-            logger.info(f"📄 Total context length: {len(context)} characters")
-
-            # Prepare LangGraph state
-            state = {
-                "question": question,
-                "context": context,
-                "dataset_description": session_data["metadata"]["columns"],
-                "sheet_url": session_data["metadata"]["sheet_url"],
-                "analysis": {},
-                "answer": "",
-                "decision": ""
-            }
-            
-            logger.info(f"🌐 Sheet URL: {state['sheet_url'][:50]}...")
-            logger.info(f"📊 Available columns: {[c.get('name', c) for c in state['dataset_description']]}")
+            state, docs, context = await self._prepare_graph_state(question, session_data)
 
             # Run the graph
             logger.info("🔄 Invoking LangGraph workflow...")
@@ -241,22 +435,7 @@ class GroqRAGProcessor:
                 logger.error(f"❌ LangGraph execution failed: {str(graph_error)}")
                 raise
 
-            # Return final result
-            tool_used = "MCP Analysis (Complete Dataset)" if result_state.get("analysis") and not result_state["analysis"].get("error") else "Context Only (Sample Data)"
-            
-            result = {
-                "answer": result_state.get("answer", "Unable to generate answer"),
-                "used_tool": tool_used,
-                "context_length": len(context),
-                "sources": [doc.metadata for doc in docs] if docs else []
-            }
-            
-            logger.info("=" * 80)
-            logger.info("✅ QUERY PROCESSING COMPLETED")
-            logger.info(f"🔧 Tool used: {result['used_tool']}")
-            logger.info("=" * 80)
-            
-            return result
+            return await self._finish_answer(result_state, docs, context, cache_lookup)
             
         except Exception as e:
             logger.error(f"❌ Error in answer_question_with_tools: {str(e)}", exc_info=True)
@@ -267,12 +446,70 @@ class GroqRAGProcessor:
                 "error": str(e)
             }
 
+    async def stream_answer_with_tools(self, question: str, session_data: Dict[str, Any]) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Run the tools workflow, yielding (event, data) pairs as it progresses.
+
+        Emits "decision" and "tool" events as graph nodes finish, "token" events for the
+        answer as the LLM produces it, then "done" with the full result or "error".
+        """
+        logger.info(f"🚀 STARTING STREAMED QUERY: {question}")
+        try:
+            cache_lookup = await self._lookup_cached_answer(question, session_data)
+            if cache_lookup is not None and cache_lookup.result is not None:
+                logger.info(f"⚡ Answer served from query cache ({cache_lookup.tier} match)")
+                yield "token", {"text": cache_lookup.result.get("answer", "")}
+                yield "done", {**cache_lookup.result, "cached": True}
+                return
+            
+            state, docs, context = await self._prepare_graph_state(question, session_data)
+            yield "retrieval", {"documents": len(docs), "context_length": len(context)}
+            
+            result_state = dict(state)
+            async for mode, chunk in self.tools_graph.astream(state, stream_mode=["updates", "messages"]):
+                if mode == "messages":
+                    message, metadata = chunk
+                    if metadata.get("langgraph_node") == "answer" and message.content:
+                        yield "token", {"text": message.content}
+                    continue
+                
+                for node, update in chunk.items():
+                    if not update:
+                        continue
+                    result_state.update(update)
+                    if node == "decision":
+                        yield "decision", {
+                            "decision": update.get("decision"),
+                            "filter_conditions": update.get("filter_conditions", {})
+                        }
+                    elif node == "mcp_analysis":
+                        analysis = update.get("analysis") or {}
+                        yield "tool", {"tool": "analysis", "error": analysis.get("error"),
+                                       "total_rows": analysis.get("_metadata", {}).get("total_rows")}
+                    elif node == "filter_rows":
+                        filtered = update.get("filtered_data") or {}
+                        yield "tool", {"tool": "filter_rows", "error": filtered.get("error"),
+                                       "total_matches": filtered.get("total_matches")}
+            
+            result = await self._finish_answer(result_state, docs, context, cache_lookup)
+            yield "done", result
+        
+        except Exception as e:
+            logger.error(f"❌ Error in stream_answer_with_tools: {str(e)}", exc_info=True)
+            yield "error", {"error": str(e)}
+
     async def get_system_stats(self) -> Dict[str, Any]:
         """Get system statistics including cache performance"""
         cache_stats = await self.session_manager.get_cache_stats()
         return {
             "cache_stats": cache_stats,
+            "dataframe_store": self.dataframe_store.stats(),
+            "vector_indexes": self.index_registry.stats(),
+            "query_cache": self.query_cache.stats(),
+            "query_router": query_router.stats(),
             "graph_enabled": self.graph_kb.enabled,
+            "graph_gc": self.graph_kb.gc_stats,
             "embedding_model": getattr(self.Config, 'EMBEDDING_MODEL', 'Unknown'),
+            "embedding_cache": self.embedding_model.stats() if isinstance(self.embedding_model, CachedEmbeddings) else None,
+            "embedding_pipeline": self.embedding_pipeline.stats() if self.embedding_pipeline else None,
             "llm_model": getattr(self.Config, 'LLM_MODEL', 'Unknown')
         }
\ No newline at end of file
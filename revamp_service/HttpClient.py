@@ -0,0 +1,124 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+from .configs import *
+from .logger import *
+logging = get_logger(__name__)
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Methods that are safe to send twice; a 5xx or dropped connection after a POST may still have applied it
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE"})
+
+
+class RetryBudget:
+    """Caps retries to a fraction of the requests made, so an outage can't turn into a retry storm"""
+
+    def __init__(self, ratio: float, reserve: float):
+        self.ratio = ratio
+        self.reserve = reserve
+        self.tokens = reserve
+
+    def record_request(self):
+        self.tokens = min(self.reserve, self.tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class PooledHttpClient:
+    """Shared keep-alive httpx.AsyncClient with per-host limits, timeouts and a retry budget"""
+
+    def __init__(self, config: Optional[HttpClientConfig] = None):
+        self.Config = config or HttpClientConfig()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.retry_budget = RetryBudget(self.Config.RETRY_BUDGET_RATIO, self.Config.RETRY_BUDGET_RESERVE)
+        self.stats = {"requests": 0, "retries": 0, "retries_denied": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.Config.MAX_CONNECTIONS,
+                    max_keepalive_connections=self.Config.MAX_KEEPALIVE_CONNECTIONS,
+                    keepalive_expiry=self.Config.KEEPALIVE_EXPIRY,
+                ),
+                timeout=httpx.Timeout(self.Config.READ_TIMEOUT, connect=self.Config.CONNECT_TIMEOUT),
+                follow_redirects=True,
+            )
+            logging.info("Created pooled HTTP client")
+        return self._client
+
+    def _host_limit(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        if host not in self._host_limits:
+            self._host_limits[host] = asyncio.Semaphore(self.Config.MAX_CONNECTIONS_PER_HOST)
+        return self._host_limits[host]
+
+    async def request(self, method: str, url: str, retry: Optional[bool] = None, **kwargs) -> httpx.Response:
+        """Send a request, retrying transport errors and retryable statuses within the budget.
+
+        Only idempotent methods are retried by default, callers opt other methods in with retry=True.
+        """
+        if retry is None:
+            retry = method.upper() in IDEMPOTENT_METHODS
+        attempt = 0
+        while True:
+            self.stats["requests"] += 1
+            self.retry_budget.record_request()
+            error: Optional[Exception] = None
+            response: Optional[httpx.Response] = None
+            try:
+                async with self._host_limit(url):
+                    response = await self.client.request(method, url, **kwargs)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+            except httpx.TransportError as e:
+                error = e
+
+            if not retry or attempt >= self.Config.MAX_RETRIES:
+                break
+            if not self.retry_budget.try_withdraw():
+                self.stats["retries_denied"] += 1
+                logging.warning(f"Retry budget exhausted, not retrying {method} {url}")
+                break
+
+            attempt += 1
+            self.stats["retries"] += 1
+            reason = str(error) if error else f"HTTP {response.status_code}"
+            logging.warning(f"Retrying {method} {url} ({reason}), attempt {attempt}/{self.Config.MAX_RETRIES}")
+            await asyncio.sleep(self.Config.RETRY_BACKOFF * (2 ** (attempt - 1)))
+
+        if error is not None:
+            raise error
+        return response
+
+    async def get(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        return await self.request("POST", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, method: str, url: str, **kwargs) -> AsyncIterator[httpx.Response]:
+        """Stream a response body. Streams are not retried since the body may be partly consumed"""
+        self.stats["requests"] += 1
+        self.retry_budget.record_request()
+        async with self._host_limit(url):
+            async with self.client.stream(method, url, **kwargs) as response:
+                yield response
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            logging.info("Closed pooled HTTP client")
+
+
+http_client = PooledHttpClient()
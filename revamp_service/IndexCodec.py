@@ -0,0 +1,58 @@
+import json
+import struct
+from typing import Any, Dict
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+MAGIC = b"VI"
+CODEC_VERSION = 1
+# magic, version, length of the JSON docstore section
+HEADER = struct.Struct(">2sBI")
+
+
+class IndexCodec:
+    """Pickle-free encoding for the shared FAISS indexes kept in Redis.
+
+    Layout: "VI" | version | docstore length | JSON(docstore) | faiss.serialize_index bytes.
+    The docstore section holds each chunk's text and metadata in index order, so the
+    vectorstore is rebuilt from plain data and nothing read back from Redis is ever unpickled.
+    """
+
+    def encode(self, vectorstore: FAISS) -> bytes:
+        documents = []
+        for position in range(vectorstore.index.ntotal):
+            doc_id = vectorstore.index_to_docstore_id[position]
+            document = vectorstore.docstore.search(doc_id)
+            documents.append({"id": doc_id, "text": document.page_content, "metadata": document.metadata})
+        docstore = json.dumps({"documents": documents}, ensure_ascii=False).encode("utf-8")
+        index = faiss.serialize_index(vectorstore.index)
+        return HEADER.pack(MAGIC, CODEC_VERSION, len(docstore)) + docstore + index.tobytes()
+
+    def decode(self, payload: bytes, embeddings: Embeddings) -> FAISS:
+        if len(payload) < HEADER.size or payload[:2] != MAGIC:
+            raise ValueError("Not a vector index payload")
+        _, version, docstore_length = HEADER.unpack_from(payload)
+        if version != CODEC_VERSION:
+            raise ValueError(f"Unsupported index codec version {version}")
+        start = HEADER.size
+        documents = json.loads(payload[start:start + docstore_length])["documents"]
+        index = faiss.deserialize_index(np.frombuffer(payload, dtype=np.uint8, offset=start + docstore_length))
+        if index.ntotal != len(documents):
+            raise ValueError(f"Index has {index.ntotal} vectors but {len(documents)} documents")
+        docstore: Dict[str, Any] = {
+            document["id"]: Document(page_content=document["text"], metadata=document["metadata"])
+            for document in documents
+        }
+        return FAISS(
+            embedding_function=embeddings,
+            index=index,
+            docstore=InMemoryDocstore(docstore),
+            index_to_docstore_id={position: document["id"] for position, document in enumerate(documents)},
+        )
+
+
+index_codec = IndexCodec()
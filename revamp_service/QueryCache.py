@@ -0,0 +1,157 @@
+import asyncio
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from cachetools import TTLCache
+from .configs import *
+from .logger import *
+logging = get_logger(__name__)
+
+
+QUOTED_PATTERN = re.compile(r'"([^"]+)"|\u201c([^\u201d]+)\u201d|(?<!\w)\'([^\']+)\'(?!\w)')
+NUMBER_PATTERN = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace so trivial rewordings share a key"""
+    return " ".join(re.sub(r"[^\w\s]", " ", question.lower()).split())
+
+
+def question_literals(question: str) -> Tuple[str, ...]:
+    """Numbers and quoted values in a question, which a semantic match must not paper over"""
+    quoted = [" ".join("".join(groups).lower().split()) for groups in QUOTED_PATTERN.findall(question)]
+    numbers = [repr(float(number)) for number in NUMBER_PATTERN.findall(question)]
+    return tuple(sorted(quoted + numbers))
+
+
+def context_key(description: str) -> str:
+    """Short digest of the session description, which goes into the answer prompt"""
+    return hashlib.sha1(description.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass
+class CacheLookup:
+    sheet_key: str
+    normalized: str
+    context: str = ""
+    literals: Tuple[str, ...] = ()
+    result: Optional[Dict[str, Any]] = None
+    tier: Optional[str] = None
+    vector: Optional[np.ndarray] = None
+
+
+class QueryCache:
+    """Answer cache keyed by (sheet content key, description digest, normalized question).
+
+    The exact tier is a TTLCache. The optional semantic tier embeds the question
+    with the local embedding model and reuses an answer given on the same sheet and
+    description when cosine similarity passes the threshold and both questions carry
+    the same numbers and quoted values ("rated 5" never matches "rated 4"). Content
+    keys change with the sheet, so answers from an older copy of a sheet are never served.
+    """
+
+    def __init__(self, config: Optional[QueryCacheConfig] = None):
+        self.Config = config or QueryCacheConfig()
+        self._answers: TTLCache = TTLCache(maxsize=self.Config.MAX_ENTRIES, ttl=self.Config.TTL)
+        # sheet key -> (description digest, literals) -> normalized question -> unit vector, oldest first
+        self._vectors: Dict[str, Dict[Tuple[str, Tuple[str, ...]], "OrderedDict[str, np.ndarray]"]] = {}
+        self._sheet_keys: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.stats_counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "invalidations": 0}
+
+    def track_sheet(self, sheet_url: str, sheet_key: str):
+        """Remember the current content key of a sheet, dropping answers for its previous content"""
+        with self._lock:
+            previous = self._sheet_keys.get(sheet_url)
+            self._sheet_keys[sheet_url] = sheet_key
+        if previous is not None and previous != sheet_key:
+            self.invalidate(previous)
+
+    def invalidate(self, sheet_key: str):
+        with self._lock:
+            for key in [key for key in self._answers.keys() if key[0] == sheet_key]:
+                self._answers.pop(key, None)
+            self._vectors.pop(sheet_key, None)
+            self.stats_counters["invalidations"] += 1
+        logging.info(f"Invalidated cached answers for sheet {sheet_key[:16]}")
+
+    async def lookup(self, sheet_key: str, question: str,
+                     embed_query: Optional[Callable[[str], List[float]]] = None,
+                     description: str = "") -> CacheLookup:
+        lookup = CacheLookup(sheet_key=sheet_key, normalized=normalize_question(question),
+                             context=context_key(description), literals=question_literals(question))
+        with self._lock:
+            result = self._answers.get(self._answer_key(lookup))
+        if result is not None:
+            lookup.result, lookup.tier = result, "exact"
+            self.stats_counters["exact_hits"] += 1
+            return lookup
+
+        if self.Config.SEMANTIC_ENABLED and embed_query is not None and self._bucket(lookup):
+            vector = np.asarray(await asyncio.to_thread(embed_query, lookup.normalized), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            lookup.vector = vector / norm if norm else vector
+            match = self._nearest(lookup)
+            if match is not None:
+                lookup.result, lookup.tier = match, "semantic"
+                self.stats_counters["semantic_hits"] += 1
+                return lookup
+
+        self.stats_counters["misses"] += 1
+        return lookup
+
+    @staticmethod
+    def _answer_key(lookup: CacheLookup) -> Tuple[str, str, str]:
+        return lookup.sheet_key, lookup.context, lookup.normalized
+
+    def _bucket(self, lookup: CacheLookup) -> Optional["OrderedDict[str, np.ndarray]"]:
+        """Vectors of questions asked with the same description and the same literals"""
+        return self._vectors.get(lookup.sheet_key, {}).get((lookup.context, lookup.literals))
+
+    def _nearest(self, lookup: CacheLookup) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            stored = self._bucket(lookup)
+            if not stored:
+                return None
+            questions = list(stored.keys())
+            similarities = np.stack(list(stored.values())) @ lookup.vector
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.Config.SEMANTIC_THRESHOLD:
+                return None
+            result = self._answers.get((lookup.sheet_key, lookup.context, questions[best]))
+            if result is None:
+                # The answer expired, forget its vector too
+                del stored[questions[best]]
+            return result
+
+    async def store(self, lookup: CacheLookup, result: Dict[str, Any],
+                    embed_query: Optional[Callable[[str], List[float]]] = None):
+        with self._lock:
+            self._answers[self._answer_key(lookup)] = result
+        if not (self.Config.SEMANTIC_ENABLED and embed_query is not None):
+            return
+        vector = lookup.vector
+        if vector is None:
+            vector = np.asarray(await asyncio.to_thread(embed_query, lookup.normalized), dtype=np.float32)
+            norm = np.linalg.norm(vector)
+            vector = vector / norm if norm else vector
+        with self._lock:
+            buckets = self._vectors.setdefault(lookup.sheet_key, {})
+            stored = buckets.setdefault((lookup.context, lookup.literals), OrderedDict())
+            stored[lookup.normalized] = vector
+            while len(stored) > self.Config.SEMANTIC_MAX_PER_SHEET:
+                stored.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._answers),
+            "semantic_vectors": sum(len(stored) for buckets in self._vectors.values() for stored in buckets.values()),
+            **self.stats_counters,
+        }
+
+
+query_cache = QueryCache()
@@ -0,0 +1,271 @@
+import json
+import math
+import os
+import re
+import threading
+import weakref
+from collections import Counter, defaultdict
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+import pandas as pd
+from .configs import *
+from .logger import *
+from .DataFrameStore import dataframe_store
+from .QueryCache import normalize_question
+logging = get_logger(__name__)
+
+# Explicit statistics only; words like "overall", "total" or "most" show up in plain questions too
+ANALYSIS_PATTERN = re.compile(
+    r"\b(average|avg|mean|median|std|standard deviation|variance|minimum|maximum|how many|count|"
+    r"number of|percent|percentage|proportion|distribution|breakdown|statistics|stats)\b"
+)
+NEGATION_PATTERN = re.compile(
+    r"\b(not|no|never|none|nobody|neither|nor|except|excluding|exclude|without|besides|other than)\b|n't\b"
+)
+NUMBER_PATTERN = r"(-?\d+(?:\.\d+)?)"
+MAX_VALUE_WORDS = 6
+# Words allowed between a column name and its value, as in "rating is good"
+CONNECTOR_WORDS = {"is", "was", "are", "were", "equals", "equal", "to", "of", "as"}
+MAX_CONNECTOR_WORDS = 2
+
+
+@dataclass
+class RouteDecision:
+    decision: str
+    needs_filtering: bool
+    filter_conditions: Dict[str, Any] = field(default_factory=dict)
+    source: str = "rules"
+    confidence: float = 1.0
+
+
+def decision_label(needs_analysis: bool, needs_filtering: bool) -> str:
+    if needs_analysis and needs_filtering:
+        return "need_both"
+    if needs_analysis:
+        return "need_analysis"
+    if needs_filtering:
+        return "need_filtering"
+    return "enough"
+
+
+class NaiveBayesRouter:
+    """Multinomial naive Bayes over question words, trained on logged LLM decisions"""
+
+    def __init__(self):
+        self.label_counts: Counter = Counter()
+        self.word_counts: Dict[str, Counter] = defaultdict(Counter)
+        self.label_totals: Counter = Counter()
+        self.vocabulary = set()
+
+    def __len__(self) -> int:
+        return sum(self.label_counts.values())
+
+    def learn(self, question: str, label: str):
+        words = normalize_question(question).split()
+        self.label_counts[label] += 1
+        self.word_counts[label].update(words)
+        self.label_totals[label] += len(words)
+        self.vocabulary.update(words)
+
+    def predict(self, question: str) -> Tuple[Optional[str], float]:
+        if not self.label_counts:
+            return None, 0.0
+        words = normalize_question(question).split()
+        total = len(self)
+        vocabulary_size = len(self.vocabulary) + 1
+        scores = {}
+        for label, count in self.label_counts.items():
+            score = math.log(count / total)
+            denominator = self.label_totals[label] + vocabulary_size
+            for word in words:
+                score += math.log((self.word_counts[label][word] + 1) / denominator)
+            scores[label] = score
+        best = max(scores, key=scores.get)
+        # Softmax over log scores gives the posterior of the best label
+        posterior = 1.0 / sum(math.exp(score - scores[best]) for score in scores.values())
+        return best, posterior
+
+
+class QueryRouter:
+    """Local router for the decision node that answers without a remote LLM call when it can.
+
+    Only explicit questions are routed locally. Statistics need a keyword such as
+    "average" plus a column name. Filter conditions must be stated as "<column> [is]
+    <value>", with the value taken from a low-cardinality column of the session's
+    DataFrame or a number for numeric columns. Negations, and cell values the question
+    doesn't tie to a column, make route() return None so the caller asks the LLM.
+    """
+
+    def __init__(self, config: Optional[QueryRouterConfig] = None):
+        self.Config = config or QueryRouterConfig()
+        # id(frame) -> value index; entries hold no reference to the frame and go away with it
+        self._value_indexes: Dict[int, Dict[str, List[Tuple[str, str]]]] = {}
+        # Reentrant: a frame freed while the lock is held runs _forget_frame on the same thread
+        self._lock = threading.RLock()
+        self.classifier = NaiveBayesRouter()
+        self.stats_counters = {"rules": 0, "classifier": 0, "llm_fallbacks": 0}
+        if self.Config.CLASSIFIER_ENABLED:
+            self._load_decision_log()
+
+    def _load_decision_log(self):
+        path = self.Config.DECISION_LOG_PATH
+        if not path or not os.path.exists(path):
+            return
+        with open(path) as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                    self.classifier.learn(entry["question"], entry["decision"])
+                except (ValueError, KeyError):
+                    continue
+        logging.info(f"Query router classifier trained on {len(self.classifier)} logged decisions")
+
+    def _value_index(self, df: pd.DataFrame) -> Dict[str, List[Tuple[str, str]]]:
+        """Normalized cell value -> [(column, original value)] for low-cardinality text columns"""
+        with self._lock:
+            cached = self._value_indexes.get(id(df))
+        if cached is not None:
+            return cached
+
+        index: Dict[str, List[Tuple[str, str]]] = defaultdict(list)
+        for column in df.columns:
+            series = df[column]
+            if pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                continue
+            values = series.dropna().unique()
+            if len(values) > self.Config.MAX_VALUE_CARDINALITY:
+                continue
+            for value in values:
+                original = str(value).strip()
+                normalized = normalize_question(original)
+                # Very short or numeric values match too much incidental text
+                if len(normalized) < 3 or normalized.replace(" ", "").isdigit():
+                    continue
+                if len(normalized.split()) <= MAX_VALUE_WORDS:
+                    index[normalized].append((str(column), original))
+
+        with self._lock:
+            if id(df) not in self._value_indexes:
+                self._value_indexes[id(df)] = index
+                # Runs when the frame is freed, before its id can be reused
+                weakref.finalize(df, self._forget_frame, id(df))
+        return index
+
+    def _forget_frame(self, frame_id: int):
+        with self._lock:
+            self._value_indexes.pop(frame_id, None)
+
+    def _match_values(self, question: str, df: pd.DataFrame) -> Optional[Dict[str, Any]]:
+        """Conditions stated as "<column> [is] <value>", or None if the question names a value any other way"""
+        words = normalize_question(question).split()
+        index = self._value_index(df)
+        conditions: Dict[str, Any] = {}
+        covered = [False] * len(words)
+
+        # Longest column names first so "overall rating" wins over "rating"
+        column_names = sorted(((normalize_question(str(c)).split(), str(c)) for c in df.columns),
+                              key=lambda item: len(item[0]), reverse=True)
+        mentioned = []
+        for column_words, column in column_names:
+            size = len(column_words)
+            if not size:
+                continue
+            for start in range(len(words) - size + 1):
+                if words[start:start + size] != column_words or any(covered[start:start + size]):
+                    continue
+                covered[start:start + size] = [True] * size
+                mentioned.append(column)
+                position = start + size
+                while (position < len(words) and position - start - size < MAX_CONNECTOR_WORDS
+                       and words[position] in CONNECTOR_WORDS):
+                    position += 1
+                # Longest value first so "computer science" wins over "computer"
+                for value_size in range(min(MAX_VALUE_WORDS, len(words) - position), 0, -1):
+                    span = slice(position, position + value_size)
+                    original = next((o for c, o in index.get(" ".join(words[span]), []) if c == column), None)
+                    if original is None:
+                        continue
+                    if conditions.get(column, original) != original:
+                        return None
+                    conditions[column] = original
+                    covered[span] = [True] * value_size
+                    break
+
+        # Any other cell value in the question is a reference we can't tie to a column
+        for size in range(min(MAX_VALUE_WORDS, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                if not any(covered[start:start + size]) and " ".join(words[start:start + size]) in index:
+                    return None
+
+        # Keep decimal points and signs, which normalize_question would split apart
+        numeric_text = " ".join(re.sub(r"[^\w\s.\-]", " ", question.lower()).split())
+        for column in mentioned:
+            if column in conditions or not pd.api.types.is_numeric_dtype(df[column]):
+                continue
+            pattern = rf"\b{re.escape(normalize_question(column))}\s+(?:is\s+|equals\s+|of\s+|equal to\s+)?{NUMBER_PATTERN}(?![\w.])"
+            match = re.search(pattern, numeric_text)
+            if match:
+                conditions[column] = float(match.group(1))
+        return conditions
+
+    def _mentions_column(self, question: str, df: pd.DataFrame) -> bool:
+        text = f" {normalize_question(question)} "
+        return any(f" {normalize_question(str(c))} " in text for c in df.columns if normalize_question(str(c)))
+
+    def route(self, question: str, columns: List[str], session_id: str = "") -> Optional[RouteDecision]:
+        if not self.Config.ENABLED:
+            return None
+        if NEGATION_PATTERN.search(question.lower()):
+            # "not good", "except poor": conditions we would read the wrong way round
+            self.stats_counters["llm_fallbacks"] += 1
+            return None
+        normalized = normalize_question(question)
+        needs_analysis = bool(ANALYSIS_PATTERN.search(normalized))
+
+        df = dataframe_store.get(session_id) if session_id else None
+        conditions = self._match_values(question, df) if df is not None else None
+
+        if conditions:
+            decision = RouteDecision(decision_label(needs_analysis, True), True, conditions)
+        elif needs_analysis and conditions is not None and self._mentions_column(question, df):
+            decision = RouteDecision("need_analysis", False)
+        else:
+            decision = self._classify(question, conditions)
+
+        if decision is None:
+            self.stats_counters["llm_fallbacks"] += 1
+        else:
+            self.stats_counters[decision.source] += 1
+        return decision
+
+    def _classify(self, question: str, conditions: Optional[Dict[str, Any]]) -> Optional[RouteDecision]:
+        if not self.Config.CLASSIFIER_ENABLED or len(self.classifier) < self.Config.CLASSIFIER_MIN_SAMPLES:
+            return None
+        label, confidence = self.classifier.predict(question)
+        if label is None or confidence < self.Config.CLASSIFIER_THRESHOLD:
+            return None
+        needs_filtering = label in ("need_both", "need_filtering")
+        if needs_filtering and not conditions:
+            # Filtering without conditions we could extract is the LLM's job
+            return None
+        return RouteDecision(label, needs_filtering, conditions or {}, source="classifier", confidence=confidence)
+
+    def record(self, question: str, columns: List[str], decision: str, filter_conditions: Dict[str, Any]):
+        """Log a decision made by the LLM as training data for the local classifier"""
+        if self.Config.CLASSIFIER_ENABLED:
+            self.classifier.learn(question, decision)
+        path = self.Config.DECISION_LOG_PATH
+        if not path:
+            return
+        entry = {"question": question, "columns": columns, "decision": decision, "filter_conditions": filter_conditions}
+        try:
+            with self._lock, open(path, "a") as f:
+                f.write(json.dumps(entry, default=str) + "\n")
+        except OSError as e:
+            logging.warning(f"Could not log router decision: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self.stats_counters, "classifier_samples": len(self.classifier)}
+
+
+query_router = QueryRouter()
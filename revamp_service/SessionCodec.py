@@ -0,0 +1,128 @@
+import json
+import struct
+from datetime import date, datetime
+from typing import Any, Dict, Optional, Tuple
+import numpy as np
+from .logger import *
+logging = get_logger(__name__)
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+MAGIC = b"RS"
+CODEC_VERSION = 1
+# magic, version, length of the metadata section
+HEADER = struct.Struct(">2sBI")
+
+EXT_DATETIME = 1
+EXT_DATE = 2
+EXT_NDARRAY = 3
+
+
+def _legacy_object_hook(dct):
+    """Decoder for sessions written by the old JSON + DateTimeEncoder path"""
+    if '__datetime__' in dct:
+        return datetime.fromisoformat(dct['value'])
+    elif '__custom_object__' in dct:
+        return f"<{dct['type']} object>"
+    return dct
+
+
+class SessionCodec:
+    """Versioned msgpack encoding for session payloads.
+
+    Layout: "RS" | version | metadata length | msgpack(metadata) | msgpack(rest of the session).
+    The metadata section comes first so decode_metadata can read it without touching
+    the rest. Payloads without the magic prefix are decoded as legacy JSON.
+    """
+
+    def __init__(self, skip_keys: Tuple[str, ...] = ("qa_components",), placeholder: str = "COMPLEX_OBJECT_PLACEHOLDER"):
+        self.skip_keys = skip_keys
+        self.placeholder = placeholder
+
+    @staticmethod
+    def _default(obj: Any) -> Any:
+        if isinstance(obj, datetime):
+            return msgpack.ExtType(EXT_DATETIME, obj.isoformat().encode("ascii"))
+        if isinstance(obj, date):
+            return msgpack.ExtType(EXT_DATE, obj.isoformat().encode("ascii"))
+        if isinstance(obj, np.ndarray):
+            array = np.ascontiguousarray(obj)
+            header = msgpack.packb([array.dtype.str, list(array.shape)])
+            return msgpack.ExtType(EXT_NDARRAY, struct.pack(">I", len(header)) + header + array.tobytes())
+        if isinstance(obj, np.generic):
+            return obj.item()
+        if isinstance(obj, (set, frozenset)):
+            return list(obj)
+        # Same lossy representation the JSON path ended up with for arbitrary objects
+        return f"<{obj.__class__.__name__} object>"
+
+    @staticmethod
+    def _ext_hook(code: int, data: bytes) -> Any:
+        if code == EXT_DATETIME:
+            return datetime.fromisoformat(data.decode("ascii"))
+        if code == EXT_DATE:
+            return date.fromisoformat(data.decode("ascii"))
+        if code == EXT_NDARRAY:
+            (header_length,) = struct.unpack_from(">I", data)
+            dtype, shape = msgpack.unpackb(data[4:4 + header_length])
+            return np.frombuffer(data[4 + header_length:], dtype=np.dtype(dtype)).reshape(shape).copy()
+        return msgpack.ExtType(code, data)
+
+    def encode(self, data: Dict[str, Any]) -> bytes:
+        body = {key: (self.placeholder if key in self.skip_keys else value)
+                for key, value in data.items() if key != "metadata"}
+        if not MSGPACK_AVAILABLE:
+            return self._encode_json(body, data.get("metadata"))
+        metadata = msgpack.packb(data["metadata"], default=self._default) if "metadata" in data else b""
+        rest = msgpack.packb(body, default=self._default)
+        return HEADER.pack(MAGIC, CODEC_VERSION, len(metadata)) + metadata + rest
+
+    def _encode_json(self, body: Dict[str, Any], metadata: Optional[Dict[str, Any]]) -> bytes:
+        def default(obj):
+            if isinstance(obj, (datetime, date)):
+                return {'__datetime__': True, 'value': obj.isoformat()}
+            if isinstance(obj, np.ndarray):
+                return obj.tolist()
+            if isinstance(obj, np.generic):
+                return obj.item()
+            return {'__custom_object__': True, 'type': obj.__class__.__name__}
+        if metadata is not None:
+            body = {**body, "metadata": metadata}
+        return json.dumps(body, default=default, ensure_ascii=False).encode("utf-8")
+
+    def _split(self, payload: bytes) -> Optional[Tuple[memoryview, memoryview]]:
+        if payload[:2] != MAGIC:
+            return None
+        _, version, metadata_length = HEADER.unpack_from(payload)
+        if version != CODEC_VERSION:
+            raise ValueError(f"Unsupported session codec version {version}")
+        view = memoryview(payload)
+        start = HEADER.size
+        return view[start:start + metadata_length], view[start + metadata_length:]
+
+    def _unpack(self, section: memoryview) -> Any:
+        return msgpack.unpackb(section, ext_hook=self._ext_hook, strict_map_key=False)
+
+    def decode(self, payload: bytes) -> Dict[str, Any]:
+        sections = self._split(payload)
+        if sections is None:
+            return json.loads(payload, object_hook=_legacy_object_hook)
+        metadata, rest = sections
+        data = self._unpack(rest)
+        if len(metadata):
+            data["metadata"] = self._unpack(metadata)
+        return data
+
+    def decode_metadata(self, payload: bytes) -> Optional[Dict[str, Any]]:
+        """Read only the metadata section, skipping the rest of the session"""
+        sections = self._split(payload)
+        if sections is None:
+            return json.loads(payload, object_hook=_legacy_object_hook).get("metadata")
+        return self._unpack(sections[0]) if len(sections[0]) else None
+
+
+session_codec = SessionCodec()
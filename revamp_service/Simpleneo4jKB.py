@@ -1,5 +1,10 @@
+import asyncio
+import hashlib
 import logging
-from typing import Any, List
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
 from .models import *
 from langchain_community.llms import Ollama
 from .logger import *
@@ -7,6 +12,7 @@ from .prompts import *
 from .ChatbotSessionManager import *
 from .configs import *
 from .BaseGraph import *
+from cachetools import LRUCache
 logging = get_logger(__name__)
 
 try:
@@ -18,12 +24,33 @@ except ImportError:
     GRAPH_AVAILABLE = False
     logging.warning("Graph dependencies not available. Install neo4j, networkx, spacy for full functionality.")
 
+ENTITY_FULLTEXT_INDEX = "entity_name_fulltext"
+CHUNK_FULLTEXT_INDEX = "chunk_text_fulltext"
+LUCENE_SPECIAL_CHARACTERS = re.compile(r'([+\-!(){}\[\]^"~*?:\\/]|&&|\|\|)')
+STOP_WORDS = {'the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by'}
+
+
+def lucene_escape(term: str) -> str:
+    """Escape Lucene query syntax so user text is always matched literally"""
+    return LUCENE_SPECIAL_CHARACTERS.sub(r"\\\1", term)
+
+
 class Simpleneo4jKB(BaseGraph):
     def __init__(self):
         self.driver = None
         self.nlp = None
         self.enabled = GRAPH_AVAILABLE
         self.Config = CachingConfig()
+        self.BuildConfig = GraphBuildConfig()
+        # Per-session build state: pending -> building -> ready | failed, with progress counters
+        self.build_status: Dict[str, Dict[str, Any]] = {}
+        self._build_tasks: Dict[str, asyncio.Task] = {}
+        # Entities per chunk text hash, duplicate rows across sessions are parsed once
+        self.entity_cache: LRUCache = LRUCache(maxsize=self.BuildConfig.ENTITY_CACHE_SIZE)
+        # One parsing job at a time; with SPACY_PROCESSES > 1 each job already fans out to processes
+        self._nlp_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="spacy")
+        self._gc_task: Optional[asyncio.Task] = None
+        self.gc_stats = {"runs": 0, "sessions_deleted": 0, "chunks_deleted": 0, "entities_pruned": 0}
         
     async def init_neo4j(self):
         if not self.enabled:
@@ -36,27 +63,45 @@ class Simpleneo4jKB(BaseGraph):
             async with self.driver.session() as session:
                 await session.run("RETURN 1")
             logging.info("Neo4j connected successfully")
+            await self.create_schema()
         except Exception as e:
             logging.error(f"Neo4j connection failed: {e}")
             self.enabled = False
             
+    async def create_schema(self):
+        """Uniqueness constraints backing the MERGE lookups used during ingestion"""
+        statements = [
+            "CREATE CONSTRAINT chunk_id IF NOT EXISTS FOR (c:Chunk) REQUIRE c.id IS UNIQUE",
+            "CREATE CONSTRAINT session_id IF NOT EXISTS FOR (s:Session) REQUIRE s.id IS UNIQUE",
+            "CREATE CONSTRAINT entity_name IF NOT EXISTS FOR (e:Entity) REQUIRE e.name IS UNIQUE",
+            "CREATE INDEX chunk_session_id IF NOT EXISTS FOR (c:Chunk) ON (c.session_id)",
+            "CREATE INDEX session_expires_at IF NOT EXISTS FOR (s:Session) ON (s.expires_at)",
+            # Full-text indexes for fuzzy and keyword search; session_id is indexed so keyword
+            # queries can be restricted to one session inside Lucene
+            f"CREATE FULLTEXT INDEX {ENTITY_FULLTEXT_INDEX} IF NOT EXISTS FOR (e:Entity) ON EACH [e.name]",
+            f"CREATE FULLTEXT INDEX {CHUNK_FULLTEXT_INDEX} IF NOT EXISTS FOR (c:Chunk) ON EACH [c.full_text, c.session_id]",
+        ]
+        async with self.driver.session() as session:
+            for statement in statements:
+                try:
+                    await session.run(statement)
+                except Exception as e:
+                    logging.warning(f"Neo4j schema statement failed ({statement}): {e}")
+        logging.info("Neo4j constraints and indexes ensured")
+    
     def init_nlp(self):
         if not self.enabled:
             return
         try:
-            self.nlp = spacy.load("en_core_web_sm")
+            # Only NER and POS tags are used, the dependency parser and lemmatizer are dead weight
+            self.nlp = spacy.load("en_core_web_sm", disable=["parser", "lemmatizer"])
             logging.info("SpaCy model loaded successfully")
         except OSError:
             logging.warning("SpaCy model not found")
             self.enabled = False
     
-    async def extract_entities(self, text: str) -> List[str]:
-        """Enhanced entity extraction with debugging"""
-        if not self.enabled or not self.nlp:
-            logging.debug("Entity extraction disabled - NLP not available")
-            return []
-        
-        doc = self.nlp(text)
+    @staticmethod
+    def _entities_from_doc(doc) -> List[str]:
         entities = [ent.text.lower().strip() for ent in doc.ents 
                    if ent.label_ in ["PERSON", "ORG", "GPE", "MONEY", "PERCENT", "PRODUCT", "EVENT"]]
         
@@ -66,8 +111,112 @@ class Simpleneo4jKB(BaseGraph):
                    and not token.is_stop and token.is_alpha]
         
         # Combine and deduplicate
-        all_entities = list(set(entities + keywords))
-        return all_entities
+        return list(set(entities + keywords))
+    
+    def _parse_batch(self, texts: List[str]) -> List[List[str]]:
+        docs = self.nlp.pipe(texts, batch_size=self.BuildConfig.NLP_BATCH_SIZE, n_process=self.BuildConfig.NLP_PROCESSES)
+        return [self._entities_from_doc(doc) for doc in docs]
+    
+    async def extract_entities_batch(self, texts: List[str]) -> List[List[str]]:
+        """Entities for many texts: cached ones by hash, the rest parsed with nlp.pipe off the event loop"""
+        if not self.enabled or not self.nlp:
+            logging.debug("Entity extraction disabled - NLP not available")
+            return [[] for _ in texts]
+        
+        hashes = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        resolved: Dict[str, List[str]] = {}
+        missing: Dict[str, str] = {}
+        for h, text in zip(hashes, texts):
+            cached = self.entity_cache.get(h)
+            if cached is not None:
+                resolved[h] = cached
+            else:
+                missing.setdefault(h, text)
+        
+        if missing:
+            loop = asyncio.get_running_loop()
+            parsed = await loop.run_in_executor(self._nlp_executor, self._parse_batch, list(missing.values()))
+            for h, entities in zip(missing.keys(), parsed):
+                self.entity_cache[h] = entities
+                resolved[h] = entities
+            logging.debug(f"Parsed {len(missing)} texts, {len(texts) - len(missing)} served from entity cache")
+        
+        return [list(resolved[h]) for h in hashes]
+    
+    async def extract_entities(self, text: str) -> List[str]:
+        """Enhanced entity extraction with debugging"""
+        return (await self.extract_entities_batch([text]))[0]
+    
+    @staticmethod
+    async def _write_chunk_batch(tx, session_id: str, rows: List[Dict[str, Any]]):
+        """Write one batch of chunks with their entity mentions in a single statement"""
+        await tx.run(
+            """
+            MATCH (s:Session {id: $session_id})
+            UNWIND $rows AS row
+            MERGE (c:Chunk {id: row.id})
+            SET c.session_id = $session_id, c.text = row.text, c.full_text = row.full_text, c.chunk_index = row.index
+            MERGE (s)-[:CONTAINS]->(c)
+            WITH c, row
+            UNWIND row.entities AS entity
+            MERGE (e:Entity {name: entity})
+            MERGE (c)-[:MENTIONS]->(e)
+            """,
+            session_id=session_id,
+            rows=rows
+        )
+    
+    def start_background_build(self, chunks: List[str], session_id: str) -> Dict[str, Any]:
+        """Schedule the graph build without waiting for it; progress is exposed through graph_status"""
+        if not self.enabled or not self.driver:
+            return {"state": "disabled"}
+        previous = self._build_tasks.get(session_id)
+        if previous is not None and not previous.done():
+            previous.cancel()
+        self.build_status[session_id] = {
+            "state": "pending",
+            "chunks_total": len(chunks),
+            "chunks_written": 0,
+            "entities": 0,
+            "queued_at": time.time(),
+        }
+        task = asyncio.create_task(self.create_simple_graph(chunks, session_id))
+        self._build_tasks[session_id] = task
+        task.add_done_callback(lambda _: self._build_tasks.pop(session_id, None) if self._build_tasks.get(session_id) is task else None)
+        logging.info(f"Queued background graph build for session {session_id} ({len(chunks)} chunks)")
+        return dict(self.build_status[session_id])
+    
+    async def graph_status(self, session_id: str) -> Dict[str, Any]:
+        """Build state of a session's graph, asking Neo4j when another worker built it"""
+        status = self.build_status.get(session_id)
+        if status is not None:
+            return dict(status)
+        if not self.enabled or not self.driver:
+            return {"state": "disabled"}
+        try:
+            async with self.driver.session() as session:
+                result = await session.run(
+                    "MATCH (s:Session {id: $session_id}) RETURN s.status as status",
+                    session_id=session_id
+                )
+                record = await result.single()
+        except Exception as e:
+            logging.error(f"Graph status lookup failed for session {session_id}: {e}")
+            return {"state": "unknown"}
+        if record is None:
+            return {"state": "missing"}
+        # Graphs written before build states existed have no status but are complete
+        state = record["status"] or "ready"
+        if state in ("ready", "failed"):
+            self.build_status[session_id] = {"state": state}
+        return {"state": state}
+    
+    async def is_ready(self, session_id: str) -> bool:
+        return (await self.graph_status(session_id)).get("state") == "ready"
+    
+    async def _set_session_state(self, session, session_id: str, state: str):
+        await session.run("MATCH (s:Session {id: $session_id}) SET s.status = $state",
+                          session_id=session_id, state=state)
     
     async def create_simple_graph(self, chunks: List[str], session_id: str):
         """Enhanced graph creation with better error handling and logging"""
@@ -75,58 +224,209 @@ class Simpleneo4jKB(BaseGraph):
             logging.warning("Graph creation skipped - Neo4j not available")
             return
         
+        status = self.build_status.setdefault(session_id, {
+            "chunks_total": len(chunks), "chunks_written": 0, "entities": 0
+        })
+        status.update(state="building", started_at=time.time())
         try:
             async with self.driver.session() as session:
                 # Create session node
+                # expires_at mirrors the session TTL so the GC sweep can find graphs nobody cleaned up
                 await session.run(
-                    "MERGE (s:Session {id: $session_id}) SET s.created_at = datetime()",
-                    session_id=session_id
+                    """
+                    MERGE (s:Session {id: $session_id})
+                    SET s.created_at = datetime(), s.status = 'building',
+                        s.expires_at = datetime() + duration({seconds: $ttl})
+                    """,
+                    session_id=session_id,
+                    ttl=self.Config.CACHE_TTL
                 )
                 logging.info(f"Created session node for: {session_id}")
                 
                 total_entities = 0
-                for i, chunk in enumerate(chunks):
-                    entities = await self.extract_entities(chunk)
-                    chunk_id = f"{session_id}_{i}"
-                    
-                    # Create chunk node with more metadata
-                    await session.run(
-                        """
-                        MERGE (c:Chunk {id: $chunk_id, session_id: $session_id})
-                        SET c.text = $text, c.full_text = $full_text, c.chunk_index = $index
-                        WITH c
-                        MATCH (s:Session {id: $session_id})
-                        MERGE (s)-[:CONTAINS]->(c)
-                        """,
-                        chunk_id=chunk_id,
-                        text=chunk[:500],  # Truncated for display
-                        full_text=chunk,   # Full text for search
-                        index=i,
-                        session_id=session_id
-                    )
-                    
-                    # Create entity relationships
-                    for entity in entities:
-                        await session.run(
-                            """
-                            MERGE (e:Entity {name: $entity})
-                            WITH e
-                            MATCH (c:Chunk {id: $chunk_id})
-                            MERGE (c)-[:MENTIONS]->(e)
-                            """,
-                            entity=entity,
-                            chunk_id=chunk_id
-                        )
-                    
-                    total_entities += len(entities)
+                batch_size = self.BuildConfig.BATCH_SIZE
+                # One UNWIND statement in one transaction per batch instead of a round trip per chunk and entity
+                for start in range(0, len(chunks), batch_size):
+                    batch = chunks[start:start + batch_size]
+                    batch_entities = await self.extract_entities_batch(batch)
+                    rows = []
+                    for i, (chunk, entities) in enumerate(zip(batch, batch_entities), start=start):
+                        rows.append({
+                            "id": f"{session_id}_{i}",
+                            "text": chunk[:500],  # Truncated for display
+                            "full_text": chunk,   # Full text for search
+                            "index": i,
+                            "entities": entities
+                        })
+                        total_entities += len(entities)
+                    await session.execute_write(self._write_chunk_batch, session_id, rows)
+                    status["chunks_written"] += len(rows)
+                    status["entities"] = total_entities
+                    logging.debug(f"Wrote chunks {start}-{start + len(rows) - 1} for session {session_id}")
                 
+                await self._set_session_state(session, session_id, "ready")
+                status.update(state="ready", finished_at=time.time())
                 logging.info(f"Graph created: {len(chunks)} chunks, {total_entities} total entities")
                 
                 # Verify graph creation
                 await self.verify_graph_creation(session_id)
                 
+        except asyncio.CancelledError:
+            status.update(state="failed", error="cancelled", finished_at=time.time())
+            raise
         except Exception as e:
+            status.update(state="failed", error=str(e), finished_at=time.time())
             logging.error(f"Graph creation failed: {e}", exc_info=True)
+            try:
+                async with self.driver.session() as session:
+                    await self._set_session_state(session, session_id, "failed")
+            except Exception:
+                pass
+    
+    @staticmethod
+    async def _delete_chunk_batch(tx, session_id: str, batch_size: int) -> int:
+        result = await tx.run(
+            """
+            MATCH (c:Chunk {session_id: $session_id})
+            WITH c LIMIT $batch_size
+            DETACH DELETE c
+            RETURN count(c) as deleted
+            """,
+            session_id=session_id,
+            batch_size=batch_size
+        )
+        record = await result.single()
+        return record["deleted"]
+    
+    @staticmethod
+    async def _prune_entity_batch(tx, batch_size: int) -> int:
+        result = await tx.run(
+            """
+            MATCH (e:Entity)
+            WHERE NOT (e)<-[:MENTIONS]-()
+            WITH e LIMIT $batch_size
+            DETACH DELETE e
+            RETURN count(e) as deleted
+            """,
+            batch_size=batch_size
+        )
+        record = await result.single()
+        return record["deleted"]
+    
+    async def delete_session_graph(self, session_id: str) -> int:
+        """Delete a session's chunks and Session node in bounded transactions, returns deleted chunks"""
+        if not self.enabled or not self.driver:
+            return 0
+        # A build still running would keep writing chunks behind the delete
+        task = self._build_tasks.pop(session_id, None)
+        if task is not None and not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self.build_status.pop(session_id, None)
+        
+        batch_size = self.BuildConfig.DELETE_BATCH_SIZE
+        deleted = 0
+        try:
+            async with self.driver.session() as session:
+                while True:
+                    count = await session.execute_write(self._delete_chunk_batch, session_id, batch_size)
+                    deleted += count
+                    if count < batch_size:
+                        break
+                await session.run("MATCH (s:Session {id: $session_id}) DETACH DELETE s", session_id=session_id)
+        except Exception as e:
+            logging.error(f"Graph delete failed for session {session_id}: {e}")
+            return deleted
+        self.gc_stats["sessions_deleted"] += 1
+        self.gc_stats["chunks_deleted"] += deleted
+        logging.info(f"Deleted graph for session {session_id}: {deleted} chunks")
+        return deleted
+    
+    async def prune_orphan_entities(self) -> int:
+        """Delete entities no chunk mentions anymore, one batch per transaction"""
+        batch_size = self.BuildConfig.DELETE_BATCH_SIZE
+        pruned = 0
+        async with self.driver.session() as session:
+            while True:
+                count = await session.execute_write(self._prune_entity_batch, batch_size)
+                pruned += count
+                if count < batch_size:
+                    break
+        self.gc_stats["entities_pruned"] += pruned
+        return pruned
+    
+    async def collect_garbage(self, session_alive: Callable[[str], Awaitable[bool]]) -> Dict[str, int]:
+        """Delete graphs of sessions past expires_at, then prune orphaned entities.
+        
+        Sessions still alive in the session store (refreshed by another worker, for example)
+        get their expires_at pushed forward instead of being deleted.
+        """
+        batch_size = self.BuildConfig.DELETE_BATCH_SIZE
+        async with self.driver.session() as session:
+            result = await session.run(
+                """
+                MATCH (s:Session)
+                WHERE s.expires_at < datetime()
+                   OR (s.expires_at IS NULL AND s.created_at < datetime() - duration({seconds: $ttl}))
+                RETURN s.id as session_id
+                LIMIT $batch_size
+                """,
+                ttl=self.Config.CACHE_TTL,
+                batch_size=batch_size
+            )
+            expired = [record["session_id"] async for record in result]
+        
+        sessions_deleted = 0
+        for session_id in expired:
+            if await session_alive(session_id):
+                async with self.driver.session() as session:
+                    await session.run(
+                        "MATCH (s:Session {id: $session_id}) SET s.expires_at = datetime() + duration({seconds: $ttl})",
+                        session_id=session_id,
+                        ttl=self.Config.CACHE_TTL
+                    )
+                continue
+            await self.delete_session_graph(session_id)
+            sessions_deleted += 1
+        
+        entities_pruned = await self.prune_orphan_entities()
+        self.gc_stats["runs"] += 1
+        if sessions_deleted or entities_pruned:
+            logging.info(f"Graph GC deleted {sessions_deleted} expired sessions and {entities_pruned} orphaned entities")
+        return {"sessions_deleted": sessions_deleted, "entities_pruned": entities_pruned}
+    
+    async def _gc_loop(self, session_alive: Callable[[str], Awaitable[bool]]):
+        while True:
+            await asyncio.sleep(self.BuildConfig.GC_INTERVAL)
+            try:
+                await self.collect_garbage(session_alive)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"Graph GC run failed: {e}")
+    
+    def start_gc(self, session_alive: Callable[[str], Awaitable[bool]]):
+        """Run collect_garbage every GC_INTERVAL seconds until close()"""
+        if not self.enabled or not self.driver or self._gc_task is not None:
+            return
+        self._gc_task = asyncio.create_task(self._gc_loop(session_alive))
+        logging.info(f"Graph GC scheduled every {self.BuildConfig.GC_INTERVAL}s")
+    
+    async def close(self):
+        if self._gc_task is not None:
+            self._gc_task.cancel()
+            try:
+                await self._gc_task
+            except asyncio.CancelledError:
+                pass
+            self._gc_task = None
+        for task in list(self._build_tasks.values()):
+            task.cancel()
+        if self.driver is not None:
+            await self.driver.close()
     
     async def verify_graph_creation(self, session_id: str):
         """Verify that the graph was created successfully"""
@@ -195,24 +495,27 @@ class Simpleneo4jKB(BaseGraph):
     
     async def fuzzy_entity_search(self, query_entities: List[str], session_id: str) -> List[str]:
         """Fuzzy search for similar entities"""
+        # Wildcard and fuzzy terms skip the analyzer, so split and lower-case them here
+        terms = [lucene_escape(word) for entity in query_entities for word in entity.lower().split()]
+        if not terms:
+            return []
+        # Whole term, prefix or a small edit distance, roughly what the old CONTAINS match allowed
+        search = " OR ".join(f"{term} OR {term}* OR {term}~" for term in terms)
         try:
             async with self.driver.session() as session_db:
-                # Search for entities that contain any of the query terms
-                fuzzy_conditions = []
-                for entity in query_entities:
-                    fuzzy_conditions.append(f"e.name CONTAINS '{entity}'")
-                
-                if not fuzzy_conditions:
-                    return []
-                
-                fuzzy_query = f"""
-                MATCH (s:Session {{id: $session_id}})-[:CONTAINS]->(c:Chunk)-[:MENTIONS]->(e:Entity)
-                WHERE {' OR '.join(fuzzy_conditions)}
-                RETURN DISTINCT c.full_text as text
-                LIMIT 3
-                """
-                
-                result = await session_db.run(fuzzy_query, session_id=session_id)
+                result = await session_db.run(
+                    f"""
+                    CALL db.index.fulltext.queryNodes('{ENTITY_FULLTEXT_INDEX}', $search)
+                    YIELD node AS e, score
+                    // Entities are shared by every session, so the limit only applies after the session filter
+                    MATCH (c:Chunk {{session_id: $session_id}})-[:MENTIONS]->(e)
+                    RETURN c.full_text as text, sum(score) as score
+                    ORDER BY score DESC
+                    LIMIT 3
+                    """,
+                    search=search,
+                    session_id=session_id
+                )
                 results = [record["text"] async for record in result]
                 
                 if results:
@@ -226,28 +529,26 @@ class Simpleneo4jKB(BaseGraph):
     
     async def keyword_search(self, query: str, session_id: str) -> List[str]:
         """Fallback keyword search in chunk text"""
+        # Extract meaningful words from query
+        keywords = [word.lower().strip() for word in query.split() 
+                   if len(word) > 2 and word.lower() not in STOP_WORDS]
+        
+        if not keywords:
+            return []
+        
+        terms = " OR ".join(lucene_escape(keyword) for keyword in keywords)
+        search = f'+session_id:"{lucene_escape(session_id)}" +full_text:({terms})'
         try:
-            # Extract meaningful words from query
-            keywords = [word.lower().strip() for word in query.split() 
-                       if len(word) > 2 and word.lower() not in ['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by']]
-            
-            if not keywords:
-                return []
-            
             async with self.driver.session() as session_db:
-                # Search in chunk text
-                keyword_conditions = []
-                for keyword in keywords:
-                    keyword_conditions.append(f"toLower(c.full_text) CONTAINS '{keyword}'")
-                
-                keyword_query = f"""
-                MATCH (s:Session {{id: $session_id}})-[:CONTAINS]->(c:Chunk)
-                WHERE {' OR '.join(keyword_conditions)}
-                RETURN c.full_text as text
-                LIMIT 3
-                """
-                
-                result = await session_db.run(keyword_query, session_id=session_id)
+                result = await session_db.run(
+                    f"""
+                    CALL db.index.fulltext.queryNodes('{CHUNK_FULLTEXT_INDEX}', $search, {{limit: 3}})
+                    YIELD node AS c, score
+                    RETURN c.full_text as text, score
+                    ORDER BY score DESC
+                    """,
+                    search=search
+                )
                 results = [record["text"] async for record in result]
                 
                 if results:
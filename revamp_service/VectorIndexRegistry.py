@@ -0,0 +1,100 @@
+import asyncio
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from .logger import *
+logging = get_logger(__name__)
+
+
+@dataclass
+class SharedIndex:
+    key: str
+    qa_components: Dict[str, Any]
+    sessions: Set[str] = field(default_factory=set)
+    created_at: float = field(default_factory=time.time)
+
+
+class VectorIndexRegistry:
+    """Reference-counted QA components shared by every session over the same sheet content.
+
+    Indexes are keyed by sheet content hash plus chunking and embedding settings, so
+    concurrent chats on one event reuse one FAISS index. The index is dropped once
+    the last session holding it is released.
+    """
+
+    def __init__(self):
+        self._indexes: Dict[str, SharedIndex] = {}
+        self._session_keys: Dict[str, str] = {}
+        self._building: Dict[str, asyncio.Future] = {}
+        self.stats_counters = {"builds": 0, "reuses": 0, "released": 0}
+
+    async def acquire(self, key: str, session_id: str,
+                      build: Callable[[], Awaitable[Dict[str, Any]]]) -> Dict[str, Any]:
+        """Return the index for key, building it once if no session holds it yet"""
+        previous_key = self._session_keys.get(session_id)
+        if previous_key is not None and previous_key != key:
+            self.release(session_id)
+
+        entry = self._indexes.get(key)
+        if entry is None:
+            pending = self._building.get(key)
+            if pending is not None:
+                # Another session is already building this index, wait for it instead of embedding twice
+                await asyncio.shield(pending)
+                entry = self._indexes.get(key)
+
+        if entry is None:
+            pending = asyncio.get_running_loop().create_future()
+            self._building[key] = pending
+            try:
+                qa_components = await build()
+                entry = SharedIndex(key=key, qa_components=qa_components)
+                self._indexes[key] = entry
+                self.stats_counters["builds"] += 1
+                logging.info(f"Built shared vector index {key[:16]}")
+            except Exception:
+                pending.set_result(None)
+                raise
+            finally:
+                self._building.pop(key, None)
+            pending.set_result(None)
+        else:
+            self.stats_counters["reuses"] += 1
+            logging.info(f"Reusing shared vector index {key[:16]} ({len(entry.sessions)} sessions attached)")
+
+        entry.sessions.add(session_id)
+        self._session_keys[session_id] = key
+        return entry.qa_components
+
+    def release(self, session_id: str):
+        """Detach a session from its index and free the index when nobody uses it anymore"""
+        key = self._session_keys.pop(session_id, None)
+        if key is None:
+            return
+        entry = self._indexes.get(key)
+        if entry is None:
+            return
+        entry.sessions.discard(session_id)
+        if not entry.sessions:
+            del self._indexes[key]
+            self.stats_counters["released"] += 1
+            logging.info(f"Released shared vector index {key[:16]}, no sessions left")
+
+    def key_for_session(self, session_id: str) -> Optional[str]:
+        return self._session_keys.get(session_id)
+
+    def sharing_sessions(self, session_id: str) -> int:
+        """Number of sessions attached to the same index as this one"""
+        entry = self._indexes.get(self._session_keys.get(session_id, ""))
+        return len(entry.sessions) if entry is not None else 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "indexes": len(self._indexes),
+            "sessions": len(self._session_keys),
+            "sessions_per_index": {key[:16]: len(entry.sessions) for key, entry in self._indexes.items()},
+            **self.stats_counters,
+        }
+
+
+index_registry = VectorIndexRegistry()
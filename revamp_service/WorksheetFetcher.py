@@ -0,0 +1,290 @@
+import asyncio
+import codecs
+import hashlib
+import re
+import threading
+import time
+from contextlib import aclosing
+from dataclasses import dataclass
+from io import BytesIO, StringIO
+from typing import Callable, Dict, List, Optional
+import pandas as pd
+from cachetools import LRUCache
+from .configs import *
+from .HttpClient import http_client
+from .dtype_compaction import compact_dataframe
+from .logger import *
+logging = get_logger(__name__)
+
+
+class WorksheetAccessError(Exception):
+    """Raised when the sheet export returns something other than CSV data"""
+
+
+@dataclass
+class CachedWorksheet:
+    """Raw CSV bytes of a sheet plus the validators needed to revalidate them"""
+    csv_url: str
+    content_hash: str
+    raw: bytes
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+@dataclass
+class WorksheetSnapshot:
+    frame: pd.DataFrame
+    content_hash: str
+    revalidated: bool  # True when the server answered 304 Not Modified
+    parsed: bool  # False when the frame came from the content-hash cache
+
+
+class CsvRecordSplitter:
+    """Splits streamed CSV text into complete records.
+
+    A newline only ends a record when the quotes seen so far in the record are
+    balanced, so quoted free-text answers spanning several lines stay intact.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._record: List[str] = []
+        self._quotes = 0
+
+    def feed(self, text: str) -> List[str]:
+        lines = (self._pending + text).split('\n')
+        self._pending = lines.pop()
+        return [record for record in (self._add_line(line) for line in lines) if record is not None]
+
+    def flush(self) -> List[str]:
+        records = []
+        if self._pending:
+            record = self._add_line(self._pending)
+            self._pending = ""
+            if record is not None:
+                records.append(record)
+        if self._record:
+            records.append('\n'.join(self._record) + '\n')
+            self._record = []
+            self._quotes = 0
+        return records
+
+    def _add_line(self, line: str) -> Optional[str]:
+        self._record.append(line)
+        self._quotes += line.count('"')
+        if self._quotes % 2:
+            return None  # newline inside a quoted field
+        record = '\n'.join(self._record) + '\n'
+        self._record = []
+        self._quotes = 0
+        return record
+
+
+def _parse_csv(raw: bytes) -> pd.DataFrame:
+    """Parse a CSV body and apply compact dtypes once, so every consumer shares the typed frame"""
+    return compact_dataframe(pd.read_csv(BytesIO(raw)))
+
+
+def extract_sheet_id(worksheet_url: str) -> Optional[str]:
+    """Extract the Google Sheet ID from a sheet URL or a bare sheet ID"""
+    match = re.search(r'/d/([a-zA-Z0-9-_]+)', worksheet_url)
+    if match:
+        return match.group(1)
+    if len(worksheet_url) > 20 and '/' not in worksheet_url:
+        return worksheet_url
+    return None
+
+
+def csv_export_url(worksheet_url: str) -> str:
+    """Return the CSV export URL for a Google Sheet, other URLs are used as-is"""
+    is_sheet = 'docs.google.com/spreadsheets' in worksheet_url or '/' not in worksheet_url
+    sheet_id = extract_sheet_id(worksheet_url) if is_sheet else None
+    if sheet_id:
+        return f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
+    return worksheet_url
+
+
+class WorksheetFetcher:
+    """Conditional-GET worksheet fetcher.
+
+    Raw bytes are cached per CSV URL together with their ETag/Last-Modified
+    validators, and parsed frames are cached per content hash. A refetch sends
+    If-None-Match/If-Modified-Since and skips parsing whenever the bytes are
+    unchanged. Returned frames are shared between callers and must not be mutated.
+    """
+
+    def __init__(self, config: Optional[WorksheetCacheConfig] = None):
+        self.Config = config or WorksheetCacheConfig()
+        self._sheets: LRUCache = LRUCache(maxsize=self.Config.MAX_CACHED_SHEETS)
+        self._frames: LRUCache = LRUCache(maxsize=self.Config.MAX_CACHED_FRAMES)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "not_modified": 0, "unchanged": 0, "parsed": 0}
+
+    async def fetch(self, worksheet_url: str, headers: Optional[Dict[str, str]] = None,
+                    timeout: Optional[int] = None) -> WorksheetSnapshot:
+        """Fetch a sheet as a DataFrame, revalidating any cached copy"""
+        csv_url = csv_export_url(worksheet_url)
+        with self._lock:
+            cached: Optional[CachedWorksheet] = self._sheets.get(csv_url)
+
+        request_headers = dict(headers or {})
+        if cached is not None:
+            if cached.etag:
+                request_headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                request_headers['If-Modified-Since'] = cached.last_modified
+
+        logging.debug(f"Fetching worksheet from: {csv_url} (cached: {cached is not None})")
+        response = await http_client.get(csv_url, headers=request_headers, timeout=timeout or self.Config.REQUEST_TIMEOUT)
+        self.stats["requests"] += 1
+
+        if response.status_code == 304 and cached is not None:
+            self.stats["not_modified"] += 1
+            logging.info(f"Worksheet not modified: {csv_url}")
+            cached.fetched_at = time.time()
+            return await self._snapshot(cached, revalidated=True)
+
+        response.raise_for_status()
+        if response.headers.get('content-type', '').startswith('text/html'):
+            raise WorksheetAccessError(
+                "Google Sheet is not publicly accessible. Please make sure the sheet is shared with 'Anyone with the link' can view."
+            )
+
+        raw = response.content
+        entry = CachedWorksheet(
+            csv_url=csv_url,
+            content_hash=hashlib.sha256(raw).hexdigest(),
+            raw=raw,
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            fetched_at=time.time(),
+        )
+        if cached is not None and cached.content_hash == entry.content_hash:
+            self.stats["unchanged"] += 1
+            logging.info(f"Worksheet content unchanged: {csv_url}")
+
+        with self._lock:
+            self._sheets[csv_url] = entry
+        return await self._snapshot(entry, revalidated=False)
+
+    async def stream(self, worksheet_url: str, max_rows: Optional[int] = None,
+                     on_batch: Optional[Callable[[pd.DataFrame], None]] = None,
+                     batch_rows: Optional[int] = None, headers: Optional[Dict[str, str]] = None,
+                     timeout: Optional[int] = None) -> pd.DataFrame:
+        """Parse a sheet incrementally from the response body.
+
+        Rows are parsed in batches of batch_rows as they arrive and passed to
+        on_batch, and the download stops as soon as max_rows rows have been read.
+        A 304 against a cached full copy is served from that copy instead.
+        """
+        csv_url = csv_export_url(worksheet_url)
+        batch_rows = batch_rows or self.Config.STREAM_BATCH_ROWS
+        with self._lock:
+            cached: Optional[CachedWorksheet] = self._sheets.get(csv_url)
+
+        request_headers = dict(headers or {})
+        if cached is not None and cached.etag:
+            request_headers['If-None-Match'] = cached.etag
+        if cached is not None and cached.last_modified:
+            request_headers['If-Modified-Since'] = cached.last_modified
+
+        header: Optional[str] = None
+        batch: List[str] = []
+        frames: List[pd.DataFrame] = []
+        rows_read = 0
+        truncated = False
+
+        def flush_batch():
+            frame = pd.read_csv(StringIO(header + "".join(batch)))
+            batch.clear()
+            frames.append(frame)
+            if on_batch is not None and len(frame):
+                on_batch(frame)
+
+        logging.debug(f"Streaming worksheet from: {csv_url} (max_rows: {max_rows})")
+        async with http_client.stream("GET", csv_url, headers=request_headers,
+                                      timeout=timeout or self.Config.REQUEST_TIMEOUT) as response:
+            self.stats["requests"] += 1
+            if response.status_code == 304 and cached is not None:
+                self.stats["not_modified"] += 1
+                logging.info(f"Worksheet not modified, using cached copy: {csv_url}")
+                frame = (await self._snapshot(cached, revalidated=True)).frame
+                if max_rows is not None:
+                    frame = frame.head(max_rows)
+                if on_batch is not None:
+                    for start in range(0, len(frame), batch_rows):
+                        on_batch(frame.iloc[start:start + batch_rows])
+                return frame
+
+            response.raise_for_status()
+            if response.headers.get('content-type', '').startswith('text/html'):
+                raise WorksheetAccessError(
+                    "Google Sheet is not publicly accessible. Please make sure the sheet is shared with 'Anyone with the link' can view."
+                )
+
+            decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+            splitter = CsvRecordSplitter()
+
+            async def records():
+                async for chunk in response.aiter_bytes():
+                    for record in splitter.feed(decoder.decode(chunk)):
+                        yield record
+                for record in splitter.feed(decoder.decode(b'', final=True)) + splitter.flush():
+                    yield record
+
+            async with aclosing(records()) as stream_records:
+                async for record in stream_records:
+                    if header is None:
+                        header = record
+                        continue
+                    if not record.strip():
+                        continue  # read_csv skips blank lines too
+                    batch.append(record)
+                    rows_read += 1
+                    if len(batch) >= batch_rows:
+                        flush_batch()
+                    if max_rows is not None and rows_read >= max_rows:
+                        truncated = True
+                        break
+
+        if header is None:
+            return pd.DataFrame()
+        if batch or not frames:
+            flush_batch()
+
+        df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+        df = compact_dataframe(df)
+        logging.info(f"Streamed {len(df)} rows from {csv_url} (stopped early: {truncated})")
+        return df
+
+    def release_frame(self, frame: pd.DataFrame):
+        """Forget a parsed frame another cache has spilled, the raw bytes stay cached for a reparse"""
+        with self._lock:
+            for content_hash, cached in list(self._frames.items()):
+                if cached is frame:
+                    del self._frames[content_hash]
+
+    def content_hash(self, worksheet_url: str) -> Optional[str]:
+        """Content hash of the last fetched copy of a sheet, if any"""
+        with self._lock:
+            cached = self._sheets.get(csv_export_url(worksheet_url))
+        return cached.content_hash if cached is not None else None
+
+    async def _snapshot(self, entry: CachedWorksheet, revalidated: bool) -> WorksheetSnapshot:
+        with self._lock:
+            frame = self._frames.get(entry.content_hash)
+        if frame is not None:
+            return WorksheetSnapshot(frame=frame, content_hash=entry.content_hash,
+                                     revalidated=revalidated, parsed=False)
+
+        # Parsing and dtype inference are CPU bound, keep them off the event loop
+        frame = await asyncio.get_event_loop().run_in_executor(None, _parse_csv, entry.raw)
+        self.stats["parsed"] += 1
+        with self._lock:
+            self._frames[entry.content_hash] = frame
+        return WorksheetSnapshot(frame=frame, content_hash=entry.content_hash,
+                                 revalidated=revalidated, parsed=True)
+
+
+worksheet_fetcher = WorksheetFetcher()
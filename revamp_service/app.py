@@ -11,6 +11,10 @@ load_dotenv()
 from revamp_service.models import *
 from revamp_service.taskManager import *
 from .GroqRAGProcessor import *
+from .HttpClient import http_client
+from .WorksheetFetcher import worksheet_fetcher
+from fastapi.responses import StreamingResponse
+import json
 class QueryResponse(BaseModel):
     session_id: str
     question: str
@@ -178,35 +182,40 @@ async def start_session(data: StartSession):
         
         # Load data
         df = await fetch_worksheet_data(data.sheet_url)
-        rows = processor.dataframe_to_text_rows(df)
-        text = "\n".join(rows)
+        # Keep the frame for the LangGraph tools so questions don't re-download the sheet
+        processor.dataframe_store.put(data.session_id, df, data.sheet_url)
+        content_hash = worksheet_fetcher.content_hash(data.sheet_url)
         
-        # Create chunks
-        chunks = processor.create_chunks(text)
-        logging.info(f"Created {len(chunks)} chunks")
+        # Sessions on the same sheet content share one vector index
+        qa_components = await processor.acquire_qa_system(data.session_id, df, data.description, content_hash)
+        chunks = qa_components["chunks"]
+        logging.info(f"Session {data.session_id} attached to {len(chunks)} chunks")
         
-        # Create QA system
-        qa_components = processor.create_simple_qa_system(chunks, data.description)
-        
-        # Create knowledge graph if enabled
+        # Build the knowledge graph in the background, vector search is usable right away
+        graph_status = {"state": "disabled"}
         if data.use_graph:
-            await processor.graph_kb.create_simple_graph(chunks, data.session_id)
+            graph_status = processor.graph_kb.start_background_build(chunks, data.session_id)
         
         # Store session
         session_data = {
             "session_id": data.session_id,
             "description": data.description,
             "qa_components": qa_components,
+            "index_key": processor.index_registry.key_for_session(data.session_id),
             "use_graph": data.use_graph,
             "created_at": datetime.now(),
             "metadata": {
                 "columns": [{ "name": col, "type": str(df[col].dtype) } for col in df.columns],
                 "shape": df.shape,
                 "chunk_count": len(chunks),
-                "sheet_url": data.sheet_url
+                "sheet_url": data.sheet_url,
+                "content_hash": content_hash
             }
         }
         
+        # A new copy of the sheet makes answers cached for the old one stale
+        processor.query_cache.track_sheet(data.sheet_url, session_data["index_key"])
+        processor.attach_footprint(data.session_id, session_data)
         await processor.session_manager.set_session(data.session_id, session_data)
         
         logging.info(f"Session {data.session_id} created successfully")
@@ -214,11 +223,17 @@ async def start_session(data: StartSession):
             "message": "Session created successfully",
             "chunks_created": len(chunks),
             "graph_enabled": data.use_graph,
+            "graph_status": graph_status,
             "metadata": session_data["metadata"]
         }
         
     except Exception as e:
         logging.error(f"Session creation failed: {str(e)}")
+        processor.index_registry.release(data.session_id)
+        processor.dataframe_store.drop(data.session_id)
+        if data.use_graph:
+            # Stop a build queued before the failure and remove what it already wrote
+            await processor.graph_kb.delete_session_graph(data.session_id)
         raise HTTPException(status_code=500, detail=f"Failed to create session: {str(e)}")
 
 @app.post("/query",response_model=QueryResponse)
@@ -233,8 +248,9 @@ async def query_session(data: QueryRequest):
             logging.warning(f"Session not found: {data.session_id}")
             raise HTTPException(status_code=404, detail="Session not found or expired")
         
-        # 2️⃣ Validate session has necessary components
-        if "qa_components" not in session_data:
+        # 2️⃣ Validate session has necessary components, restoring the index if another worker built it
+        session_data = await processor.ensure_qa_components(data.session_id, session_data)
+        if session_data is None:
             logging.error(f"Session {data.session_id} missing QA components")
             raise HTTPException(
                 status_code=400, 
@@ -280,6 +296,56 @@ async def query_session(data: QueryRequest):
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.get("/session/{session_id}/graph_status")
+async def session_graph_status(session_id: str):
+    """Readiness and progress of a session's background knowledge-graph build"""
+    return {"session_id": session_id, **(await processor.graph_kb.graph_status(session_id))}
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str, ensure_ascii=False)}\n\n"
+
+@app.post("/query/stream")
+async def query_session_stream(data: QueryRequest):
+    """Stream a query's progress as server-sent events: decision, tool results, answer tokens, then the final response"""
+    logging.info(f"Processing streamed query for session {data.session_id}: '{data.question[:100]}'")
+    
+    session_data = await processor.session_manager.get_session(data.session_id)
+    if not session_data:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    session_data = await processor.ensure_qa_components(data.session_id, session_data)
+    if session_data is None:
+        raise HTTPException(
+            status_code=400,
+            detail="Session not properly initialized. Please reinitialize the session."
+        )
+    
+    async def events():
+        async for event, payload in processor.stream_answer_with_tools(data.question, session_data):
+            if event == "done":
+                payload = QueryResponse(
+                    session_id=data.session_id,
+                    question=data.question,
+                    answer=payload.get("answer", ""),
+                    used_tool=payload.get("used_tool", "None"),
+                    context_length=payload.get("context_length", 0),
+                    sources=payload.get("sources", []),
+                    timestamp=datetime.now().isoformat()
+                ).model_dump()
+            yield _sse(event, payload)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        # Stop proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.on_event("startup")
 async def startup_event():
-    await processor.initialize()
\ No newline at end of file
+    await processor.initialize()
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    await processor.session_manager.close()
+    await processor.graph_kb.close()
+    await http_client.aclose()
\ No newline at end of file
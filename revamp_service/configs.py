@@ -71,6 +71,8 @@ class OllamaNumericColumnAnalyzerAgentConfig(NumericColumnAnalyzerAgentConfig):
 class CachingConfig:
     CACHE_TTL = 3600
     MAX_CACHE_SIZE = 100
+    INVALIDATION_CHANNEL = os.environ.get('SESSION_INVALIDATION_CHANNEL', 'session-invalidations')
+    MAX_CACHE_BYTES = int(os.environ.get('SESSION_CACHE_MAX_BYTES', 2 * 1024 ** 3))
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 50
     EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
@@ -99,7 +101,71 @@ class GroqChatRag:
     MAX_TOKEN=2000
     CHUNK_SIZE = 500
     CHUNK_OVERLAP = 50
+    CHUNK_OVERLAP_ROWS = int(os.environ.get('CHUNK_OVERLAP_ROWS', 1))
     GROQ_API_KEY=os.environ.get('groq_api_key')
             
         
 
+@dataclass
+class DataFrameStoreConfig:
+    MAX_MEMORY_BYTES = int(os.environ.get('DATAFRAME_STORE_MAX_BYTES', 512 * 1024 * 1024))
+    TTL = int(os.environ.get('DATAFRAME_STORE_TTL', 3600))
+    SPILL_DIR = os.environ.get('DATAFRAME_SPILL_DIR', os.path.join(os.getcwd(), 'dataframe_spill'))
+@dataclass
+class WorksheetCacheConfig:
+    MAX_CACHED_SHEETS = int(os.environ.get('WORKSHEET_CACHE_MAX_SHEETS', 64))
+    MAX_CACHED_FRAMES = int(os.environ.get('WORKSHEET_CACHE_MAX_FRAMES', 32))
+    REQUEST_TIMEOUT = int(os.environ.get('WORKSHEET_REQUEST_TIMEOUT', 30))
+    STREAM_BATCH_ROWS = int(os.environ.get('WORKSHEET_STREAM_BATCH_ROWS', 500))
+@dataclass
+class HttpClientConfig:
+    MAX_CONNECTIONS = int(os.environ.get('HTTP_MAX_CONNECTIONS', 100))
+    MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('HTTP_MAX_KEEPALIVE_CONNECTIONS', 20))
+    MAX_CONNECTIONS_PER_HOST = int(os.environ.get('HTTP_MAX_CONNECTIONS_PER_HOST', 10))
+    KEEPALIVE_EXPIRY = float(os.environ.get('HTTP_KEEPALIVE_EXPIRY', 60))
+    CONNECT_TIMEOUT = float(os.environ.get('HTTP_CONNECT_TIMEOUT', 5))
+    READ_TIMEOUT = float(os.environ.get('HTTP_READ_TIMEOUT', 30))
+    MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 2))
+    RETRY_BACKOFF = float(os.environ.get('HTTP_RETRY_BACKOFF', 0.5))
+    # Retries may use at most this fraction of recent requests, plus a small reserve
+    RETRY_BUDGET_RATIO = float(os.environ.get('HTTP_RETRY_BUDGET_RATIO', 0.2))
+    RETRY_BUDGET_RESERVE = float(os.environ.get('HTTP_RETRY_BUDGET_RESERVE', 10))
+@dataclass
+class DtypeCompactionConfig:
+    ENABLED = os.environ.get('COMPACT_DTYPES', 'true').lower() == 'true'
+    CATEGORY_MAX_UNIQUE = int(os.environ.get('CATEGORY_MAX_UNIQUE', 50))
+    CATEGORY_MAX_UNIQUE_RATIO = float(os.environ.get('CATEGORY_MAX_UNIQUE_RATIO', 0.5))
+    USE_ARROW_STRINGS = os.environ.get('USE_ARROW_STRINGS', 'true').lower() == 'true'
+@dataclass
+class EmbeddingCacheConfig:
+    ENABLED = os.environ.get('EMBEDDING_CACHE_ENABLED', 'true').lower() == 'true'
+    CACHE_DIR = os.environ.get('EMBEDDING_CACHE_DIR', os.path.join(os.getcwd(), 'embedding_cache'))
+@dataclass
+class EmbeddingPipelineConfig:
+    BATCH_SIZE = int(os.environ.get('EMBEDDING_BATCH_SIZE', 64))
+    WORKERS = int(os.environ.get('EMBEDDING_WORKERS', min(2, os.cpu_count() or 1)))
+@dataclass
+class QueryCacheConfig:
+    ENABLED = os.environ.get('QUERY_CACHE_ENABLED', 'true').lower() == 'true'
+    TTL = int(os.environ.get('QUERY_CACHE_TTL', 900))
+    MAX_ENTRIES = int(os.environ.get('QUERY_CACHE_MAX_ENTRIES', 5000))
+    # Near-duplicate questions can still differ in meaning, so the semantic tier is opt-in
+    SEMANTIC_ENABLED = os.environ.get('QUERY_CACHE_SEMANTIC', 'false').lower() == 'true'
+    SEMANTIC_THRESHOLD = float(os.environ.get('QUERY_CACHE_SEMANTIC_THRESHOLD', 0.92))
+    SEMANTIC_MAX_PER_SHEET = int(os.environ.get('QUERY_CACHE_SEMANTIC_MAX_PER_SHEET', 500))
+@dataclass
+class QueryRouterConfig:
+    ENABLED = os.environ.get('QUERY_ROUTER_ENABLED', 'true').lower() == 'true'
+    MAX_VALUE_CARDINALITY = int(os.environ.get('QUERY_ROUTER_MAX_VALUE_CARDINALITY', 200))
+    DECISION_LOG_PATH = os.environ.get('QUERY_ROUTER_DECISION_LOG', '')
+    CLASSIFIER_ENABLED = os.environ.get('QUERY_ROUTER_CLASSIFIER', 'false').lower() == 'true'
+    CLASSIFIER_MIN_SAMPLES = int(os.environ.get('QUERY_ROUTER_CLASSIFIER_MIN_SAMPLES', 50))
+    CLASSIFIER_THRESHOLD = float(os.environ.get('QUERY_ROUTER_CLASSIFIER_THRESHOLD', 0.85))
+@dataclass
+class GraphBuildConfig:
+    BATCH_SIZE = int(os.environ.get('NEO4J_BATCH_SIZE', 500))
+    NLP_BATCH_SIZE = int(os.environ.get('SPACY_BATCH_SIZE', 64))
+    NLP_PROCESSES = int(os.environ.get('SPACY_PROCESSES', 1))
+    ENTITY_CACHE_SIZE = int(os.environ.get('ENTITY_CACHE_SIZE', 50000))
+    GC_INTERVAL = int(os.environ.get('GRAPH_GC_INTERVAL', 600))
+    DELETE_BATCH_SIZE = int(os.environ.get('GRAPH_DELETE_BATCH_SIZE', 1000))
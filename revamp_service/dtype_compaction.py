@@ -0,0 +1,70 @@
+from typing import Dict, Optional
+import pandas as pd
+from .configs import *
+from .logger import *
+logging = get_logger(__name__)
+
+try:
+    import pyarrow  # noqa: F401 - backs the "string[pyarrow]" dtype
+    ARROW_STRINGS_AVAILABLE = True
+except ImportError:
+    ARROW_STRINGS_AVAILABLE = False
+
+
+def infer_compact_dtypes(df: pd.DataFrame, config: Optional[DtypeCompactionConfig] = None) -> Dict[str, str]:
+    """Pick a compact dtype for every column of a freshly parsed sheet.
+
+    - integer columns are downcast to the smallest int type (ratings become int8)
+    - low-cardinality text answers ("Excellent"/"Good"/...) become categoricals
+    - remaining free text becomes Arrow-backed strings when pyarrow is installed
+
+    Float columns are left as float64: a rating column with blanks would otherwise
+    need a nullable integer type, and boolean masks built from those contain NA.
+    """
+    config = config or DtypeCompactionConfig()
+    dtypes = {}
+    for col in df.columns:
+        series = df[col]
+        if pd.api.types.is_bool_dtype(series):
+            continue
+
+        if pd.api.types.is_integer_dtype(series):
+            downcast = pd.to_numeric(series, downcast='integer')
+            if downcast.dtype != series.dtype:
+                dtypes[col] = str(downcast.dtype)
+            continue
+
+        if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+            continue
+
+        non_null = series.dropna()
+        if non_null.empty:
+            continue
+        unique_count = non_null.nunique()
+        if (unique_count <= config.CATEGORY_MAX_UNIQUE
+                and unique_count / len(non_null) <= config.CATEGORY_MAX_UNIQUE_RATIO):
+            dtypes[col] = 'category'
+        elif config.USE_ARROW_STRINGS and ARROW_STRINGS_AVAILABLE and str(series.dtype) != 'string[pyarrow]':
+            dtypes[col] = 'string[pyarrow]'
+    return dtypes
+
+
+def compact_dataframe(df: pd.DataFrame, config: Optional[DtypeCompactionConfig] = None) -> pd.DataFrame:
+    """Return the sheet with compact dtypes applied, meant to run once per sheet at ingestion"""
+    config = config or DtypeCompactionConfig()
+    if not config.ENABLED or df.empty:
+        return df
+
+    dtypes = infer_compact_dtypes(df, config)
+    if not dtypes:
+        return df
+
+    before = int(df.memory_usage(deep=True).sum())
+    try:
+        compact = df.astype(dtypes)
+    except (TypeError, ValueError) as e:
+        logging.warning(f"Dtype compaction failed, keeping parsed dtypes: {e}")
+        return df
+    after = int(compact.memory_usage(deep=True).sum())
+    logging.info(f"Compacted {len(dtypes)} columns: {before} -> {after} bytes")
+    return compact
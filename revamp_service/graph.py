@@ -1,24 +1,172 @@
+import asyncio
 from langchain_core.tools import tool
 import pandas as pd
-from io import BytesIO
-import requests
+import httpx
 from typing import Dict, Any, List
 import logging
 import re
+from .DataFrameStore import dataframe_store
+from .WorksheetFetcher import worksheet_fetcher, extract_sheet_id, WorksheetAccessError
+from .FilterIndex import filter_index_for, intersect_positions
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+class SheetLoadError(Exception):
+    """Raised when a sheet cannot be turned into a DataFrame for the tools"""
+
+
+async def _download_sheet(sheet_url: str) -> pd.DataFrame:
+    """Download and parse the CSV export of a Google Sheet"""
+    sheet_id = extract_sheet_id(sheet_url)
+    if not sheet_id:
+        raise SheetLoadError("Could not extract Google Sheet ID from URL")
+
+    logger.info(f"Extracted Sheet ID: {sheet_id}")
+
+    # Load the data with headers to handle authentication better
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+    }
+
+    try:
+        snapshot = await worksheet_fetcher.fetch(sheet_id, headers=headers, timeout=15)
+    except WorksheetAccessError as e:
+        raise SheetLoadError(str(e))
+
+    logger.info(f"Sheet content {snapshot.content_hash[:12]} (revalidated: {snapshot.revalidated}, parsed: {snapshot.parsed})")
+    return snapshot.frame
+
+
+# In-flight sheet loads, so tools running in parallel for one session share a single download
+_frame_loads: Dict[str, "asyncio.Future[pd.DataFrame]"] = {}
+
+
+async def load_session_dataframe(session_id: str, sheet_url: str) -> pd.DataFrame:
+    """Return the session's DataFrame from the store, downloading the sheet only on a miss"""
+    if session_id:
+        df = dataframe_store.get(session_id)
+        if df is not None:
+            logger.info(f"Using cached DataFrame for session {session_id}")
+            return df
+
+    load_key = session_id or sheet_url
+    pending = _frame_loads.get(load_key)
+    if pending is not None:
+        logger.info(f"Waiting for the sheet download already running for {load_key}")
+        return await asyncio.shield(pending)
+
+    pending = asyncio.get_running_loop().create_future()
+    _frame_loads[load_key] = pending
+    try:
+        logger.info(f"No cached DataFrame for session {session_id or '<none>'}, downloading sheet")
+        df = await _download_sheet(sheet_url)
+        if session_id:
+            dataframe_store.put(session_id, df, sheet_url)
+        pending.set_result(df)
+        return df
+    except BaseException as e:
+        pending.set_exception(e)
+        # Mark the exception as retrieved when nobody else was waiting for it
+        pending.exception()
+        raise
+    finally:
+        _frame_loads.pop(load_key, None)
+
+
+def _analyze_features(df: pd.DataFrame, features: List[str]) -> Dict[str, Any]:
+    """Column statistics for feature_analysis_tool, run off the event loop"""
+    results = {}
+    
+    # Analyze each requested feature
+    for col in features:
+        # Try exact match first
+        if col in df.columns:
+            target_col = col
+        else:
+            # Try case-insensitive partial match
+            matches = [c for c in df.columns if col.lower() in c.lower()]
+            if matches:
+                target_col = matches[0]
+                logger.info(f"Matched '{col}' to column '{target_col}'")
+            else:
+                logger.warning(f"Column '{col}' not found in dataset")
+                results[col] = {"error": "Column not found"}
+                continue
+    
+        dtype = str(df[target_col].dtype)
+        analysis = {"type": dtype, "column_name": target_col}
+    
+        # Numeric column analysis
+        if pd.api.types.is_numeric_dtype(df[target_col]):
+            clean_data = df[target_col].dropna()
+            if len(clean_data) > 0:
+                analysis.update({
+                    "mean": round(float(clean_data.mean()), 2),
+                    "median": round(float(clean_data.median()), 2),
+                    "std_dev": round(float(clean_data.std()), 2),
+                    "min": float(clean_data.min()),
+                    "max": float(clean_data.max()),
+                    "count": int(len(clean_data)),
+                    "missing": int(df[target_col].isna().sum())
+                })
+            else:
+                analysis["error"] = "No valid numeric data"
+    
+        # Categorical/text column analysis
+        else:
+            clean_data = df[target_col].dropna().astype(str)
+            if len(clean_data) > 0:
+                value_counts = clean_data.value_counts()
+    
+                # Get distribution of all values
+                distribution = {}
+                for val, count in value_counts.items():
+                    distribution[val] = {
+                        "count": int(count),
+                        "percentage": round((count / len(clean_data)) * 100, 2)
+                    }
+    
+                analysis.update({
+                    "mode": clean_data.mode().iloc[0] if not clean_data.mode().empty else None,
+                    "unique_count": int(clean_data.nunique()),
+                    "most_frequent": value_counts.idxmax() if len(value_counts) > 0 else None,
+                    "most_frequent_count": int(value_counts.iloc[0]) if len(value_counts) > 0 else 0,
+                    "distribution": distribution,
+                    "count": int(len(clean_data)),
+                    "missing": int(df[target_col].isna().sum())
+                })
+            else:
+                analysis["error"] = "No valid data"
+    
+        results[col] = analysis
+        logger.info(f"✅ Analyzed column '{target_col}': {analysis.get('type', 'unknown')}")
+    
+    # Include overview of all columns
+    results["_metadata"] = {
+        "total_rows": len(df),
+        "total_columns": len(df.columns),
+        "all_columns": list(df.columns),
+        "column_types": {col: str(df[col].dtype) for col in df.columns}
+    }
+    
+    logger.info(f"Successfully analyzed {len([k for k in results.keys() if k != '_metadata'])} features")
+    return results
+
+
 @tool
-def feature_analysis_tool(sheet_url: str, features: List[str]) -> Dict[str, Any]:
+async def feature_analysis_tool(sheet_url: str, features: List[str], session_id: str = "") -> Dict[str, Any]:
     """Analyze dataset features directly from Google Sheet.
     
     This tool loads data from a Google Sheet and performs statistical analysis
-    on the specified features/columns.
+    on the specified features/columns. When a session id is given the DataFrame
+    loaded by /start_session is reused instead of downloading the sheet again.
     
     Args:
         sheet_url: URL of the Google Sheet containing the dataset
         features: List of feature/column names to analyze
+        session_id: Chat session whose cached DataFrame should be used
     
     Returns:
         Dictionary with statistical analysis for each feature including:
@@ -29,130 +177,24 @@ def feature_analysis_tool(sheet_url: str, features: List[str]) -> Dict[str, Any]
     try:
         logger.info(f"Analyzing features {features[:3]}... from sheet: {sheet_url[:50]}...")
         
-        # Extract the sheet ID from various Google Sheets URL formats
-        sheet_id = None
-        
-        # Pattern 1: /d/{ID}/edit or /d/{ID}
-        match = re.search(r'/d/([a-zA-Z0-9-_]+)', sheet_url)
-        if match:
-            sheet_id = match.group(1)
-        
-        # Pattern 2: Direct sheet ID
-        elif len(sheet_url) > 20 and '/' not in sheet_url:
-            sheet_id = sheet_url
-        
-        if not sheet_id:
-            return {"error": "Could not extract Google Sheet ID from URL"}
-        
-        logger.info(f"Extracted Sheet ID: {sheet_id}")
-        
-        # Build clean CSV export URL
-        csv_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-        
-        logger.info(f"Fetching data from: {csv_url}")
-        
-        # Load the data with headers to handle authentication better
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(csv_url, timeout=15, headers=headers)
-        response.raise_for_status()
-        
-        # Check if we got HTML instead of CSV (indicates permission/auth issue)
-        if response.headers.get('content-type', '').startswith('text/html'):
-            return {
-                "error": "Google Sheet is not publicly accessible. Please make sure the sheet is shared with 'Anyone with the link' can view."
-            }
-        
-        df = pd.read_csv(BytesIO(response.content))
+        df = await load_session_dataframe(session_id, sheet_url)
         
         logger.info(f"Loaded dataframe with {len(df)} rows and {len(df.columns)} columns")
         logger.info(f"Available columns: {list(df.columns)}")
 
-        results = {}
-        
-        # Analyze each requested feature
-        for col in features:
-            # Try exact match first
-            if col in df.columns:
-                target_col = col
-            else:
-                # Try case-insensitive partial match
-                matches = [c for c in df.columns if col.lower() in c.lower()]
-                if matches:
-                    target_col = matches[0]
-                    logger.info(f"Matched '{col}' to column '{target_col}'")
-                else:
-                    logger.warning(f"Column '{col}' not found in dataset")
-                    results[col] = {"error": "Column not found"}
-                    continue
-
-            dtype = str(df[target_col].dtype)
-            analysis = {"type": dtype, "column_name": target_col}
-
-            # Numeric column analysis
-            if pd.api.types.is_numeric_dtype(df[target_col]):
-                clean_data = df[target_col].dropna()
-                if len(clean_data) > 0:
-                    analysis.update({
-                        "mean": round(float(clean_data.mean()), 2),
-                        "median": round(float(clean_data.median()), 2),
-                        "std_dev": round(float(clean_data.std()), 2),
-                        "min": float(clean_data.min()),
-                        "max": float(clean_data.max()),
-                        "count": int(len(clean_data)),
-                        "missing": int(df[target_col].isna().sum())
-                    })
-                else:
-                    analysis["error"] = "No valid numeric data"
-                    
-            # Categorical/text column analysis
-            else:
-                clean_data = df[target_col].dropna().astype(str)
-                if len(clean_data) > 0:
-                    value_counts = clean_data.value_counts()
-                    
-                    # Get distribution of all values
-                    distribution = {}
-                    for val, count in value_counts.items():
-                        distribution[val] = {
-                            "count": int(count),
-                            "percentage": round((count / len(clean_data)) * 100, 2)
-                        }
-                    
-                    analysis.update({
-                        "mode": clean_data.mode().iloc[0] if not clean_data.mode().empty else None,
-                        "unique_count": int(clean_data.nunique()),
-                        "most_frequent": value_counts.idxmax() if len(value_counts) > 0 else None,
-                        "most_frequent_count": int(value_counts.iloc[0]) if len(value_counts) > 0 else 0,
-                        "distribution": distribution,
-                        "count": int(len(clean_data)),
-                        "missing": int(df[target_col].isna().sum())
-                    })
-                else:
-                    analysis["error"] = "No valid data"
-
-            results[col] = analysis
-            logger.info(f"✅ Analyzed column '{target_col}': {analysis.get('type', 'unknown')}")
-
-        # Include overview of all columns
-        results["_metadata"] = {
-            "total_rows": len(df),
-            "total_columns": len(df.columns),
-            "all_columns": list(df.columns),
-            "column_types": {col: str(df[col].dtype) for col in df.columns}
-        }
+        # The statistics are CPU-bound, run them on a thread so other chat turns keep flowing
+        return await asyncio.to_thread(_analyze_features, df, features)
 
-        logger.info(f"Successfully analyzed {len([k for k in results.keys() if k != '_metadata'])} features")
-        return results
+    except SheetLoadError as e:
+        logger.error(str(e))
+        return {"error": str(e)}
 
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         error_msg = f"Failed to fetch Google Sheet (HTTP {e.response.status_code}). Make sure the sheet is publicly accessible (shared with 'Anyone with the link')."
         logger.error(error_msg)
         return {"error": error_msg}
     
-    except requests.exceptions.RequestException as e:
+    except httpx.RequestError as e:
         error_msg = f"Network error: {str(e)}"
         logger.error(error_msg)
         return {"error": error_msg}
@@ -168,8 +210,67 @@ def feature_analysis_tool(sheet_url: str, features: List[str]) -> Dict[str, Any]
         return {"error": error_msg}
 
 
+def _filter_rows(df: pd.DataFrame, conditions: Dict[str, Any]) -> Dict[str, Any]:
+    """Row filtering for filter_rows_tool, run off the event loop"""
+    index = filter_index_for(df)
+    applied_conditions = {}
+    matched_positions = []
+    
+    # Resolve each condition to the row positions it matches
+    for col_name, expected_value in conditions.items():
+        target_col = index.resolve_column(col_name)
+        if target_col is None:
+            logger.warning(f"Column '{col_name}' not found in dataset")
+            return {
+                "error": f"Column '{col_name}' not found",
+                "available_columns": list(df.columns)
+            }
+        if target_col != col_name:
+            logger.info(f"Matched '{col_name}' to column '{target_col}'")
+    
+        try:
+            positions = index.lookup(target_col, expected_value)
+        except (ValueError, TypeError):
+            logger.warning(f"Could not convert '{expected_value}' to numeric for column '{target_col}'")
+            return {
+                "error": f"Value '{expected_value}' cannot be compared to numeric column '{target_col}'"
+            }
+        if index.is_numeric(target_col):
+            applied_conditions[target_col] = float(expected_value)
+            logger.info(f"Applied numeric filter: {target_col} == {float(expected_value)}")
+        else:
+            applied_conditions[target_col] = str(expected_value).strip()
+            logger.info(f"Applied string filter: {target_col} == '{applied_conditions[target_col]}' (case-insensitive)")
+        matched_positions.append(positions)
+    
+    # AND the conditions together without copying the frame
+    filtered_df = df.iloc[intersect_positions(matched_positions)] if matched_positions else df
+    
+    # Convert filtered results to list of dictionaries
+    filtered_rows = filtered_df.to_dict('records')
+    
+    # Clean up NaN values in the output
+    for row in filtered_rows:
+        for key, value in row.items():
+            if pd.isna(value):
+                row[key] = None
+    
+    result = {
+        "filtered_rows": filtered_rows,
+        "total_matches": len(filtered_df),
+        "total_rows": len(df),
+        "conditions_applied": applied_conditions,
+        "columns": list(df.columns),
+        "match_percentage": round((len(filtered_df) / len(df) * 100), 2) if len(df) > 0 else 0
+    }
+    
+    logger.info(f"✅ Filter complete: {len(filtered_df)} matches out of {len(df)} total rows")
+    
+    return result
+
+
 @tool
-def filter_rows_tool(sheet_url: str, conditions: Dict[str, Any]) -> Dict[str, Any]:
+async def filter_rows_tool(sheet_url: str, conditions: Dict[str, Any], session_id: str = "") -> Dict[str, Any]:
     """Filter and retrieve rows from Google Sheet based on multiple conditions.
     
     This tool loads data from a Google Sheet and filters rows that match
@@ -180,6 +281,7 @@ def filter_rows_tool(sheet_url: str, conditions: Dict[str, Any]) -> Dict[str, An
         conditions: Dictionary mapping column names to their expected values
                    Example: {"Status": "Active", "Score": 85, "Department": "Engineering"}
                    Supports exact matches for strings and numbers
+        session_id: Chat session whose cached DataFrame should be used
     
     Returns:
         Dictionary containing:
@@ -193,112 +295,23 @@ def filter_rows_tool(sheet_url: str, conditions: Dict[str, Any]) -> Dict[str, An
         logger.info(f"Filtering rows with conditions: {conditions}")
         logger.info(f"From sheet: {sheet_url[:50]}...")
         
-        # Extract the sheet ID
-        sheet_id = None
-        match = re.search(r'/d/([a-zA-Z0-9-_]+)', sheet_url)
-        if match:
-            sheet_id = match.group(1)
-        elif len(sheet_url) > 20 and '/' not in sheet_url:
-            sheet_id = sheet_url
-        
-        if not sheet_id:
-            return {"error": "Could not extract Google Sheet ID from URL"}
-        
-        logger.info(f"Extracted Sheet ID: {sheet_id}")
-        
-        # Build CSV export URL
-        csv_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-        
-        # Fetch data
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-        
-        response = requests.get(csv_url, timeout=15, headers=headers)
-        response.raise_for_status()
-        
-        if response.headers.get('content-type', '').startswith('text/html'):
-            return {
-                "error": "Google Sheet is not publicly accessible. Please make sure the sheet is shared with 'Anyone with the link' can view."
-            }
-        
-        df = pd.read_csv(BytesIO(response.content))
+        df = await load_session_dataframe(session_id, sheet_url)
         
         logger.info(f"Loaded dataframe with {len(df)} rows and {len(df.columns)} columns")
         logger.info(f"Available columns: {list(df.columns)}")
         
-        # Start with all rows
-        filtered_df = df.copy()
-        applied_conditions = {}
-        
-        # Apply each condition
-        for col_name, expected_value in conditions.items():
-            # Try exact match first
-            if col_name in df.columns:
-                target_col = col_name
-            else:
-                # Try case-insensitive partial match
-                matches = [c for c in df.columns if col_name.lower() in c.lower()]
-                if matches:
-                    target_col = matches[0]
-                    logger.info(f"Matched '{col_name}' to column '{target_col}'")
-                else:
-                    logger.warning(f"Column '{col_name}' not found in dataset")
-                    return {
-                        "error": f"Column '{col_name}' not found",
-                        "available_columns": list(df.columns)
-                    }
-            
-            # Apply filter based on data type
-            if pd.api.types.is_numeric_dtype(filtered_df[target_col]):
-                # Numeric comparison
-                try:
-                    numeric_value = float(expected_value)
-                    filtered_df = filtered_df[filtered_df[target_col] == numeric_value]
-                    applied_conditions[target_col] = numeric_value
-                    logger.info(f"Applied numeric filter: {target_col} == {numeric_value}")
-                except (ValueError, TypeError):
-                    logger.warning(f"Could not convert '{expected_value}' to numeric for column '{target_col}'")
-                    return {
-                        "error": f"Value '{expected_value}' cannot be compared to numeric column '{target_col}'"
-                    }
-            else:
-                # String comparison (case-insensitive)
-                str_value = str(expected_value).strip()
-                filtered_df = filtered_df[
-                    filtered_df[target_col].astype(str).str.strip().str.lower() == str_value.lower()
-                ]
-                applied_conditions[target_col] = str_value
-                logger.info(f"Applied string filter: {target_col} == '{str_value}' (case-insensitive)")
-        
-        # Convert filtered results to list of dictionaries
-        filtered_rows = filtered_df.to_dict('records')
-        
-        # Clean up NaN values in the output
-        for row in filtered_rows:
-            for key, value in row.items():
-                if pd.isna(value):
-                    row[key] = None
-        
-        result = {
-            "filtered_rows": filtered_rows,
-            "total_matches": len(filtered_df),
-            "total_rows": len(df),
-            "conditions_applied": applied_conditions,
-            "columns": list(df.columns),
-            "match_percentage": round((len(filtered_df) / len(df) * 100), 2) if len(df) > 0 else 0
-        }
-        
-        logger.info(f"✅ Filter complete: {len(filtered_df)} matches out of {len(df)} total rows")
-        
-        return result
+        return await asyncio.to_thread(_filter_rows, df, conditions)
+
+    except SheetLoadError as e:
+        logger.error(str(e))
+        return {"error": str(e)}
 
-    except requests.exceptions.HTTPError as e:
+    except httpx.HTTPStatusError as e:
         error_msg = f"Failed to fetch Google Sheet (HTTP {e.response.status_code}). Make sure the sheet is publicly accessible."
         logger.error(error_msg)
         return {"error": error_msg}
     
-    except requests.exceptions.RequestException as e:
+    except httpx.RequestError as e:
         error_msg = f"Network error: {str(e)}"
         logger.error(error_msg)
         return {"error": error_msg}
@@ -315,7 +328,7 @@ def filter_rows_tool(sheet_url: str, conditions: Dict[str, Any]) -> Dict[str, An
 
 from langgraph.graph import StateGraph, END
 from langchain_groq import ChatGroq
-from typing import TypedDict, Literal, List, Dict, Any
+from typing import TypedDict, Literal, List, Dict, Any, Union
 import logging
 
 # Setup logging
@@ -323,6 +336,7 @@ logger = logging.getLogger(__name__)
 logging.basicConfig(level=logging.INFO)
 
 from .configs import GroqChatRag
+from .QueryRouter import query_router
 config = GroqChatRag()
 llm = ChatGroq(
     model=config.LLM_MODEL,
@@ -335,6 +349,7 @@ llm = ChatGroq(
 class GraphState(TypedDict):
     question: str
     context: str
+    session_id: str
     sheet_url: str
     dataset_description: List[Dict[str, Any]]
     analysis: Dict[str, Any]
@@ -347,7 +362,7 @@ class GraphState(TypedDict):
 def build_tools_graph():
     workflow = StateGraph(GraphState)
 
-    def decision_node(state: GraphState) -> GraphState:
+    async def decision_node(state: GraphState) -> GraphState:
         """Decides if statistical analysis and/or row filtering is needed"""
         logger.info("=" * 80)
         logger.info("🔍 DECISION NODE - Starting analysis")
@@ -360,6 +375,18 @@ def build_tools_graph():
         logger.info(f"📝 Query: {query}")
         logger.info(f"📊 Available columns: {available_columns}")
         
+        # Lookups and plain statistics questions are routed locally, saving an LLM round trip
+        route = query_router.route(query, available_columns, state.get("session_id", ""))
+        if route is not None:
+            logger.info(f"⚡ DECISION ({route.source}, confidence {route.confidence:.2f}): {route.decision}")
+            logger.info(f"   Filter conditions: {route.filter_conditions}")
+            logger.info("=" * 80)
+            return {
+                "decision": route.decision,
+                "needs_filtering": route.needs_filtering,
+                "filter_conditions": route.filter_conditions
+            }
+        
         # Decision prompt for both tools
         prompt = f"""You are a decision agent that determines which tools are needed to answer a query.
 
@@ -415,7 +442,7 @@ FILTER_CONDITIONS: {{"Rating": "Excellent"}}
 Your response:"""
 
         logger.info("🤖 Sending decision prompt to LLM...")
-        response = llm.invoke(prompt).content.strip()
+        response = (await llm.ainvoke(prompt)).content.strip()
         logger.info(f"🎯 LLM Response:\n{response}")
         
         # Parse response
@@ -449,6 +476,7 @@ Your response:"""
         logger.info(f"   Filtering needed: {needs_filtering}")
         logger.info(f"   Filter conditions: {filter_conditions}")
         logger.info("=" * 80)
+        query_router.record(query, available_columns, decision, filter_conditions)
         
         return {
             "decision": decision,
@@ -456,7 +484,7 @@ Your response:"""
             "filter_conditions": filter_conditions
         }
 
-    def mcp_analysis_node(state: GraphState) -> GraphState:
+    async def mcp_analysis_node(state: GraphState) -> GraphState:
         """Fetches feature analysis using the tool"""
         logger.info("=" * 80)
         logger.info("📊 MCP ANALYSIS NODE - Calling analysis tool")
@@ -470,9 +498,10 @@ Your response:"""
         
         try:
             logger.info("⏳ Invoking feature_analysis_tool...")
-            analysis = feature_analysis_tool.invoke({
+            analysis = await feature_analysis_tool.ainvoke({
                 "sheet_url": sheet_url,
-                "features": features
+                "features": features,
+                "session_id": state.get("session_id", "")
             })
             
             if analysis.get("error"):
@@ -490,7 +519,7 @@ Your response:"""
         
         return {"analysis": analysis}
 
-    def filter_rows_node(state: GraphState) -> GraphState:
+    async def filter_rows_node(state: GraphState) -> GraphState:
         """Filters rows based on conditions"""
         logger.info("=" * 80)
         logger.info("🔍 FILTER ROWS NODE - Calling filter tool")
@@ -508,9 +537,10 @@ Your response:"""
         
         try:
             logger.info("⏳ Invoking filter_rows_tool...")
-            filtered_data = filter_rows_tool.invoke({
+            filtered_data = await filter_rows_tool.ainvoke({
                 "sheet_url": sheet_url,
-                "conditions": conditions
+                "conditions": conditions,
+                "session_id": state.get("session_id", "")
             })
             
             if filtered_data.get("error"):
@@ -526,7 +556,7 @@ Your response:"""
         
         return {"filtered_data": filtered_data}
 
-    def answer_node(state: GraphState) -> GraphState:
+    async def answer_node(state: GraphState) -> GraphState:
         """Produces final answer using LLM"""
         logger.info("=" * 80)
         logger.info("💬 ANSWER NODE - Generating final response")
@@ -615,7 +645,7 @@ INSTRUCTIONS:
 Generate your answer now:"""
 
         logger.info("🤖 Sending answer prompt to LLM...")
-        response = llm.invoke(prompt).content.strip()
+        response = (await llm.ainvoke(prompt)).content.strip()
         logger.info(f"✅ Generated answer ({len(response)} characters)")
         logger.info("=" * 80)
         
@@ -628,7 +658,7 @@ Generate your answer now:"""
     workflow.add_node("answer", answer_node)
 
     # Routing function
-    def route_decision(state: GraphState) -> Literal["answer", "mcp_analysis", "filter_rows"]:
+    def route_decision(state: GraphState) -> Union[Literal["answer", "mcp_analysis", "filter_rows"], List[str]]:
         """Routes based on decision in state"""
         decision = state.get("decision", "enough")
         
@@ -645,8 +675,9 @@ Generate your answer now:"""
             logger.info("   → Route: Call FILTER_ROWS first")
             return "filter_rows"
         else:  # need_both
-            logger.info("   → Route: Call MCP_ANALYSIS first (will chain to filtering)")
-            return "mcp_analysis"
+            # Both tools read the same frame and write different state keys, so they run side by side
+            logger.info("   → Route: Call MCP_ANALYSIS and FILTER_ROWS in parallel")
+            return ["mcp_analysis", "filter_rows"]
 
     # Add conditional edges from decision node
     workflow.add_conditional_edges(
@@ -659,26 +690,9 @@ Generate your answer now:"""
         }
     )
     
-    # Chain tools when both are needed
-    def route_after_analysis(state: GraphState) -> Literal["answer", "filter_rows"]:
-        """After analysis, check if filtering is also needed"""
-        if state.get("needs_filtering", False):
-            logger.info("   → After analysis: Going to FILTER_ROWS")
-            return "filter_rows"
-        else:
-            logger.info("   → After analysis: Going to ANSWER")
-            return "answer"
-    
-    workflow.add_conditional_edges(
-        "mcp_analysis",
-        route_after_analysis,
-        {
-            "answer": "answer",
-            "filter_rows": "filter_rows"
-        }
-    )
-    
-    # After filtering, always go to answer
+    # Each tool goes straight to answer; when both ran in parallel they finish in the same
+    # step and answer runs once with both results
+    workflow.add_edge("mcp_analysis", "answer")
     workflow.add_edge("filter_rows", "answer")
     workflow.add_edge("answer", END)
 
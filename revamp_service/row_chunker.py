@@ -0,0 +1,45 @@
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, Iterable, Iterator, List, Tuple
+
+
+@dataclass
+class RowChunk:
+    text: str
+    row_ids: List[int] = field(default_factory=list)
+
+
+def chunk_rows(rows: Iterable[str], chunk_size: int, overlap_rows: int = 0) -> Iterator[RowChunk]:
+    """Pack whole text rows into newline-joined chunks of at most chunk_size characters.
+
+    Rows are never split; a row longer than chunk_size becomes a chunk of its own.
+    The last overlap_rows rows of a chunk are repeated at the start of the next one
+    when they fit. Runs in a single pass without building one joined string.
+    """
+    current: Deque[Tuple[int, str]] = deque()
+    current_length = 0
+
+    def emit() -> RowChunk:
+        return RowChunk(text="\n".join(text for _, text in current),
+                        row_ids=[row_id for row_id, _ in current])
+
+    for row_id, row in enumerate(rows):
+        added_length = len(row) + (1 if current else 0)
+        if current and current_length + added_length > chunk_size:
+            yield emit()
+            overlap = list(current)[-overlap_rows:] if overlap_rows > 0 else []
+            current.clear()
+            current_length = 0
+            for item in overlap:
+                current.append(item)
+                current_length += len(item[1]) + (1 if len(current) > 1 else 0)
+            # Drop overlap rows that would push the new row past the limit
+            while current and current_length + len(row) + 1 > chunk_size:
+                _, dropped = current.popleft()
+                current_length -= len(dropped) + (1 if current else 0)
+            added_length = len(row) + (1 if current else 0)
+        current.append((row_id, row))
+        current_length += added_length
+
+    if current:
+        yield emit()
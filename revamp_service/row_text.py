@@ -0,0 +1,39 @@
+from typing import Iterator, List
+import numpy as np
+import pandas as pd
+
+
+def _render_block(df: pd.DataFrame, skip_na: bool) -> np.ndarray:
+    """Render a block of rows column by column instead of walking rows with iterrows"""
+    rendered = np.full(len(df), "", dtype=object)
+    for position, col in enumerate(df.columns):
+        series = df.iloc[:, position]
+        if pd.api.types.is_datetime64_any_dtype(series) or pd.api.types.is_timedelta64_dtype(series):
+            # astype(str) drops the midnight time of dates and turns NaT into NaN, str() matches f"{value}"
+            text = series.map(str)
+        else:
+            # Missing values render as "nan" like f"{value}" did (newer pandas keeps them as NaN in astype(str))
+            text = series.astype(str).fillna("nan")
+        pieces = f"{col}: " + text.to_numpy(dtype=object)
+        if skip_na:
+            present = series.notna().to_numpy()
+            separator = np.where(rendered == "", "", " | ")
+            rendered = np.where(present, rendered + separator + pieces, rendered)
+        elif position == 0:
+            rendered = pieces
+        else:
+            rendered = rendered + " | " + pieces
+    return rendered
+
+
+def render_text_rows(df: pd.DataFrame, skip_na: bool = True) -> List[str]:
+    """Render every row as "col: val | col: val" text, optionally skipping missing values"""
+    if df.empty:
+        return []
+    return _render_block(df, skip_na).tolist()
+
+
+def iter_text_rows(df: pd.DataFrame, skip_na: bool = True, batch_size: int = 1000) -> Iterator[str]:
+    """Generator version of render_text_rows that renders batch_size rows at a time"""
+    for start in range(0, len(df), batch_size):
+        yield from _render_block(df.iloc[start:start + batch_size], skip_na).tolist()
@@ -0,0 +1,79 @@
+import pandas as pd
+import pytest
+from revamp_service.DataFrameStore import PARQUET_AVAILABLE, SessionDataFrameStore
+from revamp_service.configs import DataFrameStoreConfig
+
+needs_parquet = pytest.mark.skipif(not PARQUET_AVAILABLE, reason="pyarrow not installed")
+
+
+@pytest.fixture
+def config(tmp_path):
+    config = DataFrameStoreConfig()
+    config.MAX_MEMORY_BYTES = 1
+    config.SPILL_DIR = str(tmp_path)
+    return config
+
+
+def sheet(rows=1000):
+    return pd.DataFrame({"value": range(rows), "label": [f"row {i}" for i in range(rows)]})
+
+
+def test_frame_shared_by_sessions_is_counted_once(config):
+    config.MAX_MEMORY_BYTES = 10 ** 9
+    store = SessionDataFrameStore(config)
+    df = sheet()
+    store.put("a", df)
+    store.put("b", df)
+    assert store.memory_bytes == int(df.memory_usage(deep=True).sum())
+
+    store.drop("a")
+    assert store.memory_bytes == int(df.memory_usage(deep=True).sum())
+    store.drop("b")
+    assert store.memory_bytes == 0
+    assert store.get("b") is None
+
+
+@needs_parquet
+def test_spilled_frame_is_reloaded(config, tmp_path):
+    store = SessionDataFrameStore(config)
+    store.put("a", sheet())
+    store.put("b", sheet())
+    assert store.stats()["spills"] == 1
+
+    pd.testing.assert_frame_equal(store.get("a"), sheet())
+    store.drop("a")
+    assert not (tmp_path / "a.parquet").exists()
+
+
+@needs_parquet
+def test_sessions_sharing_a_frame_spill_and_reload_together(config):
+    store = SessionDataFrameStore(config)
+    shared = sheet()
+    store.put("a", shared)
+    store.put("b", shared)
+    store.put("c", sheet(10))
+    # One spill file serves both sessions
+    assert store.stats()["in_memory"] == 1
+    assert store.stats()["spills"] == 1
+
+    reloaded = store.get("a")
+    assert store.get("b") is reloaded
+    store.drop("a")
+    pd.testing.assert_frame_equal(store.get("b"), shared)
+
+
+@needs_parquet
+def test_spill_listeners_release_outside_copies(config):
+    store = SessionDataFrameStore(config)
+    outside = {"sheet": sheet()}
+
+    def release(frame):
+        if outside.get("sheet") is frame:
+            del outside["sheet"]
+
+    store.add_spill_listener(release)
+    store.put("a", outside["sheet"])
+    store.put("b", sheet(10))
+    # The outside cache held a's frame too; it was spilled anyway and the cache let it go
+    assert store.stats()["in_memory"] == 1
+    assert outside == {}
@@ -0,0 +1,50 @@
+import pandas as pd
+import pytest
+from revamp_service.configs import DtypeCompactionConfig
+from revamp_service.dtype_compaction import ARROW_STRINGS_AVAILABLE, compact_dataframe, infer_compact_dtypes
+
+
+def survey(rows=200):
+    return pd.DataFrame({
+        "Rating": [i % 5 + 1 for i in range(rows)],
+        "Overall": [["Excellent", "Good", "Poor"][i % 3] for i in range(rows)],
+        "Comments": [f"comment number {i}" for i in range(rows)],
+        "Score": [i / 2 for i in range(rows)],
+        "Attended": [i % 2 == 0 for i in range(rows)],
+    })
+
+
+def test_infers_compact_dtypes_per_column():
+    dtypes = infer_compact_dtypes(survey())
+    assert dtypes["Rating"] == "int8"
+    assert dtypes["Overall"] == "category"
+    assert "Score" not in dtypes
+    assert "Attended" not in dtypes
+    if ARROW_STRINGS_AVAILABLE:
+        assert dtypes["Comments"] == "string[pyarrow]"
+
+
+def test_compaction_keeps_values_and_shrinks_memory():
+    df = survey()
+    compact = compact_dataframe(df)
+    assert compact.memory_usage(deep=True).sum() < df.memory_usage(deep=True).sum()
+    for column in df.columns:
+        assert compact[column].astype(object).tolist() == df[column].tolist()
+
+
+def test_float_column_with_blanks_stays_float():
+    df = pd.DataFrame({"Rating": [5.0, None, 3.0] * 10})
+    assert "Rating" not in infer_compact_dtypes(df)
+
+
+def test_disabled_config_returns_frame_unchanged():
+    config = DtypeCompactionConfig()
+    config.ENABLED = False
+    df = survey()
+    assert compact_dataframe(df, config) is df
+
+
+@pytest.mark.parametrize("values", [["a", "b", None, "a"] * 10, [None] * 10])
+def test_nulls_survive_compaction(values):
+    df = pd.DataFrame({"col": values})
+    assert compact_dataframe(df)["col"].isna().sum() == df["col"].isna().sum()
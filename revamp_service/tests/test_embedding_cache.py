@@ -0,0 +1,64 @@
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from revamp_service.EmbeddingCache import CachedEmbeddings, EmbeddingDiskCache, text_hash
+from revamp_service.configs import EmbeddingCacheConfig
+
+
+class CountingEmbeddings(Embeddings):
+    """Deterministic fake model that records every text it embeds"""
+
+    def __init__(self):
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 97), 1.0] for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def cached_embeddings(tmp_path, model=None):
+    config = EmbeddingCacheConfig()
+    config.CACHE_DIR = str(tmp_path)
+    return CachedEmbeddings(model or CountingEmbeddings(), "test/model", config)
+
+
+def test_only_unseen_texts_are_embedded(tmp_path):
+    embeddings = cached_embeddings(tmp_path)
+    first = embeddings.embed_documents(["a", "b", "a"])
+    second = embeddings.embed_documents(["b", "c"])
+    assert embeddings.embeddings.embedded == ["a", "b", "c"]
+    assert first[0] == first[2]
+    assert second[0] == first[1]
+    assert embeddings.stats() == {"hits": 1, "misses": 3, "cached_vectors": 3}
+
+
+def test_vectors_match_the_wrapped_model(tmp_path):
+    model = CountingEmbeddings()
+    embeddings = cached_embeddings(tmp_path, model)
+    texts = ["Rating: 5 | Overall: Good", "Rating: 1 | Overall: Poor"]
+    embeddings.embed_documents(texts)
+    np.testing.assert_allclose(embeddings.embed_documents(texts), model.embed_documents(texts))
+
+
+def test_cache_is_shared_through_the_directory(tmp_path):
+    cached_embeddings(tmp_path).embed_documents(["x", "y"])
+    # A second worker, or a restart, reads what the first one wrote
+    other = cached_embeddings(tmp_path)
+    other.embed_documents(["x", "y", "z"])
+    assert other.embeddings.embedded == ["z"]
+
+
+def test_disk_cache_ignores_vectors_without_keys(tmp_path):
+    cache = EmbeddingDiskCache("m", str(tmp_path))
+    cache.put_many([text_hash("a")], np.ones((1, 3)))
+    # Simulate a writer that died after appending vectors but before recording keys
+    with open(cache.vectors_path, "ab") as f:
+        f.write(np.full(3, 9, dtype=np.float32).tobytes())
+    cache.put_many([text_hash("b")], np.full((1, 3), 2.0))
+
+    reopened = EmbeddingDiskCache("m", str(tmp_path))
+    vectors = reopened.get_many([text_hash("a"), text_hash("b")])
+    np.testing.assert_array_equal(vectors[text_hash("a")], np.ones(3))
+    np.testing.assert_array_equal(vectors[text_hash("b")], np.full(3, 2.0))
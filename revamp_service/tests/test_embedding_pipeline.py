@@ -0,0 +1,52 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import random
+import time
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from revamp_service.EmbeddingPipeline import EmbeddingPipeline
+from revamp_service.configs import EmbeddingPipelineConfig
+
+
+class SlowEmbeddings(Embeddings):
+    """Embeds each text as [row number, length] after a random delay, tracking batches in flight"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+
+    def embed_documents(self, texts):
+        with self.lock:
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(random.uniform(0, 0.01))
+        with self.lock:
+            self.in_flight -= 1
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(text.split()[-1]), float(len(text))]
+
+
+def test_vectors_line_up_with_chunks_in_order():
+    config = EmbeddingPipelineConfig()
+    config.WORKERS = 3
+    embeddings = SlowEmbeddings()
+    texts = [f"chunk {i}" for i in range(50)]
+    metadatas = [{"chunk_index": i} for i in range(50)]
+    pipeline = EmbeddingPipeline(embeddings, config)
+    # More threads than WORKERS, so only the pipeline's own window limits batches in flight
+    pipeline.executor = ThreadPoolExecutor(max_workers=10)
+
+    vectorstore = asyncio.run(pipeline.build_index(texts, metadatas, batch_size=4))
+
+    assert vectorstore.index.ntotal == 50
+    for position, text in enumerate(texts):
+        doc = vectorstore.docstore.search(vectorstore.index_to_docstore_id[position])
+        assert doc.page_content == text
+        assert doc.metadata == {"chunk_index": position}
+        np.testing.assert_allclose(vectorstore.index.reconstruct(position), embeddings.embed_query(text))
+    assert embeddings.peak <= config.WORKERS
+    assert pipeline.stats()["last_run"]["batches"] == 13
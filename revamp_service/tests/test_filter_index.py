@@ -0,0 +1,69 @@
+import gc
+import numpy as np
+import pandas as pd
+import pytest
+from revamp_service import FilterIndex as filter_index_module
+from revamp_service.FilterIndex import FilterIndex, filter_index_for, intersect_positions
+
+
+@pytest.fixture
+def feedback():
+    rng = np.random.default_rng(0)
+    rows = 500
+    return pd.DataFrame({
+        "Overall Rating": rng.choice([" Excellent", "excellent", "Good", "Poor", None], rows),
+        "Department": pd.Categorical(rng.choice(["CS", "ME", "EE"], rows)),
+        "Score": rng.integers(0, 10, rows),
+        "Weight": rng.choice([0.5, 1.0, np.nan], rows),
+    })
+
+
+def scan(df, conditions):
+    """The row-by-row filter that the index replaced"""
+    filtered = df
+    for column, value in conditions.items():
+        if pd.api.types.is_numeric_dtype(filtered[column]):
+            filtered = filtered[filtered[column] == float(value)]
+        else:
+            filtered = filtered[filtered[column].astype(str).str.strip().str.lower() == str(value).strip().lower()]
+    return filtered
+
+
+@pytest.mark.parametrize("conditions", [
+    {"Overall Rating": "EXCELLENT"},
+    {"Overall Rating": "good", "Department": "cs"},
+    {"Department": "ME", "Score": "3"},
+    {"Weight": 0.5, "Score": 7},
+    {"Department": "nope"},
+])
+def test_lookup_matches_a_full_scan(feedback, conditions):
+    index = FilterIndex(feedback)
+    positions = intersect_positions([index.lookup(column, value) for column, value in conditions.items()])
+    assert feedback.iloc[positions].index.equals(scan(feedback, conditions).index)
+
+
+def test_resolve_column_exact_then_partial(feedback):
+    index = FilterIndex(feedback)
+    assert index.resolve_column("Score") == "Score"
+    assert index.resolve_column("rating") == "Overall Rating"
+    assert index.resolve_column("missing") is None
+
+
+def test_non_numeric_value_on_numeric_column_raises(feedback):
+    with pytest.raises(ValueError):
+        FilterIndex(feedback).lookup("Score", "high")
+
+
+def test_intersect_positions_stops_on_empty():
+    assert intersect_positions([np.array([1, 2, 3]), np.array([], dtype=np.int32), np.array([2])]).size == 0
+    np.testing.assert_array_equal(intersect_positions([np.array([1, 2, 3]), np.array([2, 3, 4])]), [2, 3])
+
+
+def test_index_is_shared_per_frame_and_freed_with_it():
+    df = pd.DataFrame({"Department": ["CS", "ME"] * 10})
+    index = filter_index_for(df)
+    assert filter_index_for(df) is index
+    frame_id = id(df)
+    del df, index
+    gc.collect()
+    assert frame_id not in filter_index_module._indexes
@@ -0,0 +1,67 @@
+import asyncio
+import os
+from types import SimpleNamespace
+import pytest
+
+pytest.importorskip("langchain_groq")
+os.environ.setdefault("GROQ_API_KEY", "test")
+from revamp_service import graph
+
+DECISION = 'NEEDS_ANALYSIS: yes\nNEEDS_FILTERING: yes\nFILTER_CONDITIONS: {"Rating": "Excellent"}'
+
+
+class ScriptedLLM:
+    """Answers the decision prompt with DECISION and records every answer prompt"""
+
+    def __init__(self):
+        self.answer_prompts = []
+
+    async def ainvoke(self, prompt):
+        if prompt.startswith("You are a decision agent"):
+            return SimpleNamespace(content=DECISION)
+        self.answer_prompts.append(prompt)
+        return SimpleNamespace(content="Two excellent ratings, average score 4.5")
+
+
+class MeetingTool:
+    """Fake tool that only returns once the other tool has started, so it fails unless both run at once"""
+
+    def __init__(self, result, started, other):
+        self.result, self.started, self.other = result, started, other
+
+    async def ainvoke(self, arguments):
+        self.started.set()
+        await asyncio.wait_for(self.other.wait(), timeout=1)
+        return self.result
+
+
+def test_need_both_runs_the_tools_in_parallel_and_answers_once(monkeypatch):
+    llm = ScriptedLLM()
+    monkeypatch.setattr(graph, "llm", llm)
+    monkeypatch.setattr(graph.query_router, "route", lambda *args: None)
+    monkeypatch.setattr(graph.query_router, "record", lambda *args: None)
+
+    async def main():
+        analysis_started, filter_started = asyncio.Event(), asyncio.Event()
+        analysis = {"Score": {"type": "float64", "mean": 4.5}, "_metadata": {"total_rows": 10}}
+        filtered = {"filtered_rows": [{"Rating": "Excellent"}] * 2, "total_matches": 2, "total_rows": 10}
+        monkeypatch.setattr(graph, "feature_analysis_tool",
+                            MeetingTool(analysis, analysis_started, filter_started))
+        monkeypatch.setattr(graph, "filter_rows_tool",
+                            MeetingTool(filtered, filter_started, analysis_started))
+        return await graph.build_tools_graph().ainvoke({
+            "question": "What's the average score for Excellent ratings?",
+            "context": "",
+            "session_id": "s1",
+            "sheet_url": "https://docs.google.com/spreadsheets/d/abc/edit",
+            "dataset_description": [{"name": "Rating"}, {"name": "Score"}],
+        })
+
+    state = asyncio.run(main())
+    assert state["decision"] == "need_both"
+    assert state["filter_conditions"] == {"Rating": "Excellent"}
+    assert state["analysis"]["_metadata"]["total_rows"] == 10
+    assert state["filtered_data"]["total_matches"] == 2
+    assert len(llm.answer_prompts) == 1
+    assert "COMPLETE DATASET STATISTICAL ANALYSIS" in llm.answer_prompts[0]
+    assert "FILTERED ROWS" in llm.answer_prompts[0]
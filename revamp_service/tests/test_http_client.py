@@ -0,0 +1,82 @@
+import asyncio
+import httpx
+import pytest
+from revamp_service.HttpClient import PooledHttpClient, RetryBudget
+from revamp_service.configs import HttpClientConfig
+
+
+@pytest.fixture
+def outcomes():
+    """What the server does for each request in turn: a status code or a transport error. The last one repeats"""
+    return []
+
+
+@pytest.fixture
+def client(outcomes):
+    config = HttpClientConfig()
+    config.MAX_RETRIES = 2
+    config.RETRY_BACKOFF = 0
+    client = PooledHttpClient(config)
+
+    def handler(request):
+        outcome = outcomes.pop(0) if len(outcomes) > 1 else outcomes[0]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return httpx.Response(outcome)
+
+    client._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    return client
+
+
+def test_retries_retryable_statuses_until_success(client, outcomes):
+    outcomes.extend([503, 502, 200])
+    response = asyncio.run(client.get("https://example.com/"))
+    assert response.status_code == 200
+    assert client.stats["retries"] == 2
+
+
+def test_gives_up_after_max_retries(client, outcomes):
+    outcomes.append(504)
+    client.Config.MAX_RETRIES = 1
+    assert asyncio.run(client.get("https://example.com/")).status_code == 504
+    assert client.stats["requests"] == 2
+
+
+def test_client_errors_are_not_retried(client, outcomes):
+    outcomes.append(404)
+    assert asyncio.run(client.get("https://example.com/")).status_code == 404
+    assert client.stats["retries"] == 0
+
+
+def test_transport_errors_are_raised_after_retries(client, outcomes):
+    outcomes.append(httpx.ConnectError("refused"))
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(client.get("https://example.com/"))
+    assert client.stats["retries"] == 2
+
+
+def test_retry_budget_denies_retries_once_spent(client, outcomes):
+    outcomes.append(503)
+    client.Config.MAX_RETRIES = 5
+    client.retry_budget = RetryBudget(ratio=0.1, reserve=1)
+    asyncio.run(client.get("https://example.com/"))
+    assert client.stats["retries"] == 1
+    assert client.stats["retries_denied"] == 1
+
+
+def test_post_is_not_retried_unless_the_caller_opts_in(client, outcomes):
+    outcomes.append(503)
+    assert asyncio.run(client.post("https://example.com/", json={})).status_code == 503
+    assert client.stats["retries"] == 0
+
+    asyncio.run(client.post("https://example.com/", json={}, retry=True))
+    assert client.stats["retries"] == 2
+
+
+def test_retry_budget_refills_with_requests():
+    budget = RetryBudget(ratio=0.5, reserve=2)
+    assert budget.try_withdraw() and budget.try_withdraw()
+    assert not budget.try_withdraw()
+    budget.record_request()
+    budget.record_request()
+    assert budget.try_withdraw()
@@ -0,0 +1,44 @@
+import pickle
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+from revamp_service.IndexCodec import index_codec
+
+
+class LengthEmbeddings(Embeddings):
+    """Deterministic 3-d vectors so searches have a known nearest chunk"""
+
+    def embed_documents(self, texts):
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text):
+        return [float(len(text)), float(text.count("a")), 1.0]
+
+
+TEXTS = ["name: Asha", "name: Ravi, rating: 4", "name: Meera, feedback: great value"]
+
+
+def test_round_trip_keeps_vectors_texts_and_metadata():
+    embeddings = LengthEmbeddings()
+    original = FAISS.from_texts(TEXTS, embeddings, metadatas=[{"chunk_index": i, "row_ids": [i]} for i in range(3)])
+    restored = index_codec.decode(index_codec.encode(original), embeddings)
+    assert restored.index.ntotal == 3
+    for position, text in enumerate(TEXTS):
+        doc = restored.docstore.search(restored.index_to_docstore_id[position])
+        assert doc.page_content == text
+        assert doc.metadata == {"chunk_index": position, "row_ids": [position]}
+    hit = restored.similarity_search(TEXTS[1], k=1)[0]
+    assert hit.page_content == TEXTS[1]
+
+
+def test_pickled_payloads_are_rejected():
+    with pytest.raises(ValueError):
+        index_codec.decode(pickle.dumps({"docstore": "anything"}), LengthEmbeddings())
+
+
+def test_unknown_codec_version_is_rejected():
+    embeddings = LengthEmbeddings()
+    payload = bytearray(index_codec.encode(FAISS.from_texts(TEXTS, embeddings)))
+    payload[2] = 9
+    with pytest.raises(ValueError, match="version"):
+        index_codec.decode(bytes(payload), embeddings)
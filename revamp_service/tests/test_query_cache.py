@@ -0,0 +1,73 @@
+import asyncio
+import numpy as np
+import pytest
+from revamp_service.QueryCache import QueryCache, question_literals
+from revamp_service.configs import QueryCacheConfig
+
+
+@pytest.fixture
+def answer_cache():
+    config = QueryCacheConfig()
+    config.SEMANTIC_ENABLED = True
+    return QueryCache(config)
+
+
+def bag_of_words(text):
+    """Embedding where questions differing only in a number are near-identical, like MiniLM"""
+    vector = np.zeros(64, dtype=np.float32)
+    for word in text.split():
+        vector[sum(map(ord, word)) % 64] += 1
+    return vector.tolist()
+
+
+def ask(cache, question, description="Spring meetup", sheet_key="sheet"):
+    return asyncio.run(cache.lookup(sheet_key, question, bag_of_words, description))
+
+
+def answer(cache, lookup, text):
+    asyncio.run(cache.store(lookup, {"answer": text}, bag_of_words))
+
+
+def test_semantic_tier_is_off_by_default():
+    assert QueryCacheConfig().SEMANTIC_ENABLED is False
+
+
+def test_exact_hit_ignores_case_and_punctuation(answer_cache):
+    answer_cache.Config.SEMANTIC_ENABLED = False
+    answer(answer_cache, ask(answer_cache, "How many attendees?"), "42")
+    hit = ask(answer_cache, "how many attendees")
+    assert hit.tier == "exact" and hit.result == {"answer": "42"}
+
+
+def test_description_is_part_of_the_key(answer_cache):
+    answer(answer_cache, ask(answer_cache, "how many attendees", description="Spring meetup"), "42")
+    assert ask(answer_cache, "how many attendees", description="Autumn meetup").result is None
+
+
+def test_semantic_hit_for_a_rewording(answer_cache):
+    answer_cache.Config.SEMANTIC_THRESHOLD = 0.8
+    answer(answer_cache, ask(answer_cache, "how many people rated the event 5"), "12")
+    hit = ask(answer_cache, "how many people rated this event 5")
+    assert hit.tier == "semantic" and hit.result == {"answer": "12"}
+
+
+@pytest.mark.parametrize("first, second", [
+    ("how many people rated the event 5", "how many people rated the event 4"),
+    ('how many answered "very good"', 'how many answered "good"'),
+])
+def test_semantic_tier_requires_matching_literals(answer_cache, first, second):
+    answer_cache.Config.SEMANTIC_THRESHOLD = 0.5
+    answer(answer_cache, ask(answer_cache, first), "12")
+    assert ask(answer_cache, second).result is None
+
+
+def test_question_literals():
+    assert question_literals('Who rated 5 or 4.5 and said "Very  Good"?') == ("4.5", "5.0", "very good")
+    assert question_literals("what's the event's best session") == ()
+
+
+def test_new_sheet_content_invalidates_old_answers(answer_cache):
+    answer_cache.track_sheet("url", "v1")
+    answer(answer_cache, ask(answer_cache, "how many attendees", sheet_key="v1"), "42")
+    answer_cache.track_sheet("url", "v2")
+    assert ask(answer_cache, "how many attendees", sheet_key="v1").result is None
@@ -0,0 +1,93 @@
+import gc
+import pandas as pd
+import pytest
+from revamp_service.DataFrameStore import dataframe_store
+from revamp_service.QueryRouter import NaiveBayesRouter, QueryRouter, decision_label
+from revamp_service.configs import QueryRouterConfig
+
+
+@pytest.fixture
+def router():
+    config = QueryRouterConfig()
+    config.ENABLED = True
+    config.CLASSIFIER_ENABLED = False
+    config.DECISION_LOG_PATH = ""
+    return QueryRouter(config)
+
+
+@pytest.fixture
+def feedback_session():
+    df = pd.DataFrame({
+        "Department": ["Computer Science", "Mechanical", "Electrical"] * 20,
+        "Rating": ["Excellent", "Good", "Poor", "Good"] * 15,
+        "Score": list(range(60)),
+        "Comments": [f"comment {i}" for i in range(60)],
+    })
+    dataframe_store.put("router-test", df)
+    yield "router-test"
+    dataframe_store.drop("router-test")
+
+
+def test_value_index_does_not_keep_frames_alive(router):
+    df = pd.DataFrame({"Rating": ["Good", "Poor"] * 10})
+    router._value_index(df)
+    assert len(router._value_indexes) == 1
+    del df
+    gc.collect()
+    assert router._value_indexes == {}
+
+
+def test_decision_label():
+    assert decision_label(True, True) == "need_both"
+    assert decision_label(True, False) == "need_analysis"
+    assert decision_label(False, True) == "need_filtering"
+    assert decision_label(False, False) == "enough"
+
+
+def test_naive_bayes_learns_logged_decisions():
+    classifier = NaiveBayesRouter()
+    for _ in range(5):
+        classifier.learn("what is the average score", "need_analysis")
+        classifier.learn("summarize the comments", "enough")
+    label, confidence = classifier.predict("average score please")
+    assert label == "need_analysis" and confidence > 0.5
+
+
+def test_column_plus_value_becomes_a_filter(router, feedback_session):
+    decision = router.route("Show feedback where rating is good", [], feedback_session)
+    assert decision.decision == "need_filtering"
+    assert decision.filter_conditions == {"Rating": "Good"}
+
+
+def test_statistics_over_a_filter(router, feedback_session):
+    decision = router.route("What is the average score for department computer science?", [], feedback_session)
+    assert decision.decision == "need_both"
+    assert decision.filter_conditions == {"Department": "Computer Science"}
+
+
+def test_numeric_condition(router, feedback_session):
+    decision = router.route("Show the comments where score is 12", [], feedback_session)
+    assert decision.filter_conditions == {"Score": 12.0}
+
+
+def test_statistics_on_a_named_column(router, feedback_session):
+    decision = router.route("What is the average score?", [], feedback_session)
+    assert decision.decision == "need_analysis"
+    assert decision.filter_conditions == {}
+
+
+@pytest.mark.parametrize("question", [
+    "Was the event good overall?",
+    "What did people say about the most popular talk?",
+    "What is the total feedback like?",
+    "How many people rated it good?",
+    "Show feedback where rating is not good",
+    "Show everything except rating poor",
+    "List comments that aren't from department mechanical",
+])
+def test_unclear_questions_fall_back_to_the_llm(router, question, feedback_session):
+    assert router.route(question, [], feedback_session) is None
+
+
+def test_no_frame_falls_back_to_the_llm(router):
+    assert router.route("What is the average score?", [], "missing-session") is None
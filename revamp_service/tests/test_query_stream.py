@@ -0,0 +1,92 @@
+import json
+import os
+import pytest
+
+pytest.importorskip("fastapi")
+os.environ.setdefault("GROQ_API_KEY", "test")
+app_module = pytest.importorskip("revamp_service.app")
+from fastapi.testclient import TestClient
+from langchain_core.documents import Document
+from langchain_core.messages import AIMessageChunk
+
+
+class OneDocRetriever:
+    def invoke(self, question):
+        return [Document(page_content="name: Asha, rating: 5", metadata={"chunk_index": 0})]
+
+
+class ScriptedGraph:
+    """Replays tools-graph stream items, optionally failing after them"""
+
+    def __init__(self, items, error=None):
+        self.items, self.error = items, error
+
+    async def astream(self, state, stream_mode):
+        for item in self.items:
+            yield item
+        if self.error is not None:
+            raise self.error
+
+
+SESSION = {
+    "session_id": "s1",
+    "description": "Event feedback",
+    "qa_components": {"retriever": OneDocRetriever()},
+    "metadata": {"columns": [{"name": "rating"}], "sheet_url": "https://example.com/sheet"},
+}
+
+
+def stream_events(monkeypatch, tools_graph):
+    processor = app_module.processor
+
+    async def get_session(session_id):
+        return dict(SESSION) if session_id == "s1" else None
+
+    monkeypatch.setattr(processor.session_manager, "get_session", get_session)
+    monkeypatch.setattr(processor, "tools_graph", tools_graph)
+    response = TestClient(app_module.app).post("/query/stream", json={"session_id": "s1", "question": "Average rating?"})
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), json.loads(data.removeprefix("data: "))))
+    return events
+
+
+def test_stream_reports_progress_tokens_then_the_response(monkeypatch):
+    answer_meta = {"langgraph_node": "answer"}
+    events = stream_events(monkeypatch, ScriptedGraph([
+        ("updates", {"decision": {"decision": "need_analysis", "filter_conditions": {}}}),
+        ("updates", {"mcp_analysis": {"analysis": {"_metadata": {"total_rows": 3}}}}),
+        ("messages", (AIMessageChunk(content="Average "), answer_meta)),
+        ("messages", (AIMessageChunk(content="ignored"), {"langgraph_node": "decision"})),
+        ("messages", (AIMessageChunk(content="is 4.5"), answer_meta)),
+        ("updates", {"answer": {"answer": "Average is 4.5"}}),
+    ]))
+
+    assert [event for event, _ in events] == ["retrieval", "decision", "tool", "token", "token", "done"]
+    assert events[0][1] == {"documents": 1, "context_length": len("name: Asha, rating: 5")}
+    assert events[2][1] == {"tool": "analysis", "error": None, "total_rows": 3}
+    assert "".join(data["text"] for event, data in events if event == "token") == "Average is 4.5"
+    done = events[-1][1]
+    assert done["answer"] == "Average is 4.5"
+    assert done["used_tool"] == "MCP Analysis (Complete Dataset)"
+    assert done["sources"] == [{"chunk_index": 0}]
+
+
+def test_stream_ends_with_an_error_event_when_the_graph_fails(monkeypatch):
+    events = stream_events(monkeypatch, ScriptedGraph(
+        [("updates", {"decision": {"decision": "enough", "filter_conditions": {}}})],
+        error=RuntimeError("LLM unavailable"),
+    ))
+    assert [event for event, _ in events] == ["retrieval", "decision", "error"]
+    assert events[-1][1] == {"error": "LLM unavailable"}
+
+
+def test_unknown_session_is_a_404(monkeypatch):
+    async def get_session(session_id):
+        return None
+
+    monkeypatch.setattr(app_module.processor.session_manager, "get_session", get_session)
+    response = TestClient(app_module.app).post("/query/stream", json={"session_id": "nope", "question": "?"})
+    assert response.status_code == 404
@@ -0,0 +1,40 @@
+from revamp_service.row_chunker import chunk_rows
+
+ROWS = [f"row {i}: " + "x" * (i % 4) for i in range(40)]
+
+
+def test_rows_are_never_split_and_chunks_respect_the_size():
+    chunks = list(chunk_rows(ROWS, chunk_size=40))
+    assert all(len(chunk.text) <= 40 for chunk in chunks)
+    assert [row for chunk in chunks for row in chunk.text.split("\n")] == ROWS
+    assert [row_id for chunk in chunks for row_id in chunk.row_ids] == list(range(len(ROWS)))
+
+
+def test_chunk_text_matches_its_row_ids():
+    for chunk in chunk_rows(ROWS, chunk_size=50, overlap_rows=2):
+        assert chunk.text == "\n".join(ROWS[row_id] for row_id in chunk.row_ids)
+
+
+def test_overlap_repeats_the_last_rows_of_the_previous_chunk():
+    chunks = list(chunk_rows(ROWS, chunk_size=60, overlap_rows=2))
+    for previous, chunk in zip(chunks, chunks[1:]):
+        assert chunk.row_ids[:2] == previous.row_ids[-2:]
+        assert len(chunk.text) <= 60
+    covered = sorted({row_id for chunk in chunks for row_id in chunk.row_ids})
+    assert covered == list(range(len(ROWS)))
+
+
+def test_overlap_rows_that_do_not_fit_are_dropped():
+    rows = ["a" * 10, "b" * 10, "c" * 25]
+    chunks = list(chunk_rows(rows, chunk_size=30, overlap_rows=2))
+    assert [chunk.row_ids for chunk in chunks] == [[0, 1], [2]]
+
+
+def test_long_row_becomes_its_own_chunk():
+    rows = ["short", "y" * 100, "tail"]
+    chunks = list(chunk_rows(rows, chunk_size=20))
+    assert [chunk.text for chunk in chunks] == ["short", "y" * 100, "tail"]
+
+
+def test_no_rows_no_chunks():
+    assert list(chunk_rows([], chunk_size=10)) == []
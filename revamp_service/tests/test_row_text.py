@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from revamp_service.row_text import iter_text_rows, render_text_rows
+
+
+def old_rows_skip_na(df):
+    """The processor's iterrows implementation that render_text_rows replaced"""
+    return [" | ".join(f"{col}: {val}" for col, val in row.items() if pd.notna(val)) for _, row in df.iterrows()]
+
+
+def old_rows_keep_na(df):
+    """The utils iterrows implementation that render_text_rows replaced"""
+    headers = list(df.columns)
+    return [" | ".join(f"{header}: {value}" for header, value in zip(headers, row)) for _, row in df.iterrows()]
+
+
+@pytest.fixture
+def mixed_frame():
+    rows = 60
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        "Name": [f"attendee {i}" if i % 7 else None for i in range(rows)],
+        "Rating": rng.integers(1, 6, rows),
+        "Score": np.where(np.arange(rows) % 5 == 0, np.nan, rng.random(rows).round(3)),
+        "Overall": pd.Categorical(rng.choice(["Excellent", "Good", "Poor"], rows)),
+        "Attended": np.arange(rows) % 2 == 0,
+        "Registered": pd.date_range("2024-01-01", periods=rows, freq="D"),
+        "Checked in": pd.to_datetime(["2024-03-01 09:30" if i % 4 else None for i in range(rows)]),
+        "Duration": pd.to_timedelta(np.arange(rows), unit="m"),
+    })
+    return df
+
+
+def test_skip_na_matches_iterrows(mixed_frame):
+    assert render_text_rows(mixed_frame) == old_rows_skip_na(mixed_frame)
+
+
+def test_keep_na_matches_iterrows(mixed_frame):
+    assert render_text_rows(mixed_frame, skip_na=False) == old_rows_keep_na(mixed_frame)
+
+
+def test_datetimes_render_like_timestamps(mixed_frame):
+    assert "Registered: 2024-01-01 00:00:00" in render_text_rows(mixed_frame)[0]
+
+
+def test_iter_text_rows_matches_render(mixed_frame):
+    assert list(iter_text_rows(mixed_frame, batch_size=7)) == render_text_rows(mixed_frame)
+
+
+def test_empty_frame_renders_nothing():
+    assert render_text_rows(pd.DataFrame()) == []
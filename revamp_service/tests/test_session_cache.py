@@ -0,0 +1,74 @@
+import asyncio
+from datetime import datetime, timedelta
+import pytest
+
+pytest.importorskip("redis")
+from revamp_service.ChatbotSessionManager import EnhancedSessionManager, SessionCache
+
+
+def session(private=10, **shared):
+    return {"footprint_bytes": private, "shared_footprint": shared}
+
+
+@pytest.fixture
+def removed():
+    return []
+
+
+@pytest.fixture
+def session_cache(removed):
+    return SessionCache(maxsize=1000, ttl=60, on_remove=lambda key, reason: removed.append((key, reason)))
+
+
+def test_shared_objects_are_charged_once(session_cache):
+    session_cache["a"] = session(**{"index:k": 300, "frame:h": 200})
+    session_cache["b"] = session(**{"index:k": 300, "frame:h": 200})
+    assert session_cache.total_bytes == 10 + 10 + 500
+
+    del session_cache["a"]
+    # b still holds the index and the frame
+    assert session_cache.total_bytes == 10 + 500
+    del session_cache["b"]
+    assert session_cache.total_bytes == 0
+
+
+def test_evicts_least_recently_used_until_shared_bytes_fit(session_cache, removed):
+    session_cache["a"] = session(**{"index:a": 400})
+    session_cache["b"] = session(**{"index:b": 400})
+    session_cache["c"] = session(**{"index:c": 400})
+    assert removed == [("a", "evicted")]
+    assert list(session_cache) == ["b", "c"]
+    assert session_cache.total_bytes <= session_cache.maxsize
+
+
+def test_session_sharing_an_index_costs_only_its_private_bytes(session_cache, removed):
+    session_cache["a"] = session(**{"index:k": 900})
+    session_cache["b"] = session(**{"index:k": 900})
+    assert removed == []
+
+
+def test_restoring_a_session_replaces_its_charges(session_cache):
+    session_cache["a"] = session(**{"index:old": 300})
+    session_cache["a"] = session(**{"index:new": 100})
+    assert session_cache.shared_bytes == 100
+
+
+def test_expiry_releases_shared_bytes_and_notifies(session_cache, removed):
+    session_cache["a"] = session(**{"index:k": 300})
+    expired = session_cache.expire(time=session_cache.timer() + 120)
+    assert [key for key, _ in expired] == ["a"]
+    assert removed == [("a", "expired")]
+    assert session_cache.total_bytes == 0
+
+
+def test_clear_expired_sessions_on_plain_dict_fallback():
+    manager = EnhancedSessionManager()
+    manager.local_cache = {
+        "old": {"created_at": datetime.now() - timedelta(seconds=manager.Config.CACHE_TTL + 5)},
+        "new": {"created_at": datetime.now()},
+    }
+    removed = []
+    manager.add_removal_listener(lambda key, reason: removed.append((key, reason)))
+    asyncio.run(manager.clear_expired_sessions())
+    assert list(manager.local_cache) == ["new"]
+    assert removed == [("old", "expired")]
@@ -0,0 +1,91 @@
+import json
+from datetime import date, datetime
+import numpy as np
+import pytest
+from revamp_service.SessionCodec import MSGPACK_AVAILABLE, SessionCodec, session_codec
+
+requires_msgpack = pytest.mark.skipif(not MSGPACK_AVAILABLE, reason="msgpack not installed")
+
+
+class Opaque:
+    pass
+
+
+def session():
+    return {
+        "session_id": "s1",
+        "description": "Feedback for the spring meetup",
+        "qa_components": {"vectorstore": Opaque()},
+        "created_at": datetime(2024, 5, 1, 9, 30, 15, 120000),
+        "use_graph": True,
+        "history": [{"question": "how many?", "asked_on": date(2024, 5, 2)}],
+        "metadata": {
+            "columns": [{"name": "Rating", "type": "int8"}],
+            "shape": (120, 4),
+            "content_hash": "abc",
+        },
+    }
+
+
+@requires_msgpack
+def test_round_trip_keeps_types():
+    decoded = session_codec.decode(session_codec.encode(session()))
+    assert decoded["created_at"] == datetime(2024, 5, 1, 9, 30, 15, 120000)
+    assert decoded["history"][0]["asked_on"] == date(2024, 5, 2)
+    assert decoded["metadata"]["content_hash"] == "abc"
+    assert decoded["metadata"]["shape"] == [120, 4]
+    assert decoded["use_graph"] is True
+
+
+@requires_msgpack
+def test_qa_components_are_replaced_by_the_placeholder():
+    decoded = session_codec.decode(session_codec.encode(session()))
+    assert decoded["qa_components"] == session_codec.placeholder
+
+
+@requires_msgpack
+def test_numpy_values_round_trip():
+    data = {"vector": np.arange(6, dtype=np.float32).reshape(2, 3), "count": np.int64(7)}
+    decoded = session_codec.decode(session_codec.encode(data))
+    np.testing.assert_array_equal(decoded["vector"], data["vector"])
+    assert decoded["vector"].dtype == np.float32
+    assert decoded["count"] == 7
+
+
+@requires_msgpack
+def test_metadata_is_readable_on_its_own():
+    payload = session_codec.encode(session())
+    assert session_codec.decode_metadata(payload)["content_hash"] == "abc"
+    assert session_codec.decode_metadata(session_codec.encode({"session_id": "s2"})) is None
+
+
+def test_legacy_json_payloads_still_decode():
+    # Shape written by the old DateTimeEncoder path
+    legacy = json.dumps({
+        "session_id": "old",
+        "qa_components": "COMPLEX_OBJECT_PLACEHOLDER",
+        "created_at": {"__datetime__": True, "value": "2024-01-02T03:04:05"},
+        "llm": {"__custom_object__": True, "type": "ChatGroq", "data": {}},
+        "metadata": {"sheet_url": "https://example.com"},
+    }).encode("utf-8")
+    decoded = session_codec.decode(legacy)
+    assert decoded["created_at"] == datetime(2024, 1, 2, 3, 4, 5)
+    assert decoded["llm"] == "<ChatGroq object>"
+    assert session_codec.decode_metadata(legacy) == {"sheet_url": "https://example.com"}
+
+
+@requires_msgpack
+def test_unknown_version_is_rejected():
+    payload = bytearray(session_codec.encode(session()))
+    payload[2] = 99
+    with pytest.raises(ValueError):
+        session_codec.decode(bytes(payload))
+
+
+def test_json_fallback_round_trips(monkeypatch):
+    monkeypatch.setattr("revamp_service.SessionCodec.MSGPACK_AVAILABLE", False)
+    codec = SessionCodec()
+    decoded = codec.decode(codec.encode(session()))
+    assert decoded["created_at"] == datetime(2024, 5, 1, 9, 30, 15, 120000)
+    assert decoded["metadata"]["content_hash"] == "abc"
+    assert decoded["qa_components"] == codec.placeholder
@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+
+pytest.importorskip("redis")
+from revamp_service.ChatbotSessionManager import EnhancedSessionManager
+
+
+class Broker:
+    """In-process stand-in for Redis: a key space plus pub/sub channels"""
+
+    def __init__(self):
+        self.values = {}
+        self.subscribers = {}
+
+    def client(self):
+        return BrokerClient(self)
+
+
+class BrokerClient:
+    def __init__(self, broker):
+        self.broker = broker
+
+    async def setex(self, key, ttl, value):
+        self.broker.values[key] = value
+
+    async def get(self, key):
+        return self.broker.values.get(key)
+
+    async def delete(self, key):
+        self.broker.values.pop(key, None)
+
+    async def expire(self, key, ttl):
+        pass
+
+    async def publish(self, channel, message):
+        for queue in self.broker.subscribers.get(channel, []):
+            queue.put_nowait({"type": "message", "data": message.encode("utf-8")})
+
+    def pubsub(self, ignore_subscribe_messages=False):
+        return BrokerPubSub(self.broker)
+
+    async def aclose(self):
+        pass
+
+
+class BrokerPubSub:
+    def __init__(self, broker):
+        self.broker = broker
+        self.queue = asyncio.Queue()
+        self.channels = []
+
+    async def subscribe(self, channel):
+        self.channels.append(channel)
+        self.broker.subscribers.setdefault(channel, []).append(self.queue)
+
+    async def listen(self):
+        while True:
+            yield await self.queue.get()
+
+    async def aclose(self):
+        for channel in self.channels:
+            self.broker.subscribers[channel].remove(self.queue)
+
+
+async def connected_worker(broker, removed):
+    manager = EnhancedSessionManager()
+    manager.redis_client = broker.client()
+    manager.redis_available = True
+    manager.add_removal_listener(lambda session_id, reason: removed.append((manager.worker_id, session_id, reason)))
+    manager._invalidation_task = asyncio.create_task(manager._listen_for_invalidations())
+    await asyncio.sleep(0)
+    return manager
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_writes_and_deletes_invalidate_other_workers_only():
+    async def main():
+        broker, removed = Broker(), []
+        writer = await connected_worker(broker, removed)
+        reader = await connected_worker(broker, removed)
+
+        await writer.set_session("s1", {"session_id": "s1", "question_count": 1})
+        assert (await reader.get_session("s1"))["question_count"] == 1
+
+        await writer.set_session("s1", {"session_id": "s1", "question_count": 2})
+        await settle()
+        # The reader dropped its stale copy and reads the new one from Redis; the writer kept its own
+        assert removed == [(reader.worker_id, "s1", "invalidated")]
+        assert "s1" in writer.local_cache and "s1" not in reader.local_cache
+        assert (await reader.get_session("s1"))["question_count"] == 2
+
+        await writer.delete_session("s1")
+        await settle()
+        assert "s1" not in reader.local_cache
+        assert (reader.worker_id, "s1", "invalidated") in removed[1:]
+        await writer.close()
+        await reader.close()
+
+    asyncio.run(main())
@@ -0,0 +1,199 @@
+import asyncio
+import pytest
+
+pytest.importorskip("redis")
+from revamp_service.Simpleneo4jKB import Simpleneo4jKB, lucene_escape
+
+
+class FakeResult:
+    def __init__(self, records):
+        self.records = records
+
+    async def single(self):
+        return self.records[0] if self.records else None
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for record in self.records:
+            yield record
+
+
+class FakeSession:
+    def __init__(self, driver):
+        self.driver = driver
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def run(self, query, **params):
+        query = " ".join(query.split())
+        self.driver.queries.append((query, params))
+        return FakeResult(self.driver.respond(query, params))
+
+    async def execute_write(self, work, *args):
+        return await work(self, *args)
+
+
+class FakeDriver:
+    """Records every statement and answers it through respond(query, params), set per test"""
+
+    def __init__(self):
+        self.queries = []
+        self.respond = lambda query, params: []
+        self.closed = False
+
+    def session(self):
+        return FakeSession(self)
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def kb():
+    kb = Simpleneo4jKB()
+    kb.enabled = True
+    kb.driver = FakeDriver()
+    kb.BuildConfig.DELETE_BATCH_SIZE = 100
+    return kb
+
+
+def test_lucene_escape_neutralizes_query_syntax():
+    assert lucene_escape('a+b (c) "x"') == 'a\\+b \\(c\\) \\"x\\"'
+    assert lucene_escape("AND && OR || NOT") == "AND \\&& OR \\|| NOT"
+    assert lucene_escape("path/to:field*?~^") == "path\\/to\\:field\\*\\?\\~\\^"
+    assert lucene_escape("plain words") == "plain words"
+
+
+def test_fuzzy_search_filters_by_session_before_limiting(kb):
+    kb.driver.respond = lambda query, params: [{"text": "chunk one"}]
+    results = asyncio.run(kb.fuzzy_entity_search(["Data Science", "c++"], "s1"))
+    query, params = kb.driver.queries[0]
+    assert results == ["chunk one"]
+    assert "queryNodes('entity_name_fulltext', $search)" in query
+    assert query.index("{session_id: $session_id}") < query.index("LIMIT 3")
+    assert params["session_id"] == "s1"
+    assert "data OR data* OR data~" in params["search"]
+    assert "c\\+\\+" in params["search"]
+
+
+def test_keyword_search_scopes_the_lucene_query_to_the_session(kb):
+    kb.driver.respond = lambda query, params: [{"text": "chunk"}]
+    asyncio.run(kb.keyword_search('Who said "great" about the venue?', "abc-123"))
+    _, params = kb.driver.queries[0]
+    assert params["search"].startswith('+session_id:"abc\\-123" +full_text:(')
+    assert "\\\"great\\\"" in params["search"]
+    assert "the" not in params["search"].split("(")[1].split(" OR ")
+
+
+def test_searches_without_terms_skip_neo4j(kb):
+    assert asyncio.run(kb.fuzzy_entity_search([], "s1")) == []
+    assert asyncio.run(kb.keyword_search("is it ok", "s1")) == []
+    assert kb.driver.queries == []
+
+
+class GraphStore:
+    """Just enough of a session graph to answer the GC statements"""
+
+    def __init__(self, chunks, orphans=0, expired=()):
+        self.chunks = dict(chunks)
+        self.orphans = orphans
+        self.expired = list(expired)
+        self.sessions = set(self.chunks) | set(self.expired)
+
+    def respond(self, query, params):
+        if "MATCH (c:Chunk {session_id: $session_id}) WITH c LIMIT $batch_size" in query:
+            deleted = min(params["batch_size"], self.chunks.get(params["session_id"], 0))
+            self.chunks[params["session_id"]] = self.chunks.get(params["session_id"], 0) - deleted
+            return [{"deleted": deleted}]
+        if "WHERE NOT (e)<-[:MENTIONS]-()" in query:
+            deleted = min(params["batch_size"], self.orphans)
+            self.orphans -= deleted
+            return [{"deleted": deleted}]
+        if "MATCH (s:Session {id: $session_id}) DETACH DELETE s" in query:
+            self.sessions.discard(params["session_id"])
+        if "WHERE s.expires_at < datetime()" in query:
+            return [{"session_id": session_id} for session_id in self.expired[:params["batch_size"]]]
+        return []
+
+
+def test_delete_session_graph_deletes_in_batches_then_the_session(kb):
+    store = GraphStore({"s1": 250, "s2": 40})
+    kb.driver.respond = store.respond
+    assert asyncio.run(kb.delete_session_graph("s1")) == 250
+
+    chunk_batches = [params for query, params in kb.driver.queries if "WITH c LIMIT $batch_size" in query]
+    # 100 + 100 + 50, the short batch ends the loop
+    assert len(chunk_batches) == 3
+    assert store.chunks == {"s1": 0, "s2": 40}
+    assert store.sessions == {"s2"}
+    assert "DETACH DELETE s" in kb.driver.queries[-1][0]
+
+
+def test_delete_session_graph_runs_one_extra_batch_on_exact_multiples(kb):
+    store = GraphStore({"s1": 200})
+    kb.driver.respond = store.respond
+    assert asyncio.run(kb.delete_session_graph("s1")) == 200
+    assert sum("WITH c LIMIT $batch_size" in query for query, _ in kb.driver.queries) == 3
+
+
+def test_delete_session_graph_cancels_an_in_flight_build(kb):
+    store = GraphStore({"s1": 10})
+    kb.driver.respond = store.respond
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def build():
+            started.set()
+            await asyncio.sleep(60)
+
+        task = asyncio.create_task(build())
+        kb._build_tasks["s1"] = task
+        kb.build_status["s1"] = {"state": "building"}
+        await started.wait()
+        await kb.delete_session_graph("s1")
+        return task
+
+    task = asyncio.run(scenario())
+    assert task.cancelled()
+    assert "s1" not in kb._build_tasks
+    assert "s1" not in kb.build_status
+    assert store.chunks["s1"] == 0
+
+
+def test_collect_garbage_extends_live_sessions_and_deletes_dead_ones(kb):
+    store = GraphStore({"dead": 5, "live": 5}, orphans=230, expired=["dead", "live"])
+    kb.driver.respond = store.respond
+
+    async def session_alive(session_id):
+        return session_id == "live"
+
+    result = asyncio.run(kb.collect_garbage(session_alive))
+    assert result == {"sessions_deleted": 1, "entities_pruned": 230}
+    assert store.sessions == {"live"}
+    assert store.chunks == {"dead": 0, "live": 5}
+    extended = [params for query, params in kb.driver.queries if "SET s.expires_at" in query]
+    assert [params["session_id"] for params in extended] == ["live"]
+    assert extended[0]["ttl"] == kb.Config.CACHE_TTL
+    assert kb.gc_stats["runs"] == 1
+
+
+def test_close_stops_gc_and_closes_the_driver(kb):
+
+    async def scenario():
+        async def session_alive(session_id):
+            return False
+
+        kb.start_gc(session_alive)
+        assert kb._gc_task is not None
+        await kb.close()
+
+    asyncio.run(scenario())
+    assert kb._gc_task is None
+    assert kb.driver.closed
@@ -0,0 +1,76 @@
+import asyncio
+from revamp_service.VectorIndexRegistry import VectorIndexRegistry
+
+
+def test_concurrent_sessions_share_one_build():
+    registry = VectorIndexRegistry()
+    builds = []
+
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.01)
+        return {"chunks": ["a"]}
+
+    async def main():
+        return await asyncio.gather(*(registry.acquire("sheet", f"s{i}", build) for i in range(5)))
+
+    results = asyncio.run(main())
+    assert len(builds) == 1
+    assert all(result is results[0] for result in results)
+    assert registry.stats()["sessions_per_index"] == {"sheet": 5}
+
+
+def test_index_is_freed_when_the_last_session_releases_it():
+    registry = VectorIndexRegistry()
+
+    async def build():
+        return {"chunks": []}
+
+    async def main():
+        await registry.acquire("sheet", "a", build)
+        await registry.acquire("sheet", "b", build)
+
+    asyncio.run(main())
+    registry.release("a")
+    assert registry.stats()["indexes"] == 1
+    registry.release("b")
+    registry.release("b")
+    assert registry.stats()["indexes"] == 0
+    assert registry.stats()["released"] == 1
+
+
+def test_waiters_build_again_after_a_failed_build():
+    registry = VectorIndexRegistry()
+    attempts = []
+
+    async def build():
+        attempts.append(1)
+        await asyncio.sleep(0.01)
+        if len(attempts) == 1:
+            raise RuntimeError("embedding service down")
+        return {"chunks": ["a"]}
+
+    async def main():
+        return await asyncio.gather(registry.acquire("sheet", "a", build),
+                                    registry.acquire("sheet", "b", build), return_exceptions=True)
+
+    first, second = asyncio.run(main())
+    assert isinstance(first, RuntimeError)
+    assert second == {"chunks": ["a"]}
+    assert registry.key_for_session("a") is None
+    assert registry.stats()["sessions_per_index"] == {"sheet": 1}
+
+
+def test_moving_a_session_to_new_content_releases_the_old_index():
+    registry = VectorIndexRegistry()
+
+    async def build():
+        return {"chunks": []}
+
+    async def main():
+        await registry.acquire("old", "a", build)
+        await registry.acquire("new", "a", build)
+
+    asyncio.run(main())
+    assert registry.key_for_session("a") == "new"
+    assert registry.stats()["indexes"] == 1
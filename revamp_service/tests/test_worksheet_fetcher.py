@@ -0,0 +1,149 @@
+import asyncio
+import httpx
+import pandas as pd
+import pytest
+from revamp_service.DataFrameStore import PARQUET_AVAILABLE, SessionDataFrameStore
+from revamp_service.HttpClient import http_client
+from revamp_service.WorksheetFetcher import CsvRecordSplitter, WorksheetAccessError, WorksheetFetcher, csv_export_url
+from revamp_service.configs import DataFrameStoreConfig
+
+
+CSV = 'name,feedback\nAsha,"Loved it,\nwould come again"\nRavi,"Said ""meh"""\nMeera,ok\n'
+
+
+def split_in_chunks(text, size):
+    splitter = CsvRecordSplitter()
+    records = []
+    for start in range(0, len(text), size):
+        records.extend(splitter.feed(text[start:start + size]))
+    return records + splitter.flush()
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, len(CSV)])
+def test_splitter_keeps_quoted_newlines_in_one_record(size):
+    assert split_in_chunks(CSV, size) == [
+        "name,feedback\n",
+        'Asha,"Loved it,\nwould come again"\n',
+        'Ravi,"Said ""meh"""\n',
+        "Meera,ok\n",
+    ]
+
+
+def test_splitter_flushes_last_record_without_newline():
+    assert split_in_chunks("a,b\n1,2", 2) == ["a,b\n", "1,2\n"]
+
+
+@pytest.fixture
+def csv_server(monkeypatch):
+    body = "id,comment\n" + "".join(f'{i},"line one\nline two {i}"\n' for i in range(100))
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, content=body.encode("utf-8"), headers={"content-type": "text/csv"})
+
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    return requests
+
+
+def test_stream_stops_at_max_rows(csv_server):
+    batches = []
+    df = asyncio.run(WorksheetFetcher().stream("https://example.com/sheet.csv", max_rows=25,
+                                               batch_rows=10, on_batch=batches.append))
+    assert len(df) == 25
+    assert [len(batch) for batch in batches] == [10, 10, 5]
+    assert df["comment"].iloc[24] == "line one\nline two 24"
+
+
+def test_stream_reads_whole_sheet_without_limit(csv_server):
+    df = asyncio.run(WorksheetFetcher().stream("https://example.com/sheet.csv"))
+    assert len(df) == 100
+    assert df["id"].tolist() == list(range(100))
+
+
+class SheetServer:
+    """Serves one CSV body per URL with an ETag and honours If-None-Match"""
+
+    def __init__(self, body):
+        self.bodies = {"https://example.com/sheet.csv": body}
+        self.content_type = "text/csv"
+        self.requests = []
+
+    def etag(self, url):
+        return f'"{len(self.bodies[url])}-{hash(self.bodies[url]) & 0xffff}"'
+
+    def __call__(self, request):
+        url = str(request.url)
+        self.requests.append(request.headers)
+        if request.headers.get("If-None-Match") == self.etag(url):
+            return httpx.Response(304)
+        return httpx.Response(200, content=self.bodies[url],
+                              headers={"content-type": self.content_type, "ETag": self.etag(url)})
+
+
+@pytest.fixture
+def sheet_server(monkeypatch):
+    server = SheetServer(b"name,rating\nAsha,5\nRavi,4\n")
+    monkeypatch.setattr(http_client, "_client", httpx.AsyncClient(transport=httpx.MockTransport(server)))
+    return server
+
+
+@pytest.fixture
+def fetcher(sheet_server):
+    return WorksheetFetcher()
+
+
+def fetch(fetcher, url):
+    return asyncio.run(fetcher.fetch(url))
+
+
+def test_refetch_revalidates_and_reuses_the_parsed_frame(fetcher, sheet_server):
+    first = fetch(fetcher, "https://example.com/sheet.csv")
+    second = fetch(fetcher, "https://example.com/sheet.csv")
+    assert first.parsed and not first.revalidated
+    assert second.revalidated and not second.parsed
+    assert second.frame is first.frame
+    assert sheet_server.requests[1]["If-None-Match"] == sheet_server.etag("https://example.com/sheet.csv")
+    assert fetcher.stats["parsed"] == 1
+
+
+def test_changed_sheet_is_parsed_again(fetcher, sheet_server):
+    first = fetch(fetcher, "https://example.com/sheet.csv")
+    sheet_server.bodies["https://example.com/sheet.csv"] += b"Meera,3\n"
+    second = fetch(fetcher, "https://example.com/sheet.csv")
+    assert second.content_hash != first.content_hash
+    assert len(second.frame) == 3
+    assert fetcher.content_hash("https://example.com/sheet.csv") == second.content_hash
+
+
+def test_private_sheet_is_reported(fetcher, sheet_server):
+    sheet_server.content_type = "text/html"
+    with pytest.raises(WorksheetAccessError):
+        fetch(fetcher, "https://example.com/sheet.csv")
+
+
+def test_google_sheet_urls_map_to_the_csv_export():
+    url = "https://docs.google.com/spreadsheets/d/abc_DEF-123/edit#gid=0"
+    assert csv_export_url(url) == "https://docs.google.com/spreadsheets/d/abc_DEF-123/export?format=csv"
+    assert csv_export_url("https://example.com/data.csv") == "https://example.com/data.csv"
+
+
+@pytest.mark.skipif(not PARQUET_AVAILABLE, reason="pyarrow not installed")
+def test_store_spill_makes_the_fetcher_drop_its_parsed_copy(fetcher, sheet_server, tmp_path):
+    sheet_server.bodies["https://example.com/big.csv"] = b"value\n" + b"".join(b"%d\n" % i for i in range(1000))
+    config = DataFrameStoreConfig()
+    config.MAX_MEMORY_BYTES = 1
+    config.SPILL_DIR = str(tmp_path)
+    store = SessionDataFrameStore(config)
+    store.add_spill_listener(fetcher.release_frame)
+
+    big = fetch(fetcher, "https://example.com/big.csv")
+    store.put("a", big.frame)
+    store.put("b", fetch(fetcher, "https://example.com/sheet.csv").frame)
+
+    # The fetcher held a's frame as well; the store spilled it anyway and the fetcher let it go
+    assert store.stats()["in_memory"] == 1
+    assert big.content_hash not in fetcher._frames
+    refetched = fetch(fetcher, "https://example.com/big.csv")
+    assert refetched.revalidated and refetched.parsed
+    pd.testing.assert_frame_equal(refetched.frame, big.frame)
@@ -1,6 +1,6 @@
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 import pandas as pd
 from revamp_service.prompts import *
 import io
@@ -26,6 +26,8 @@ from revamp_service.models import *
 from revamp_service.logger import *
 from revamp_service.analyzer import OllamaRAGAnalyzer
 from revamp_service.baseAnalyzer import *
+from revamp_service.WorksheetFetcher import worksheet_fetcher, csv_export_url
+from revamp_service.row_text import render_text_rows
 from .configs import *
 logging = get_logger(__name__)
 
@@ -67,39 +69,28 @@ def send_error_email(recipient_email: str, error_msg: str, event_name: str):
 
 
 def dataframe_to_text_rows(df):
-    headers = list(df.columns)
-    rows = []
-    for _, row in df.iterrows():
-        row_text = " | ".join([f"{header}: {value}" for header, value in zip(headers, row)])
-        rows.append(row_text)
-    return rows
+    return render_text_rows(df, skip_na=False)
 
-async def fetch_worksheet_data(worksheet_url: str) -> pd.DataFrame:
-    """Async version of fetch_worksheet_data"""
-    loop = asyncio.get_event_loop()
-    
-    def _fetch():
-        try:
-            if 'docs.google.com/spreadsheets' in worksheet_url:
-                sheet_id = worksheet_url.split('/d/')[1].split('/')[0]
-                csv_url = f"https://docs.google.com/spreadsheets/d/{sheet_id}/export?format=csv"
-            else:
-                csv_url = worksheet_url
-            logging.debug(f" Fetching data from: {csv_url}")
-            print(f"📥 Fetching data from: {csv_url}")
-            response = requests.get(csv_url, timeout=30)
-            response.raise_for_status()
-            
-            df = pd.read_csv(StringIO(response.text))
-            logging.debug(f"✅ Successfully loaded {len(df)} rows and {len(df.columns)} columns")
-            print(f"✅ Successfully loaded {len(df)} rows and {len(df.columns)} columns")
-            return df
-            
-        except Exception as e:
-            logging.error(f"Error fetching worksheet data: {str(e)}")
-            raise Exception(f"Failed to fetch worksheet data: {str(e)}")
-    
-    return await loop.run_in_executor(None, _fetch)
+async def fetch_worksheet_data(worksheet_url: str, max_rows: Optional[int] = None) -> pd.DataFrame:
+    """Fetch a worksheet as a DataFrame through the shared conditional-GET fetcher.
+
+    With max_rows set the CSV is streamed and the download stops once that many rows are read.
+    """
+    try:
+        print(f"📥 Fetching data from: {csv_export_url(worksheet_url)}")
+        if max_rows is not None:
+            df = await worksheet_fetcher.stream(worksheet_url, max_rows=max_rows)
+        else:
+            snapshot = await worksheet_fetcher.fetch(worksheet_url)
+            df = snapshot.frame
+            logging.debug(f"Worksheet parsed: {snapshot.parsed}")
+        logging.debug(f"✅ Successfully loaded {len(df)} rows and {len(df.columns)} columns")
+        print(f"✅ Successfully loaded {len(df)} rows and {len(df.columns)} columns")
+        return df
+        
+    except Exception as e:
+        logging.error(f"Error fetching worksheet data: {str(e)}")
+        raise Exception(f"Failed to fetch worksheet data: {str(e)}")
 def generate_pdf_report(results: Dict[str, Any], event_name: str) -> bytes:
     buffer = io.BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
@@ -523,10 +514,10 @@ async def process_analysis_task(request: AnalysisRequest, task_id: str):
         async with asyncio.timeout(1800):  # 30 minute timeout
             analyzer : Analyzer = OllamaRAGAnalyzer()
             
-            df = await fetch_worksheet_data(request.worksheet_url)
-            if len(df) > analyzer.config.MAX_PROCESSING_ROWS:
+            # Stream the sheet and stop downloading once the processing limit is reached
+            df = await fetch_worksheet_data(request.worksheet_url, max_rows=analyzer.config.MAX_PROCESSING_ROWS)
+            if len(df) >= analyzer.config.MAX_PROCESSING_ROWS:
                 print(f"⚠️ Limiting analysis to {analyzer.config.MAX_PROCESSING_ROWS} rows")
-                df = df.head(analyzer.config.MAX_PROCESSING_ROWS)
             
             processed_df, column_types = analyzer.preprocess_columns(df)
             